@@ -10,6 +10,7 @@ AB_BASE_SQL = '''
     (
         SELECT
             limited_data.*,
+            {expand_row_col}
             real_id::text correct_real_id,
             NULL::int "Документ",
             NULL::int "НашаОрганизация",
@@ -22,6 +23,7 @@ AB_BASE_SQL = '''
                 SELECT
                     md.*
                     {field_for_name_order}
+                    {keyset_position_col}
                 FROM
                     (
                         SELECT
@@ -64,7 +66,8 @@ AB_BASE_SQL = '''
                 {join_tables_for_sort}
                 {join_tables_for_search}
                 WHERE
-                    {filter_by_search}
+                    ({filter_by_search}) AND
+                    {filter_by_position}
                 ORDER BY
                     {order_by}
                 LIMIT
@@ -728,3 +731,33 @@ DC_WITH_ANALYTICS_HIERARCHY_SQL = '''
     WHERE
         {filter_by_ido}
 '''
+
+# Запрос уровня развернутого отчета: запросы узлов одного уровня объединяются в один (см.
+# JournalVoucher.get_expand_report_by_levels). Порядок строк узла сохраняется через expand_row - номер строки по
+# сортировке отчета узла (см. JournalVoucherAB._get_query_from_ab)
+EXPAND_LEVEL_MEMBER_SQL = '''
+    (
+        SELECT
+            {member}::int AS expand_member,
+            member_data.*
+        FROM
+            (
+                {sql}
+            ) member_data
+    )
+'''
+
+# Строки уровня ограничиваются параметром {num_limit}: остаток ограничения развернутого отчета
+EXPAND_LEVEL_SQL = '''
+    SELECT
+        *
+    FROM
+        (
+            {members}
+        ) level_data
+    ORDER BY
+        expand_member,
+        expand_row
+    LIMIT
+        ${num_limit}::int
+'''
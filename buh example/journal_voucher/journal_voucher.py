@@ -3,14 +3,22 @@
 Реализация обертки ЖурналаОрдера
 """
 
+import re
+
 import sbis
 from common_utils import cached_property
+from .base_sql import EXPAND_LEVEL_MEMBER_SQL, EXPAND_LEVEL_SQL
 from .journal_voucher_ab import JournalVoucherAB
 from .journal_voucher_dc import JournalVoucherDC
+from .journal_voucher_export import JournalVoucherExport, RecordSetReportWriter
 from ..helpers import digit_with_capacity
 
 LIMIT_RECORD_EXPAND_REPORT = 1000
 LIMIT_RECORD_EXPAND_REPORT_XML = 10000
+# Количество узлов в одном запросе уровня (у каждого узла свои параметры запроса)
+LIMIT_NODES_BY_LEVEL_QUERY = 500
+
+PARAM_PATTERN = re.compile(r'\$(\d+)')
 
 MSG_ERROR_EXPORT = 'Невозможно вывести отчет на экран, в нем более {} строк. Выгрузите отчет в файл.'.format(
     digit_with_capacity(LIMIT_RECORD_EXPAND_REPORT)
@@ -24,8 +32,8 @@ class JournalVoucher(JournalVoucherAB, JournalVoucherDC):
         super().__init__(_filter, navigation)
         self.order_counter = 0
         self.nodes = {}
-        # для разворота. тут лежит порядковый номер строки внутри своего раздела
-        self.sort_cols = {}
+        # для разворота. тут лежат ключи путей строк: {id: (порядковые номера строк внутри своих разделов от корня)}
+        self.path_keys = {}
 
         self.structure_order = {
             # int
@@ -89,6 +97,10 @@ class JournalVoucher(JournalVoucherAB, JournalVoucherDC):
         if not self.accounts:
             return sbis.RecordSet()
         if self._filter.Get('ExpandAll'):
+            if self.is_xml_export:
+                return self.get_expand_report_export()
+            if self._filter.Get('ExpandAllByLevels'):
+                return self.get_expand_report_by_levels()
             return self.get_expand_report()
         rs = self._post_processing(self._get_data())
         # если rs пустой, попробуем просто построить следующий уровень детализации
@@ -120,8 +132,9 @@ class JournalVoucher(JournalVoucherAB, JournalVoucherDC):
 
     def get_expand_report(self):
         """Основной метод. Строит развернутый отчет. Возвращает RecordSet"""
-        if 'ExpandAll' in self._filter:
-            self._filter.Remove('ExpandAll')
+        for field in ('ExpandAll', 'KeysetPosition'):
+            if field in self._filter:
+                self._filter.Remove(field)
         # корректировать первый вызов будем только если детализаций несколько
         if len(self.groups) > 1:
             self._correct_nav_expand_order()
@@ -160,6 +173,177 @@ class JournalVoucher(JournalVoucherAB, JournalVoucherDC):
 
         return result
 
+    def get_expand_report_export(self):
+        """
+        Строит развернутый отчет для выгрузки в excel и печати. Возвращает RecordSet
+        В отличие от get_expand_report, отчет не обрезается по LIMIT_RECORD_EXPAND_REPORT_XML: дерево обходится
+        потоковой выгрузкой (см. JournalVoucherExport), строки узлов запрашиваются порциями и сразу добавляются в
+        результат в порядке обхода в глубину, сортировка не требуется.
+        """
+        writer = RecordSetReportWriter(self.__correct_export_format)
+        JournalVoucherExport(self._filter, writer, JournalVoucher).export()
+        return writer.result if writer.result is not None else sbis.RecordSet()
+
+    def __correct_export_format(self, result, rs):
+        """Приводит порцию строк выгрузки к формату результата (result - None для первой порции)"""
+        self.__convert_real_id(rs)
+        if result is not None:
+            self.__correct_correspondence_field(result, rs)
+
+    def get_expand_report_by_levels(self):
+        """
+        Строит развернутый отчет по уровням. Возвращает RecordSet
+        В отличие от get_expand_report, узлы одного уровня запрашиваются одним запросом (запросы узлов объединяются через
+        UNION ALL), поэтому количество запросов определяется глубиной дерева, а не количеством узлов. Узлы, отчет по
+        которым нельзя объединить (см. JournalVoucherAB.is_level_query_available), строятся по одному через
+        BuhReports.GetJournalVoucher, как в get_expand_report.
+        Примечание: фильтр узла - копия фильтра вызванного метода с заполненным parent, поэтому запрос уровня
+        выполняется в контексте и с правами того же вызова, что и корень отчета.
+        Строки выводятся сразу в порядке обхода дерева в глубину, сортировка не требуется.
+        """
+        for field in ('ExpandAll', 'ExpandAllByLevels', 'KeysetPosition'):
+            if field in self._filter:
+                self._filter.Remove(field)
+        # корректировать первый вызов будем только если детализаций несколько
+        if len(self.groups) > 1:
+            self._correct_nav_expand_order()
+
+        reports = {}
+        size_order = 0
+        is_cut = False
+        parents = [None]
+        while parents:
+            if parents[0] is not None:
+                self._correct_nav_expand_order(size_order=size_order)
+                if not self.navigation:
+                    is_cut = True
+                    break
+            next_parents = []
+            for parent, rs in self.__get_level_reports(parents, self._get_limit_expand_report() - size_order):
+                self.__convert_real_id(rs)
+                reports[parent] = rs
+                size_order += len(rs)
+                next_parents.extend(rec.Get('id') for rec in rs if rec.Get('parent@'))
+            if size_order > self._get_limit_expand_report():
+                if not self.is_xml_export:
+                    raise sbis.Warning(MSG_ERROR_EXPORT, MSG_ERROR_EXPORT)
+                is_cut = True
+                break
+            parents = next_parents
+
+        root = reports[None]
+        result = sbis.RecordSet(root.Format())
+        result.outcome = root.outcome
+        result.nav_result = root.nav_result
+        for rs in reports.values():
+            if rs:
+                self.__correct_correspondence_field(result, rs)
+        self.__add_branch(result, reports, None)
+        if is_cut:
+            result.nav_result = sbis.NavigationResultBool(True)
+        return result
+
+    def __add_branch(self, result, reports, parent):
+        """
+        Добавляет в результат строки узла parent и их ветки (обход в глубину)
+        :return: False, если достигнуто ограничение на количество строк
+        """
+        for rec in reports.get(parent) or ():
+            if len(result) >= self._get_limit_expand_report():
+                return False
+            result.AddRow(rec)
+            if not self.__add_branch(result, reports, rec.Get('id')):
+                return False
+        return True
+
+    def __get_level_reports(self, parents, limit):
+        """
+        Строит отчеты по узлам одного уровня
+        :param parents: идентификаторы узлов (None - корень отчета)
+        :param limit: остаток ограничения развернутого отчета (количество строк)
+        :return: генератор пар (узел, RecordSet)
+        Примечание: узлы обходятся в порядке parents, строки уровня считаются по мере построения. Каждый запрос уровня
+        ограничен остатком (плюс одна строка - признак превышения), после превышения ограничения остальные узлы не
+        запрашиваются: отчет будет обрезан, а при обходе в глубину (см. __add_branch) до них не дойдет.
+        """
+        count_rows = 0
+        for is_level_query, nodes in self.__get_level_batches(parents):
+            if count_rows > limit:
+                return
+            if is_level_query:
+                reports = self.__get_level_query_reports(nodes, limit - count_rows + 1)
+            else:
+                reports = (
+                    (parent, sbis.BuhReports.GetJournalVoucher(None, node._filter, None, self.navigation))
+                    for parent, node in nodes
+                )
+            for parent, rs in reports:
+                count_rows += len(rs)
+                yield parent, rs
+
+    def __get_level_batches(self, parents):
+        """
+        Разбивает узлы уровня на группы в порядке parents
+        :param parents: идентификаторы узлов (None - корень отчета)
+        :return: генератор пар (признак запроса уровня, список пар (узел, JournalVoucher узла)). Узлы, отчет по
+        которым нельзя объединить (см. JournalVoucherAB.is_level_query_available), образуют группу из одного узла
+        """
+        level_nodes = []
+        for parent in parents:
+            node_filter = sbis.Record(self._filter)
+            if parent is not None:
+                if 'parent' not in node_filter:
+                    node_filter.AddString('parent')
+                node_filter['parent'] = parent
+            node = JournalVoucher(node_filter, self.navigation)
+            if node.accounts and node.is_level_query_available:
+                level_nodes.append((parent, node))
+                if len(level_nodes) == LIMIT_NODES_BY_LEVEL_QUERY:
+                    yield True, level_nodes
+                    level_nodes = []
+            else:
+                if level_nodes:
+                    yield True, level_nodes
+                    level_nodes = []
+                yield False, [(parent, node)]
+        if level_nodes:
+            yield True, level_nodes
+
+    @staticmethod
+    def __get_level_query_reports(level_nodes, limit):
+        """
+        Строит отчеты по узлам одного уровня одним запросом
+        :param level_nodes: список пар (узел, JournalVoucher узла)
+        :param limit: наибольшее количество строк всех узлов (строки берутся по порядку узлов)
+        :return: генератор пар (узел, RecordSet)
+        """
+        members = []
+        params = []
+        for member, (_, node) in enumerate(level_nodes):
+            sql, node_params = node._get_query_from_ab(with_expand_row=True)
+            offset = len(params)
+            members.append(EXPAND_LEVEL_MEMBER_SQL.format(
+                member=member,
+                sql=PARAM_PATTERN.sub(lambda match: '${}'.format(int(match.group(1)) + offset), sql),
+            ))
+            params.extend(node_params)
+        level_rs = sbis.SqlQuery(
+            EXPAND_LEVEL_SQL.format(members='UNION ALL'.join(members), num_limit=len(params) + 1),
+            *params,
+            limit,
+        )
+
+        rows_by_member = {}
+        for rec in level_rs:
+            rows_by_member.setdefault(rec.Get('expand_member'), []).append(rec)
+        for member, (parent, node) in enumerate(level_nodes):
+            member_rs = sbis.RecordSet(level_rs.Format())
+            for rec in rows_by_member.get(member, ()):
+                member_rs.AddRow(rec)
+            member_rs.DelCol('expand_member')
+            member_rs.DelCol('expand_row')
+            yield parent, node._get_report_from_ab_by_query_result(member_rs)
+
     def __convert_real_id(self, result):
         """Конвертирует поле real_id в строку"""
         result_format = result.Format()
@@ -196,11 +380,11 @@ class JournalVoucher(JournalVoucherAB, JournalVoucherDC):
     def __correct_correspondence_field(self, result, new_rs):
         """ добавляет в result отсутствующие колонки с корреспонденцией """
         res_format = result.Format()
-        for fld in new_rs.Format():
-            fld_name = fld.Name()
-            if fld_name not in res_format:
-                res_format.Add(fld_name, fld.Type(), 0)
-        result.Migrate(res_format)
+        new_fields = [fld for fld in new_rs.Format() if fld.Name() not in res_format]
+        if new_fields:
+            for fld in new_fields:
+                res_format.Add(fld.Name(), fld.Type(), 0)
+            result.Migrate(res_format)
 
         outcome_correspondence = result.outcome.Get('correspondence')
         new_correspondence = new_rs.outcome.Get('correspondence')
@@ -242,61 +426,36 @@ class JournalVoucher(JournalVoucherAB, JournalVoucherDC):
         Добавляет к результату данные по вложенному отчету
         Сначала строим список в корне, затем разворачиваем по очереди каждую ветку
         """
-        self.__correct_structure(result, rec_set)
+        is_merge = bool(result) and bool(rec_set)
+        if is_merge:
+            # формат результата приводим один раз на весь вложенный отчет, затем просто добавляем строки
+            self.__correct_structure(result, rec_set)
+            self.__correct_correspondence_field(result, rec_set)
 
         for i, rec in enumerate(rec_set):
-            self._set_sort_cols(i, rec)
+            self._set_path_key(i, rec)
             if rec.Get('parent@'):
                 id_node = rec.Get('id')
-                level = len(id_node.split(','))
+                level = len(self.path_keys[id_node])
                 if level not in self.nodes:
                     self.nodes[level] = []
                 self.nodes[level].append(id_node)
-            if result:
-                self.__correct_correspondence_field(result, rec_set)
+            if is_merge:
                 result.AddRow(rec)
 
         # отладочное логирование
         # self._log_inner_report(rec_set, result)
 
-    def _set_sort_cols(self, i, rec):
+    def _set_path_key(self, i, rec):
         """
-        заполняет колонку для сортировки
+        Заполняет ключ пути строки: порядковые номера строк внутри своих разделов от корня до строки
+        Примечание: раздел родителя всегда добавляется раньше дочерних, поэтому ключ родителя уже рассчитан
         """
-        id_node = rec.Get('id')
-        self.sort_cols[id_node] = i
+        self.path_keys[rec.Get('id')] = self.path_keys.get(rec.Get('parent'), ()) + (i,)
 
     def sort_by_branches(self, left, right):
-        """Сортируем отчет с учетом вложенности"""
-        left_parent = left.Get('parent')
-        left_parent = left_parent.split(',') if left_parent else []
-        right_parent = right.Get('parent')
-        right_parent = right_parent.split(',') if right_parent else []
-
-        # если предок у записей один, то просто сравним наши записи
-        if left_parent == right_parent:
-            return self.sort_cols[left.Get('id')] < self.sort_cols[right.Get('id')]
-
-        # ищем общего предка
-        common_level = 0
-        for i in range(min(len(left_parent), len(right_parent))):
-            if left_parent[i] != right_parent[i]:
-                break
-            common_level = i + 1
-
-        # теперь нужно взять sort_cols у тех записей, которые лежат в этом общем предке и сравнить
-        # берем не общего предка (он же один, чего его сравнивать), а следующего по иерархии, поэтому +1
-        x = common_level + 1
-
-        # иногда следующая после предка запись это сама исходная запись (проверка по len(left_parent))
-        left_cmp = self.sort_cols[left.Get('id') if len(left_parent) < x else ','.join(left_parent[0:x])]
-        right_cmp = self.sort_cols[right.Get('id') if len(right_parent) < x else ','.join(right_parent[0:x])]
-
-        if left_cmp == right_cmp:
-            # похоже что записи вложены. Родитель идет раньше
-            return len(left_parent) < len(right_parent)
-
-        return left_cmp < right_cmp
+        """Сортируем отчет с учетом вложенности (ключи путей сравниваются как кортежи - порядок обхода в глубину)"""
+        return self.path_keys[left.Get('id')] < self.path_keys[right.Get('id')]
 
     def _get_data(self):
         """Вычисляет на основе входных параметров отчета какой из методов построения отчета будет вызван и вызывает
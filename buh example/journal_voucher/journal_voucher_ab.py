@@ -86,6 +86,35 @@ class JournalVoucherAB(JournalVoucherBase):
 
     def _get_report_from_ab(self):
         """Строит отчет по таблице acc_balance"""
+        sql, params = self._get_query_from_ab()
+        return self.__post_proccess_ab(sbis.SqlQuery(sql, *params))
+
+    @property
+    def is_level_query_available(self):
+        """
+        Проверяет, можно ли объединить запрос отчета с запросами соседних узлов в один запрос уровня (см.
+        JournalVoucher.get_expand_report_by_levels)
+        Примечание: объединяются только отчеты _get_report_from_ab без корреспонденции, у них одинаковый набор колонок
+        для всех узлов одного уровня
+        """
+        return not any((
+            self.is_dc,
+            self.is_need_corresponds,
+            self.search,
+            self.current_group == 'periodicity',
+            self.current_group == 'account' and self.account_hierarchy,
+            'face' in self.current_group and self.analytics.is_hierarchical(self.current_group),
+        ))
+
+    def _get_report_from_ab_by_query_result(self, result_rs):
+        """Строит отчет по результату запроса _get_query_from_ab, выполненного в составе запроса уровня"""
+        return self._post_processing(self.__post_proccess_ab(result_rs))
+
+    def _get_query_from_ab(self, with_expand_row=False):
+        """
+        Возвращает запрос отчета по таблице acc_balance и его параметры
+        :param with_expand_row: добавить колонку expand_row - номер строки по сортировке отчета (для запроса уровня)
+        """
         if self.current_group == 'document':
             turnovers = False
             group_col = 'acc'
@@ -113,6 +142,29 @@ class JournalVoucherAB(JournalVoucherBase):
         if self.is_need_corresponds:
             cte_accounts_with_marks = get_cte_accounts_with_marks(self.id_accounts_with_children)
 
+        params = [self.parent_id, self.ido_filter, page_limit, offset]
+        order_by = self.__get_order_cols(main_data_fields)
+        keyset_position_col = ''
+        filter_by_position = 'TRUE'
+        if self.is_keyset_pagination and self.current_group != 'document':
+            keyset_cols = self.__get_keyset_cols(main_data_fields)
+            direction = 'ASC' if self.asc_sort else 'DESC'
+            order_by = ',\r\n'.join('{} {}'.format(col, direction) for col in keyset_cols)
+            keyset_position_col = ', ARRAY[{}]::numeric[] AS keyset_position'.format(', '.join(keyset_cols))
+            if self.keyset_position:
+                # позиция передается параметром: строки после последней строки предыдущей страницы
+                params[3] = 0
+                params.append(list(map(str, self.keyset_position)))
+                filter_by_position = '({}) {} ({})'.format(
+                    ', '.join(keyset_cols),
+                    '>' if self.asc_sort else '<',
+                    ', '.join('($5::text[]::numeric[])[{}]'.format(i + 1) for i in range(len(keyset_cols))),
+                )
+
+        expand_row_col = ''
+        if with_expand_row:
+            expand_row_col = 'ROW_NUMBER() OVER (ORDER BY {}) AS expand_row,'.format(order_by)
+
         sql = AB_BASE_SQL.format(
             cte_with_accounts_hier=cte_accounts_with_marks,
             result_sum_cols=self.__get_result_sum_cols(),
@@ -123,26 +175,54 @@ class JournalVoucherAB(JournalVoucherBase):
             group_col=group_col,
             zero_sum_filters=self.__get_zero_sum_having(),
             saldo_filters=self.__get_saldo_filters(),
-            order_by=self.__get_order_cols(main_data_fields),
+            order_by=order_by,
+            expand_row_col=expand_row_col,
             additional_columns=self.__get_additional_fields(),
             corresponds=self.__get_ab_corresponds(),
             join_extended_tables=self.__get_extended_tables(self.ab_current_group),
             join_tables_for_sort=self.__get_tables_for_sort(self.ab_current_group),
             join_tables_for_search=self.__get_tables_for_search(self.ab_current_group),
             field_for_name_order=self.__get_field_for_name_order(self.ab_current_group),
+            keyset_position_col=keyset_position_col,
             filter_by_search=self.__get_filter_by_search(),
+            filter_by_position=filter_by_position,
             filter_by_ido=self._get_filter_by_ido(params_offset=2),
             curr_aggregate=self.__get_calc_curr_aggregate(),
         )
-        result_rs = sbis.SqlQuery(
-            sql,
-            self.parent_id,
-            self.ido_filter,
-            page_limit,
-            offset,
-        )
+        return sql, params
 
-        return self.__post_proccess_ab(result_rs)
+    @property
+    def is_keyset_pagination(self):
+        """
+        Проверяет, строится ли страница по keyset-навигации (вместо LIMIT/OFFSET)
+        Примечание: поддерживается только базовая сортировка по суммам (__get_base_order_cols) - все ее колонки
+        сортируются в одном направлении и сводятся к числам, поэтому позиция сравнивается одним сравнением строк.
+        Валютные суммы (флаг FLAG_CURRENCY) хранятся не числами, а наборами сумм по валютам, к числу не сводятся -
+        с ними остается LIMIT/OFFSET
+        """
+        return all((
+            self.is_keyset_requested,
+            not self.sort_by_name,
+            not self.only_currency,
+            not self.flags[FLAG_CURRENCY],
+            not self.ido_filter,
+        ))
+
+    def __get_keyset_cols(self, request_fields):
+        """
+        Возвращает колонки keyset-навигации в порядке сортировки
+        Колонки повторяют __get_base_order_cols: пустые суммы, как и там, считаются нулем (стоят вместе с нулевыми
+        суммами), пустой признак строки итогов и пустой real_id заменяются значениями после всех остальных. Последней
+        идет real_id - ключ строки, он разделяет строки с одинаковыми суммами
+        Примечание: позиция отсекает уже агрегированные строки, поэтому агрегация acc_balance выполняется целиком на
+        каждой странице. Keyset убирает пропуск строк OFFSET, но не делает стоимость страницы меньше агрегации
+        """
+        keyset_cols = ['COALESCE((real_id = -11)::int, 2)']
+        for field in self.fields_by_on_flags:
+            if field in request_fields:
+                keyset_cols.append('COALESCE({}, 0)'.format(field))
+        keyset_cols += ['(real_id IS NULL)::int', 'COALESCE(real_id, 0)']
+        return keyset_cols
 
     def _get_report_from_ab_analytics_hier(self):
         """Строит отчет по таблице acc_balance"""
@@ -593,6 +673,8 @@ class JournalVoucherAB(JournalVoucherBase):
         outcome = sbis.Record()
         self.__add_actual_date(outcome)
         result_rs.outcome = outcome
+        if 'keyset_position' in result_rs.Format():
+            self.__add_keyset_position(result_rs)
         if result_rs:
             for col in result_rs.Format():
                 if col.Name()[-7:] == '_result':
@@ -602,6 +684,18 @@ class JournalVoucherAB(JournalVoucherBase):
                         result_rs.outcome.AddMoney(col.Name()[:-7], result_rs.Get(0, col.Name()))
         return result_rs
 
+    def __add_keyset_position(self, result_rs):
+        """
+        Добавляет в итоги позицию следующей страницы (KeysetPosition) - ключ последней строки страницы
+        Примечание: лишняя строка навигации (limit_on_page) еще не удалена, поэтому ее пропускаем
+        """
+        position = None
+        count_rows = min(len(result_rs), self.limit_on_page - 1)
+        if count_rows:
+            position = [str(value) for value in result_rs.Get(count_rows - 1, 'keyset_position')]
+        result_rs.outcome.AddArrayString('KeysetPosition', position)
+        result_rs.DelCol('keyset_position')
+
     def _get_report_from_ab_by_period(self):
         """Строит отчет по таблице acc_balance с периодичностью"""
 
@@ -230,6 +230,9 @@ class JournalVoucherBase(BaseReportClass):
         self.search = not self.parents and badCharFilter(self._filter.Get(self.search_field) or '')
         self.sort_by_name = self._filter.Get(self.order_by_field) == 'name'
         self.asc_sort = self._filter.Get('AscSort') in (True, None)
+        # keyset-навигация запрошена, если в фильтре есть KeysetPosition (None - первая страница)
+        self.is_keyset_requested = 'KeysetPosition' in self._filter
+        self.keyset_position = self._filter.Get('KeysetPosition')
         self.accounts = self.__get_base_accounts()
         if not self.accounts:
             self.all_accounts = None
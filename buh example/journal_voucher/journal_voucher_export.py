@@ -0,0 +1,181 @@
+"""
+Глухенко А.В.
+Потоковая выгрузка развернутого ЖурналаОрдера в файл (csv/xlsx)
+"""
+
+import csv
+
+import sbis
+
+# Количество строк узла, запрашиваемых за один раз
+EXPORT_CHUNK_SIZE = 1000
+# Через какое количество выгруженных строк сообщать о прогрессе
+EXPORT_PROGRESS_STEP = 10000
+
+
+class CsvReportWriter:
+    """Запись строк отчета в csv"""
+
+    def __init__(self, stream, columns, delimiter=';'):
+        """
+        :param stream: текстовый поток для записи
+        :param columns: колонки отчета, список пар (поле, заголовок)
+        :param delimiter: разделитель колонок
+        """
+        self.columns = columns
+        self.writer = csv.writer(stream, delimiter=delimiter)
+        self.writer.writerow(['Уровень'] + [title for _, title in columns])
+
+    def add_format(self, rs):
+        """Учитывает формат порции строк (колонки фиксированы, ничего не делает)"""
+
+    def write(self, rec, level):
+        """Записывает строку отчета"""
+        self.writer.writerow([level] + [rec.Get(field) for field, _ in self.columns])
+
+    def close(self):
+        """Завершает запись (поток закрывает вызывающий)"""
+
+
+class XlsxReportWriter:
+    """Запись строк отчета в xlsx. Книга открывается в режиме write_only, записанные строки не хранятся в памяти"""
+
+    def __init__(self, path, columns, title='ЖурналОрдер'):
+        """
+        :param path: путь к файлу
+        :param columns: колонки отчета, список пар (поле, заголовок)
+        :param title: название листа
+        """
+        from openpyxl import Workbook
+
+        self.path = path
+        self.columns = columns
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet(title)
+        self.sheet.append(['Уровень'] + [title for _, title in columns])
+
+    def add_format(self, rs):
+        """Учитывает формат порции строк (колонки фиксированы, ничего не делает)"""
+
+    def write(self, rec, level):
+        """Записывает строку отчета"""
+        self.sheet.append([level] + [self.__get_value(rec.Get(field)) for field, _ in self.columns])
+
+    def close(self):
+        """Сохраняет книгу"""
+        self.workbook.save(self.path)
+
+    @staticmethod
+    def __get_value(value):
+        """Значение ячейки. Валютные суммы (HashTable) выводятся строкой"""
+        return str(value) if isinstance(value, dict) else value
+
+
+class RecordSetReportWriter:
+    """
+    Запись строк отчета в RecordSet (выгрузка в excel и печать средствами платформы)
+    Примечание: платформа формирует файл по результату метода, поэтому строки копятся в одном RecordSet. Формат
+    результата расширяется колонками каждой порции, как в развернутом отчете.
+    """
+
+    def __init__(self, correct_format):
+        """
+        :param correct_format: функция (result, rs), приводящая порцию строк rs к формату результата. При первой
+        порции result - None
+        """
+        self.correct_format = correct_format
+        self.result = None
+
+    def add_format(self, rs):
+        """Учитывает формат порции строк. Результат создается по формату первой порции (корня отчета) с ее итогами"""
+        self.correct_format(self.result, rs)
+        if self.result is None:
+            self.result = sbis.RecordSet(rs.Format())
+            self.result.outcome = rs.outcome
+
+    def write(self, rec, level):
+        """Записывает строку отчета"""
+        self.result.AddRow(rec)
+
+    def close(self):
+        """Завершает запись (результат в self.result)"""
+
+
+class JournalVoucherExport:
+    """
+    Потоковая выгрузка развернутого отчета
+    Дерево отчета обходится в глубину, строки каждого узла запрашиваются порциями по chunk_size и сразу передаются в
+    writer. В памяти одновременно находится не более одной порции на уровень дерева, поэтому расход памяти не зависит от
+    размера отчета, ограничения LIMIT_RECORD_EXPAND_REPORT(_XML) не применяются.
+    """
+
+    def __init__(self, _filter, writer, report_class, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+        """
+        :param _filter: фильтр отчета
+        :param writer: объект записи строк (CsvReportWriter, XlsxReportWriter, RecordSetReportWriter)
+        :param report_class: класс отчета узла (JournalVoucher), строит порцию строк методом get_report
+        :param chunk_size: количество строк узла, запрашиваемых за один раз
+        :param progress: функция, принимающая количество выгруженных строк. По умолчанию - логирование
+        """
+        self._filter = sbis.Record(_filter)
+        for field in ('ExpandAll', 'ExpandAllByLevels', 'KeysetPosition'):
+            if field in self._filter:
+                self._filter.Remove(field)
+        self.writer = writer
+        self.report_class = report_class
+        self.chunk_size = chunk_size
+        self.progress = progress or self.__log_progress
+        self.count_rows = 0
+
+    def export(self):
+        """Выгружает отчет. Возвращает количество выгруженных строк"""
+        # стек генераторов строк узлов от корня до текущего узла
+        nodes = [self.__get_node_rows(None)]
+        while nodes:
+            rec = next(nodes[-1], None)
+            if rec is None:
+                nodes.pop()
+                continue
+            self.writer.write(rec, len(nodes))
+            self.count_rows += 1
+            if self.count_rows % EXPORT_PROGRESS_STEP == 0:
+                self.progress(self.count_rows)
+            if rec.Get('parent@'):
+                nodes.append(self.__get_node_rows(rec.Get('id')))
+        self.writer.close()
+        self.progress(self.count_rows)
+        return self.count_rows
+
+    def __get_node_rows(self, parent):
+        """
+        Генератор строк узла, строки запрашиваются порциями по chunk_size
+        Примечание: если отчет узла поддерживает keyset-навигацию, следующая порция запрашивается от позиции
+        предыдущей (KeysetPosition в итогах), иначе - по номеру страницы. Окончание узла определяется по результату
+        навигации: порция может быть короче chunk_size, даже если строки узла не закончились
+        """
+        page = 0
+        position = None
+        while True:
+            rs = self.__get_chunk(parent, page, position)
+            if rs:
+                self.writer.add_format(rs)
+            yield from rs
+            if not (rs.nav_result and rs.nav_result.GetIsNext()):
+                return
+            page += 1
+            position = rs.outcome.Get('KeysetPosition')
+
+    def __get_chunk(self, parent, page, position):
+        """Возвращает порцию строк узла"""
+        node_filter = sbis.Record(self._filter)
+        if parent is not None:
+            if 'parent' not in node_filter:
+                node_filter.AddString('parent')
+            node_filter['parent'] = parent
+        node_filter.AddArrayString('KeysetPosition', position)
+        return self.report_class(node_filter, sbis.Navigation(self.chunk_size, page, True)).get_report()
+
+    @staticmethod
+    def __log_progress(count_rows):
+        """Логирует прогресс выгрузки"""
+        sbis.LogMsg('[EXPORT] rows: {}'.format(count_rows))
@@ -0,0 +1,47 @@
+"""
+Глухенко А.В.
+Фикстуры тестов ЖурналаОрдера
+Каталог отчета регистрируется пакетом JOURNAL_VOUCHER_PACKAGE, модуль платформы sbis подключается из замены (каталог
+shims). Замена действует на время модуля тестов: ранее загруженный sbis (например, замена из тестов займов) убирается
+из sys.modules и восстанавливается после тестов, поэтому тесты разных каталогов можно запускать одной командой.
+"""
+
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+JOURNAL_VOUCHER_PACKAGE = 'buh_journal_voucher'
+JOURNAL_VOUCHER_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHIMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shims')
+PLATFORM_PACKAGES = ('sbis',)
+
+
+def _pop_platform_modules():
+    """Убирает из sys.modules модуль платформы и пакет отчета, возвращает убранные модули"""
+    return {
+        name: sys.modules.pop(name)
+        for name in list(sys.modules)
+        if name.split('.')[0] in PLATFORM_PACKAGES + (JOURNAL_VOUCHER_PACKAGE,)
+    }
+
+
+@pytest.fixture(scope='module')
+def journal_voucher():
+    """Модули отчета: journal_voucher.module(name) возвращает модуль каталога отчета"""
+    saved_modules = _pop_platform_modules()
+    sys.path.insert(0, SHIMS_PATH)
+    package = types.ModuleType(JOURNAL_VOUCHER_PACKAGE)
+    package.__path__ = [JOURNAL_VOUCHER_PATH]
+    sys.modules[JOURNAL_VOUCHER_PACKAGE] = package
+    try:
+        yield types.SimpleNamespace(
+            sbis=importlib.import_module('sbis'),
+            module=lambda name: importlib.import_module('{}.{}'.format(JOURNAL_VOUCHER_PACKAGE, name)),
+        )
+    finally:
+        sys.path.remove(SHIMS_PATH)
+        _pop_platform_modules()
+        sys.modules.update(saved_modules)
@@ -0,0 +1,77 @@
+"""
+Глухенко А.В.
+Минимальная замена модуля платформы sbis для тестов ЖурналаОрдера (см. tests/conftest.py)
+Реализованы записи (Record, RecordSet), навигация и логирование, которые использует потоковая выгрузка.
+"""
+
+
+class Record:
+    """Запись"""
+    def __init__(self, data=None):
+        self._data = dict(data._data if isinstance(data, Record) else data or {})
+
+    def Get(self, name, default=None):
+        return self._data.get(name, default)
+
+    def AddString(self, name):
+        self._data.setdefault(name, None)
+
+    def AddArrayString(self, name, value=None):
+        self._data[name] = value
+
+    def Remove(self, name):
+        del self._data[name]
+
+    def __getitem__(self, name):
+        return self._data[name]
+
+    def __setitem__(self, name, value):
+        self._data[name] = value
+
+    def __contains__(self, name):
+        return name in self._data
+
+    def __repr__(self):
+        return 'Record({!r})'.format(self._data)
+
+
+class RecordSet:
+    """Набор записей. Формат - список имен полей"""
+    def __init__(self, rs_format=None, rows=None):
+        self._format = list(rs_format or [])
+        self._rows = list(rows or [])
+        self.outcome = Record()
+        self.nav_result = None
+
+    def Format(self):
+        return list(self._format)
+
+    def AddRow(self, rec):
+        self._rows.append(rec)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class Navigation:
+    """Постраничная навигация"""
+    def __init__(self, limit, page, has_more):
+        self.limit = limit
+        self.page = page
+        self.has_more = has_more
+
+
+class NavigationResultBool:
+    """Результат навигации: есть ли следующая страница"""
+    def __init__(self, is_next):
+        self.is_next = is_next
+
+    def GetIsNext(self):
+        return self.is_next
+
+
+def LogMsg(msg):
+    """Логирование (в тестах не выводится)"""
@@ -0,0 +1,112 @@
+"""
+Глухенко А.В.
+Тесты потоковой выгрузки развернутого ЖурналаОрдера (journal_voucher_export.JournalVoucherExport)
+"""
+
+import pytest
+
+COUNT_NODES = 3
+COUNT_LEAVES = 4000
+CHUNK_SIZE = 500
+# номер строки страницы, которую отчет узла отбрасывает (фильтр после LIMIT, страница короче chunk_size)
+SKIPPED_ROW = 7
+
+
+def get_node_rows(sbis, parent):
+    """Все строки узла отчета: у корня COUNT_NODES узлов, у каждого узла COUNT_LEAVES листьев"""
+    if parent is None:
+        return [sbis.Record({'id': 'node{}'.format(i), 'parent': None, 'parent@': True}) for i in range(COUNT_NODES)]
+    return [sbis.Record({'id': '{}-{}'.format(parent, i), 'parent': parent, 'parent@': None})
+            for i in range(COUNT_LEAVES)]
+
+
+def get_expected(sbis):
+    """Строки отчета в порядке обхода в глубину (без отброшенных строк): [(id, уровень)]"""
+    def get_rows(parent, level):
+        for i, rec in enumerate(get_node_rows(sbis, parent)):
+            if i % CHUNK_SIZE == SKIPPED_ROW:
+                continue
+            yield rec.Get('id'), level
+            if rec.Get('parent@'):
+                yield from get_rows(rec.Get('id'), level + 1)
+    return list(get_rows(None, 1))
+
+
+@pytest.fixture
+def report_class(journal_voucher):
+    """Класс отчета узла: строки постранично, из каждой страницы отбрасывается строка SKIPPED_ROW"""
+    sbis = journal_voucher.sbis
+
+    class TreeReport:
+        def __init__(self, _filter, navigation):
+            self._filter = _filter
+            self.navigation = navigation
+
+        def get_report(self):
+            rows = get_node_rows(sbis, self._filter.Get('parent'))
+            begin = self.navigation.page * self.navigation.limit
+            end = begin + self.navigation.limit
+            rs = sbis.RecordSet(['id', 'parent', 'parent@'])
+            for i, rec in enumerate(rows[begin:end]):
+                if i != SKIPPED_ROW:
+                    rs.AddRow(rec)
+            rs.nav_result = sbis.NavigationResultBool(end < len(rows))
+            return rs
+
+    return TreeReport
+
+
+class StubWriter:
+    """Запись строк отчета в список"""
+    def __init__(self):
+        self.rows = []
+        self.count_formats = 0
+        self.is_closed = False
+
+    def add_format(self, rs):
+        self.count_formats += 1
+
+    def write(self, rec, level):
+        self.rows.append((rec.Get('id'), level))
+
+    def close(self):
+        self.is_closed = True
+
+
+def test_export_without_limit(journal_voucher, report_class):
+    """Выгружаются все строки отчета (больше LIMIT_RECORD_EXPAND_REPORT_XML) в порядке обхода, короткие страницы
+    не обрывают узел"""
+    sbis = journal_voucher.sbis
+    export_module = journal_voucher.module('journal_voucher_export')
+    writer = StubWriter()
+    progress = []
+    _filter = sbis.Record({'ExpandAll': True, 'ExpandAllByLevels': True})
+
+    count_rows = export_module.JournalVoucherExport(
+        _filter, writer, report_class, chunk_size=CHUNK_SIZE, progress=progress.append,
+    ).export()
+
+    expected = get_expected(sbis)
+    assert len(expected) > 10000
+    assert writer.rows == expected
+    assert count_rows == len(expected)
+    assert writer.is_closed
+    assert writer.count_formats == 1 + COUNT_NODES * COUNT_LEAVES // CHUNK_SIZE
+    assert progress == [10000, len(expected)]
+    assert 'ExpandAll' in _filter
+
+
+def test_record_set_writer(journal_voucher, report_class):
+    """Выгрузка в RecordSet: результат по формату корня с его итогами, формат приводится по каждой порции"""
+    sbis = journal_voucher.sbis
+    export_module = journal_voucher.module('journal_voucher_export')
+    corrected = []
+    writer = export_module.RecordSetReportWriter(lambda result, rs: corrected.append(result is None))
+
+    export_module.JournalVoucherExport(
+        sbis.Record(), writer, report_class, chunk_size=CHUNK_SIZE, progress=lambda count_rows: None,
+    ).export()
+
+    assert [rec.Get('id') for rec in writer.result] == [row_id for row_id, _ in get_expected(sbis)]
+    assert writer.result.Format() == ['id', 'parent', 'parent@']
+    assert corrected == [True] + [False] * (COUNT_NODES * COUNT_LEAVES // CHUNK_SIZE)
@@ -43,12 +43,20 @@ FORWARD область (скролирование вниз).
 TODO:
 1. Перенести методы по работе с навигацией (в частности с курсором) в отдельный класс.
 Не забыть про helpers.py метод cut_by_navigation
+
+Объединение источников. Каждый источник возвращает страницу, упорядоченную в порядке реестра
+(Дата, ТипЗаписи, @Документ) по убыванию (см. get_sort_key). Страницы сливаются потоково (heapq.merge) в порядке
+обхода от курсора, из слияния берется ровно LIMIT записей, поэтому повторные сортировки и обрезка объединенного набора
+не требуются. BACKWARD и FORWARD области не пересекаются (разделены курсором), поэтому итоговая страница - их
+конкатенация. Служебные строки вставляются в упорядоченную страницу слиянием (см. __build_result).
 """
 
 
 __author__ = 'Glukhenko A.V.'
 
 import datetime
+import heapq
+import itertools
 
 import sbis
 from loans.utils.periods import BeautifulDateName
@@ -60,11 +68,11 @@ from .const import BOTHWAYS, FORWARD, BACKWARD
 from .const import LIST_PERCENT_FACT, LIST_PERCENT_PLAN, LIST_TODAY_SEPARATOR, LIST_YEAR_SEPARATOR
 from .const import ACCESS_WRITE, ACCESS_ADMIN
 from .const import PERCENT_ZONE
+from .cursor import RegistryCursor
 from .docs import PercentsListNew
 from .plan_docs import PlanPercentsList
-from .helpers import cut_by_navigation, get_date_update, is_last_month_day
-
-FORMAT_DATE_CURSOR = '%Y-%m-%d'
+from .helpers import cut_by_navigation, is_last_month_day
+from .page_annotator import PageAnnotator
 
 
 class PercentsListAggregator:
@@ -80,6 +88,7 @@ class PercentsListAggregator:
         self.result_format.AddRecord('РП.Документ')
 
         self.id_organization = self._filter.Get('ФильтрДокументНашаОрганизация')
+        self.cursor = RegistryCursor.from_position(self.navigation.Position())
         self.sources = self.__get_sources()
         self.is_first_page = self.__check_first_page()
 
@@ -96,78 +105,6 @@ class PercentsListAggregator:
             sources = {LIST_PERCENT_FACT, LIST_PERCENT_PLAN}
         return sources
 
-    def __get_date_doc_cursor(self, field):
-        """
-        Возвращает дату документа из курсора
-        :param field: поле курсора
-        """
-        date_doc = None
-        position = self.navigation.Position()
-        if position:
-            value = position.Get(field)
-            if value is not None:
-                if not isinstance(value, datetime.date):
-                    date_doc = datetime.datetime.strptime(value, FORMAT_DATE_CURSOR).date()
-                else:
-                    date_doc = value
-        return date_doc
-
-    def __get_id_doc_cursor(self, field):
-        """
-        Возвращает идентификатор документа из курсора
-        :param field: поле курсора
-        """
-        id_doc = None
-        position = self.navigation.Position()
-        if position:
-            value = position.Get(field)
-            if value is not None:
-                if not isinstance(value, int):
-                    id_doc = int(value)
-                else:
-                    id_doc = value
-        return id_doc
-
-    def __get_border_date_cursor(self):
-        """
-        Возвращает ближайшую граничную дату документа из курсора
-        Примечание: при добавлении служебных строк года или текущего дня, необходимо учитывать дату граничного документа
-        из курсора. В зависимости от направления скролирования необходимо брать минимальное или максимальное значение.
-        """
-        border_date = None
-        cursor_dates = list(filter(None, [
-            self.__get_date_doc_cursor('date_doc'),
-            self.__get_date_doc_cursor('date_plan_doc'),
-        ]))
-        if cursor_dates:
-            date_by_direction = {
-                BACKWARD: max(cursor_dates),
-                BOTHWAYS: self.today,
-                FORWARD: min(cursor_dates),
-            }
-            border_date = date_by_direction.get(self.navigation.Direction())
-        return border_date
-
-    def __get_need_today_cursor(self):
-        """Возвращает признак need_today из курсора"""
-        need_today = True
-        position = self.navigation.Position()
-        if position:
-            value = position.Get('need_today')
-            if value is not None:
-                need_today = bool(value)
-        return need_today
-
-    def __get_count_create_buttons(self):
-        """Возвращает количество кнопок создания, которые надо отобразить на клиенте"""
-        count_create_buttons = 2
-        position = self.navigation.Position()
-        if position:
-            value = position.Get('count_create_buttons')
-            if value is not None:
-                count_create_buttons = int(value)
-        return count_create_buttons
-
     def __check_first_page(self):
         """Проверяет, что запрашивается первая страница реестра"""
         is_first_page = any((
@@ -197,15 +134,17 @@ class PercentsListAggregator:
         """Проверяет, требуется ли возвращать служебные строки (запись текущего дня и записи годов)"""
         return not self._filter.Get('СписокИдО')
 
-    def __check_need_row_today(self, docs):
+    def __check_need_row_today(self, annotator):
         """
         Проверяет нужна ли разделительная линия
-        :param docs: набор документов
+        :param annotator: разметка страницы
         """
-        begin_period, end_period = self.__get_page_period(docs)
+        begin_period, end_period = annotator.get_period(
+            self.cursor.get_border_date(self.navigation.Direction(), self.today), self.today,
+        )
         return all((
             self.__check_need_service_row(),
-            self.__get_need_today_cursor(),
+            self.cursor.need_today,
             all((begin_period, end_period)) and begin_period <= self.today < end_period,
         ))
 
@@ -223,13 +162,7 @@ class PercentsListAggregator:
                 },
             }
         else:
-            data = {
-                'id_doc': self.__get_id_doc_cursor('id_doc'),
-                'date_doc': self.__get_date_doc_cursor('date_doc'),
-                'id_plan_doc': self.__get_id_doc_cursor('id_plan_doc'),
-                'date_plan_doc': self.__get_date_doc_cursor('date_plan_doc'),
-            }
-            data = {key: str(value) if value is not None else None for key, value in data.items()}
+            data = dict(zip(('id_doc', 'date_doc', 'id_plan_doc', 'date_plan_doc'), self.cursor.encode()))
             position = {
                 LIST_PERCENT_FACT: {
                     'id_doc': data.get('id_doc'),
@@ -255,10 +188,8 @@ class PercentsListAggregator:
             if self.navigation.Direction() == BACKWARD:
                 backward_docs = self.__request_backward_documents(count_on_page=self.navigation.Limit())
 
-        docs = self.__merge_result(backward_docs, forward_docs)
-        self.__post_processing(docs)
-        self.__sort_rs(docs)
-        return docs
+        rows, nav_result, annotator = self.__merge_result(backward_docs, forward_docs)
+        return self.__post_processing(rows, nav_result, annotator)
 
     def __request_forward_documents(self, count_on_page):
         """
@@ -298,7 +229,9 @@ class PercentsListAggregator:
         :param navigation: навигация запроса
         """
         if self.__check_need_fact():
-            doc_list = PercentsListNew(self._filter, navigation, self.doc_type, self.result_format).get_documents()
+            doc_list = PercentsListNew(
+                self._filter, navigation, self.doc_type, self.result_format, cursor=self.cursor,
+            ).get_documents()
             doc_list.rsPtr.Migrate(self.result_format)
         else:
             doc_list = sbis.RecordSet(self.result_format)
@@ -311,7 +244,7 @@ class PercentsListAggregator:
         :param navigation: навигация запроса
         """
         if self.__check_need_plan():
-            plan_list = PlanPercentsList(self._filter, navigation).get_documents()
+            plan_list = PlanPercentsList(self._filter, navigation, cursor=self.cursor).get_documents()
             plan_list.Migrate(self.result_format)
         else:
             plan_list = sbis.RecordSet(self.result_format)
@@ -326,38 +259,43 @@ class PercentsListAggregator:
         :param doc_list: объект доклиста с фактическими начислениями
         :param plan_list: список плановых начислений
         :param navigation: объект навигации
-        :param merged_result: объект, куда помещается результат объединения списков
+        Примечание: источники сливаются потоково в порядке обхода от курсора (FORWARD - вниз, BACKWARD - вверх), из
+        слияния берется LIMIT + 1 запись (лишняя запись - признак наличия следующей страницы)
         """
-        merged_result = sbis.RecordSet(self.result_format)
+        is_backward = navigation.Direction() == BACKWARD
+        sources = []
         if self.__check_need_fact():
-            for doc in doc_list.rsPtr:
-                merged_result.AddRow(doc)
+            sources.append(self.__iter_source(doc_list.rsPtr, is_backward))
         if self.__check_need_plan():
-            for plan_doc in plan_list:
-                merged_result.AddRow(plan_doc)
-        self.__sort_rs(merged_result)
-        self.__calc_navigation(doc_list, plan_list, navigation, merged_result)
-        return merged_result
-
-    def __calc_navigation(self, doc_list, plan_list, navigation, merged_result):
-        """
-        Расчитывает навигацию после объединения фактических и плановых документов
-        :param doc_list: объект доклиста с фактическими начислениями
-        :param plan_list: список плановых начислений
-        :param navigation: объект навигации
-        :param merged_result: объект, куда помещается результат объединения навигации
-        """
-        fact_more_exist = self.__is_more_exist_fact(doc_list, navigation)
-        plan_more_exist = self.__is_more_exist_plan(plan_list)
+            sources.append(self.__iter_source(plan_list, is_backward))
+        merged = heapq.merge(*sources, key=get_sort_key, reverse=not is_backward)
+        rows = list(itertools.islice(merged, navigation.Limit() + 1))
 
         result_more_exist = any((
-            any((fact_more_exist, plan_more_exist)),
-            self.__get_count_result(doc_list, plan_list) > navigation.Limit(),
+            len(rows) > navigation.Limit(),
+            self.__is_more_exist_fact(doc_list, navigation),
+            self.__is_more_exist_plan(plan_list),
         ))
+        rows = rows[:navigation.Limit()]
+        if is_backward:
+            rows.reverse()
 
+        merged_result = sbis.RecordSet(self.result_format)
+        for row in rows:
+            merged_result.AddRow(row)
         merged_result.nav_result = sbis.NavigationResult(result_more_exist)
-        if result_more_exist:
-            cut_by_navigation(merged_result, navigation)
+        return merged_result
+
+    @staticmethod
+    def __iter_source(rows, is_backward):
+        """
+        Возвращает записи источника в порядке обхода от курсора
+        :param rows: страница источника, RecordSet
+        :param is_backward: обход вверх от курсора (по возрастанию)
+        Примечание: страница источника уже упорядочена, сортировка упорядоченного списка выполняется за O(n) и лишь
+        гарантирует порядок, если источник вернул записи в обратном направлении
+        """
+        return iter(sorted(rows, key=get_sort_key, reverse=not is_backward))
 
     def __is_more_exist_fact(self, doc_list, navigation):
         """Проверяет наличие еще фактических записей"""
@@ -378,41 +316,48 @@ class PercentsListAggregator:
             plan_more_exist = False
         return plan_more_exist
 
-    def __get_count_result(self, doc_list, plan_list):
-        """Возвращает количество записей"""
-        count_result = 0
-        if self.__check_need_fact():
-            count_result += doc_list.rsPtr.Size()
-        if self.__check_need_plan():
-            count_result += plan_list.Size()
-        return count_result
-
     def __merge_result(self, backward_docs, forward_docs):
         """
-        Формирует итоговый результат
+        Формирует итоговый список документов
         :param backward_docs: список документов в BACKWARD зоне
         :param forward_docs: список документов в FORWARD зоне
+        :return: (документы страницы, результат навигации, разметка страницы)
         """
-        docs = sbis.RecordSet(self.result_format)
-        for rec in backward_docs:
-            docs.AddRow(rec)
-        for rec in forward_docs:
-            docs.AddRow(rec)
-
-        self.__sort_rs(docs)
-        self.__calc_result_navigation(docs, backward_docs.nav_result, forward_docs.nav_result)
-        return docs
+        rows = [*backward_docs, *forward_docs]
+        return self.__calc_result_navigation(rows, backward_docs.nav_result, forward_docs.nav_result)
 
-    def __post_processing(self, docs):
+    def __post_processing(self, rows, nav_result, annotator):
         """
         Постобработка результата
         - рассчитывает необходимые поля
         - добавляет служебные строки дат и текущего дня
-        :param docs: список документов
+        :param rows: документы страницы, упорядоченные по get_sort_key (по убыванию)
+        :param nav_result: результат навигации
+        :param annotator: разметка страницы
+        :return: итоговый список документов
+        Примечание: страница размечается за один проход (см. PageAnnotator), служебные строки и курсор рассчитываются
+        по разметке, итоговый набор формируется один раз
+        """
+        self.__enrich_documents(rows, annotator)
+        service_rows = self.__get_row_today(annotator)
+        has_row_today = bool(service_rows)
+        service_rows.extend(self.__get_rows_year(annotator, service_rows))
+        count_created_buttons = self.__set_calc_button(annotator)
+        docs = self.__build_result(rows, service_rows, nav_result)
+        self.__calc_position(docs, annotator, has_row_today, count_created_buttons)
+        self.__create_outcome(docs)
+        return docs
+
+    def __enrich_documents(self, rows, annotator):
         """
-        docs_data = self.__request_docs_data(docs)
+        Рассчитывает поля документов страницы
+        :param rows: документы страницы
+        :param annotator: разметка страницы
+        Примечание: данные фактических документов (наименования и суммы) загружаются одним запросом на страницу
+        """
+        docs_data = self.__request_docs_data(annotator.id_fact_docs)
         organization_selected = self.__get_organization_selected()
-        for doc in docs:
+        for doc in rows:
             id_doc = doc.Get('@Документ')
             type_row = doc.Get('ТипЗаписи')
             if type_row == LIST_PERCENT_FACT:
@@ -420,22 +365,30 @@ class PercentsListAggregator:
             doc['РП.Начислено'] = docs_data.get(id_doc, {}).get('РП.Начислено')
             doc['РП.Остаток'] = docs_data.get(id_doc, {}).get('РП.Остаток')
             doc['ДатаКрасивоеНазвание'] = self.__get_beautiful_date_name(doc)
-            doc['ДатаИзменения'] = get_date_update(doc)
             doc['show_organization'] = organization_selected
 
-        self.__add_row_today(docs)
-        self.__add_row_year(docs)
-        self.__set_calc_button(docs)
-        self.__calc_position(docs)
-        self.__create_outcome(docs)
+    def __build_result(self, rows, service_rows, nav_result):
+        """
+        Формирует итоговый набор документов
+        :param rows: документы страницы, упорядоченные по get_sort_key (по убыванию)
+        :param service_rows: служебные строки
+        :param nav_result: результат навигации
+        Примечание: служебные строки вставляются слиянием двух упорядоченных последовательностей, вместо добавления
+        строк в конец и сортировки всей страницы
+        """
+        service_rows.sort(key=get_sort_key, reverse=True)
+        docs = sbis.RecordSet(self.result_format)
+        for row in heapq.merge(rows, service_rows, key=get_sort_key, reverse=True):
+            docs.AddRow(row)
+        docs.nav_result = nav_result
+        return docs
 
-    def __request_docs_data(self, docs):
+    def __request_docs_data(self, id_docs):
         """
         Загружает данные по документам (наименования и суммы)
-        :param docs: список документов
+        :param id_docs: идентификаторы фактических документов
         """
         docs_data = {}
-        id_docs = [id_doc for id_doc in docs.ToList('@Документ') if id_doc > 0]
         for id_doc, rec in get_percent_data(self._lcdb, id_docs).items():
             docs_data[id_doc] = {
                 'РП.Лицо1.СписокНазваний': rec.Get('РП.Лицо1.СписокНазваний'),
@@ -444,12 +397,14 @@ class PercentsListAggregator:
             }
         return docs_data
 
-    def __add_row_today(self, docs):
+    def __get_row_today(self, annotator):
         """
-        Добавляет разделяющую линию текущего дня
-        :param docs: список документов
+        Возвращает разделяющую линию текущего дня (если требуется)
+        :param annotator: разметка страницы
+        :return: список служебных строк
         """
-        if self.__check_need_row_today(docs):
+        rows = []
+        if self.__check_need_row_today(annotator):
             today_text = sbis.rk('Сегодня')
             date_text = BeautifulDateName.get_beautiful_date(self.today)
             row = sbis.Record(self.result_format)
@@ -457,43 +412,21 @@ class PercentsListAggregator:
             row['Дата'] = self.today
             row['ТипЗаписи'] = LIST_TODAY_SEPARATOR
             row['ДатаКрасивоеНазвание'] = f'''{today_text} {date_text}'''
-            docs.AddRow(row)
-
-    def __get_page_period(self, docs):
-        """
-        Возвращает период формируемой страницы (т.е. даты первого и последнего документа на странице)
-        Примечание: в случае если на странице один документ или документы с одинаковыми датами, то используем даты
-        курсора для формирования периода
-        :param docs: набор документов на странице, RecordSet
-        :return: begin_period, end_period
-        """
-        dates = list(set(docs.ToList('Дата')))
-        begin_period, end_period = None, None
-
-        if dates:
-            if len(dates) == 1:
-                border_date = self.__get_border_date_cursor()
-                if border_date:
-                    begin_period = border_date
-                else:
-                    begin_period = self.today
-                end_period = dates[0]
-            else:
-                dates.sort()
-                begin_period = dates[0]
-                end_period = dates[-1]
-
-        return begin_period, end_period
+            rows.append(row)
+        return rows
 
-    def __add_row_year(self, docs):
+    def __get_rows_year(self, annotator, service_rows):
         """
-        Добавляет служебную строку даты
-        :param docs: список документов
+        Возвращает служебные строки годов
+        :param annotator: разметка страницы
+        :param service_rows: уже сформированные служебные строки (учитываются при расчете годов на странице)
+        :return: список служебных строк
         """
+        rows = []
         if not self.__check_need_service_row():
-            return
+            return rows
 
-        for year in self.__calc_years_on_page(docs):
+        for year in self.__calc_years_on_page(annotator, service_rows):
             service_date_row = sbis.Record(self.result_format)
             date = datetime.date(year, 12, 31)
             id_row = int(str(date).replace('-', ''))
@@ -501,54 +434,44 @@ class PercentsListAggregator:
             service_date_row['Дата'] = date
             service_date_row['ТипЗаписи'] = LIST_YEAR_SEPARATOR
             service_date_row['ДатаКрасивоеНазвание'] = str(year)
-            docs.AddRow(service_date_row)
+            rows.append(service_date_row)
+        return rows
 
-    def __calc_years_on_page(self, docs):
+    def __calc_years_on_page(self, annotator, service_rows):
         """
-        Рассчитывает количество строк года на странице.
-        :param docs: набор документов
+        Рассчитывает года, для которых требуются строки года на странице (все года, кроме последнего)
+        :param annotator: разметка страницы
+        :param service_rows: служебные строки, добавляемые на страницу
         Примечание: учитываются данные курсора - даты документов на предыдущей странице
         """
-        years = {doc.Get('Дата').year for doc in docs}
+        years = annotator.years | {row.Get('Дата').year for row in service_rows}
 
         if not self.is_first_page:
-            border_date = self.__get_border_date_cursor()
+            border_date = self.cursor.get_border_date(self.navigation.Direction(), self.today)
             if border_date:
                 years.add(border_date.year)
 
-        if years:
-            years = list(years)
-            years.sort()
-            years.pop(len(years) - 1)
+        return sorted(years)[:-1]
 
-        return years
-
-    @staticmethod
-    def __sort_rs(rows):
-        """Сортирует результат выборки"""
-        rows.sort(key=lambda rec: (
-            rec.Get('Дата'),
-            rec.Get('ТипЗаписи') or -1,
-            rec.Get('@Документ'),
-        ), reverse=True)
-
-    def __calc_result_navigation(self, docs, backward_nav_result, forward_nav_result):
+    def __calc_result_navigation(self, rows, backward_nav_result, forward_nav_result):
         """
         Рассчитывает результат навигации
-        :param docs: список документов
+        :param rows: документы страницы
         :param backward_nav_result: результат навигации BACKWARD зоны
         :param forward_nav_result: результат навигации FORWARD зоны
+        :return: (документы страницы, результат навигации, разметка страницы)
         Примечание: если найдены служебные строки, то проставим признак наличия след.страниц (обрезанные записи
-        нужно будет зачитать следующей страницей)
+        нужно будет зачитать следующей страницей). Страница размечается повторно только после обрезки.
         """
-        count_service_rows = self.__calc_count_service_rows(docs)
+        annotator = PageAnnotator(rows)
+        count_service_rows = self.__calc_count_service_rows(annotator)
         need_cut_result = all((
-            docs.Size() == self.navigation.Limit(),
+            len(rows) == self.navigation.Limit(),
             count_service_rows,
         ))
 
         if self.is_first_page:
-            docs.nav_result = sbis.NavigationResult(
+            nav_result = sbis.NavigationResult(
                 backward_nav_result.GetIsNext() or need_cut_result,
                 forward_nav_result.GetIsNext() or need_cut_result,
             )
@@ -558,38 +481,40 @@ class PercentsListAggregator:
                 FORWARD: forward_nav_result,
             }
             navigation = navigations.get(self.navigation.Direction())
-            docs.nav_result = sbis.NavigationResult(
+            nav_result = sbis.NavigationResult(
                 navigation.GetIsNext() or need_cut_result,
             )
 
         if need_cut_result:
-            self.__cut_result_by_service_rows(docs, count_service_rows)
+            rows = self.__cut_result_by_service_rows(rows, count_service_rows)
+            annotator = PageAnnotator(rows)
+        return rows, nav_result, annotator
 
-    def __calc_count_service_rows(self, docs):
+    def __calc_count_service_rows(self, annotator):
         """Рассчитывает количество служебных строк на странице"""
-        years = {doc.Get('Дата').year for doc in docs}
-        count_service_rows = len(years) - 1
-        if self.__check_need_row_today(docs):
+        count_service_rows = len(annotator.years) - 1
+        if self.__check_need_row_today(annotator):
             count_service_rows += 1
         return count_service_rows
 
-    def __set_calc_button(self, docs):
+    def __set_calc_button(self, annotator):
         """
         Устанавливает признак кнопки Рассчитать для плановой записи
-        :param docs: список документов
+        :param annotator: разметка страницы
+        :return: количество созданных кнопок на текущую и будущие даты (учитывается в курсоре)
         """
-        count_create_buttons = self.__get_count_create_buttons()
+        count_create_buttons = self.cursor.count_create_buttons
+        button_created = 0
         if count_create_buttons and self.__check_zone(PERCENT_ZONE, (ACCESS_WRITE, ACCESS_ADMIN)):
-            button_created = 0
-            for i in reversed(range(docs.Size())):
-                if docs.Get(i, 'ТипЗаписи') == LIST_PERCENT_PLAN:
-                    show_create_button = False
-                    if docs.Get(i, 'Дата') < self.today:
-                        show_create_button = True
-                    elif count_create_buttons - button_created > 0:
-                        show_create_button = True
-                        button_created += 1
-                    docs.Set(i, 'show_create_button', show_create_button)
+            for row in reversed(annotator.plan_rows):
+                show_create_button = False
+                if row.Get('Дата') < self.today:
+                    show_create_button = True
+                elif count_create_buttons - button_created > 0:
+                    show_create_button = True
+                    button_created += 1
+                row['show_create_button'] = show_create_button
+        return button_created
 
     @staticmethod
     def __check_zone(zone, actions):
@@ -612,64 +537,48 @@ class PercentsListAggregator:
         outcome.AddBool('need_row_today')
         docs.outcome = outcome
 
-    def __calc_need_row_today(self, docs):
-        """
-        Рассчитывает, потребуется ли добавлять линию текущего дня для следующих страниц
-        :param docs: набор документов на странице
-        :return: bool
-        """
-        need_today = self.__get_need_today_cursor()
-        if need_today:
-            today_row_on_the_page = any(filter(lambda row: row.Get('ТипЗаписи') == LIST_TODAY_SEPARATOR, docs))
-            need_today = not today_row_on_the_page
-        return need_today
-
-    def __cut_result_by_service_rows(self, docs, count_service_rows):
+    def __cut_result_by_service_rows(self, rows, count_service_rows):
         """
         Обрезает список документов на количество служебных строк
-        :param docs: список документов
+        :param rows: документы страницы
         :param count_service_rows: количество служебных записей
+        :return: оставшиеся документы
         Примечание: после удаления документов, количество служебных строк может уменьшится. Принимаем тот факт что на
         странице может быть меньше LIMIT записей, т.к. курсоры выручат.
         """
-        direction = self.navigation.Direction()
-        limit = self.navigation.Limit() - count_service_rows
-        id_docs = [doc.Get('@Документ') for doc in docs if
-                   doc.Get('ТипЗаписи') in (LIST_PERCENT_PLAN, LIST_PERCENT_FACT)]
-
-        if direction in (BOTHWAYS, FORWARD):
-            id_docs_for_remove = id_docs[limit:]
-        else:
-            id_docs_for_remove = id_docs[:len(id_docs) - limit]
-
-        for doc in reversed(docs):
-            if doc.Get('@Документ') in id_docs_for_remove:
-                docs.DelRow(doc)
+        return cut_by_navigation(
+            rows,
+            self.navigation,
+            limit=self.navigation.Limit() - count_service_rows,
+            is_counted=lambda doc: doc.Get('ТипЗаписи') in (LIST_PERCENT_PLAN, LIST_PERCENT_FACT),
+        )
 
-    def __calc_position(self, docs):
+    def __calc_position(self, docs, annotator, has_row_today, count_created_buttons):
         """
         Расчитывает значение курсора
-        Формат курсора: [id_doc, date_doc, id_plan_doc, date_plan_doc]
-        :param docs: список документов
+        Формат курсора: [id_doc, date_doc, id_plan_doc, date_plan_doc, count_create_buttons, need_today]
+        :param docs: итоговый список документов
+        :param annotator: разметка страницы
+        :param has_row_today: признак, что на странице есть линия текущего дня
+        :param count_created_buttons: количество кнопок создания, показанных на странице
         Примечание: важно прокидывать значения текущего курсора, если на текущей странице отсутствуют записи
         соответствующего типа
         """
-        first_row, last_row = self.__calc_boundary_rows(docs)
-        first_row, last_row = self.__join_positions(first_row, last_row)
-        count_create_button = self.__calc_count_create_buttons(docs)
-        need_row_today = self.__calc_need_row_today(docs)
-        backward = [
+        first_row, last_row = self.__join_positions(*annotator.get_boundary_rows())
+        count_create_button = max(0, self.cursor.count_create_buttons - count_created_buttons)
+        need_row_today = self.cursor.need_today and not has_row_today
+        backward = RegistryCursor.decode([
             first_row[LIST_PERCENT_FACT]['id_doc'], first_row[LIST_PERCENT_FACT]['date_doc'],
             first_row[LIST_PERCENT_PLAN]['id_doc'], first_row[LIST_PERCENT_PLAN]['date_doc'],
-            str(count_create_button),
-            str(need_row_today),
-        ]
-        forward = [
+            count_create_button,
+            need_row_today,
+        ]).encode()
+        forward = RegistryCursor.decode([
             last_row[LIST_PERCENT_FACT]['id_doc'], last_row[LIST_PERCENT_FACT]['date_doc'],
             last_row[LIST_PERCENT_PLAN]['id_doc'], last_row[LIST_PERCENT_PLAN]['date_doc'],
-            str(count_create_button),
-            str(need_row_today),
-        ]
+            count_create_button,
+            need_row_today,
+        ]).encode()
         if self.is_first_page:
             next_position = {'backward': backward, 'forward': forward}
             docs.SetMetadataHashTable("nextPosition", next_position)
@@ -680,44 +589,6 @@ class PercentsListAggregator:
             }
             docs.Metadata().AddJson('nextPosition', next_positions.get(self.navigation.Direction()))
 
-    @staticmethod
-    def __calc_boundary_rows(docs):
-        """
-        Рассчитывает первые и последние строки в результате (результат содержит записи двух типов: план и факт)
-        :param docs: список документов
-        Примечание: учитываем что в наборе могут быть записи двух типов, плановые и фактические начисления. Требуется
-        найти граничные строки для этих двух типов
-        """
-        template = {'id_doc': None, 'date_doc': None}
-        first_row = {LIST_PERCENT_FACT: dict(template), LIST_PERCENT_PLAN: dict(template)}
-        last_row = {LIST_PERCENT_FACT: dict(template), LIST_PERCENT_PLAN: dict(template)}
-
-        for i in range(docs.Size()):
-            type_row = docs.Get(i, "ТипЗаписи")
-            if type_row not in (LIST_PERCENT_FACT, LIST_PERCENT_PLAN):
-                continue
-            for field, position_field in (
-                    ('@Документ', 'id_doc'),
-                    ('Дата', 'date_doc'),
-            ):
-                value = docs.Get(i, field)
-                if first_row.get(type_row).get(position_field) is None:
-                    first_row[type_row][position_field] = str(value) if value is not None else None
-                last_row[type_row][position_field] = str(value) if value is not None else None
-
-        return first_row, last_row
-
-    def __calc_count_create_buttons(self, docs):
-        """
-        Рассчитывает сколько кнопок осталось создать (на следующих страницах)
-        :param docs: список документов
-        """
-        count_create_buttons = self.__get_count_create_buttons()
-        count_created_buttons = len(
-            [1 for row in docs if row.Get('show_create_button') and row.Get('Дата') >= self.today]
-        )
-        return max(0, count_create_buttons - count_created_buttons)
-
     def __join_positions(self, first_row, last_row):
         """
         Объединяет старый и текущий курсоры
@@ -747,6 +618,14 @@ class PercentsListAggregator:
         return beautiful_date
 
 
+def get_sort_key(rec):
+    """
+    Возвращает ключ сортировки записи реестра (реестр упорядочен по ключу по убыванию)
+    :param rec: запись реестра
+    """
+    return rec.Get('Дата'), rec.Get('ТипЗаписи') or -1, rec.Get('@Документ')
+
+
 def get_percents_list(_filter, navigation):
     """
     Возвращает реестр процентов
@@ -0,0 +1,22 @@
+"""
+Пакет для локального воспроизведения производительности реестра процентов (get_percents_list).
+
+Состав
+- fixtures.py - генератор синтетических данных ("Лицо", "Документ", "РазличныеДокументы", "ДебетКредит",
+"СвязьДокументов", "ДокументРасширение") в локальной базе Postgres с настраиваемым масштабом (FixtureScale)
+- sbis_stub.py - минимальная замена модуля sbis (Record, RecordSet, Navigation, SqlQuery и т.д.) поверх psycopg2
+- shims - минимальная замена пакетов платформы loans и doclist (только то, что использует реестр)
+- runner.py - замер сценариев реестра через PercentsListAggregator: первая страница, глубокая страница, страница
+вверх (BACKWARD), страница с фильтром по периоду
+
+Пример
+    python "loans example/precent registry/bench/runner.py" --dsn "dbname=loans_bench" --fill --orgs 200 --repeat 5
+
+Примечание: замена sbis подключается только раннером (sys.modules['sbis']), модули реестра ее не импортируют. Раннер
+регистрирует каталог реестра как пакет REGISTRY_PACKAGE (см. runner.py), поэтому относительные импорты работают. Пакеты
+платформы loans и doclist берутся из PYTHONPATH, если они установлены (тогда идентификаторы типов документов, счетов и
+аналитик в данных FixtureIds должны совпадать с LCDB стенда), иначе - из shims.
+"""
+
+
+__author__ = 'Glukhenko A.V.'
@@ -0,0 +1,310 @@
+"""
+Модуль отвечает за заполнение локальной базы синтетическими данными реестра процентов.
+
+Схема содержит только таблицы и колонки, которые используют запросы реестра:
+- "Лицо" - наши организации, контрагенты и лица договоров (аналитика "Лицо2" проводок)
+- "Документ" - договоры займа (выданные/полученные) и документы начисления процентов
+- "РазличныеДокументы" - ставка и период договора
+- "ДебетКредит" - проводки выдачи, погашения и начисления процентов
+- "СвязьДокументов" - связь начисления процентов с договором
+- "ДокументРасширение" - дата создания и параметры (hstore, ключ date_update) документов начисления процентов
+
+Локальная сборка Postgres может не содержать расширения hstore, поэтому используется его замена (CREATE_HSTORE):
+составной тип hstore, приведение text::hstore и оператор "->", которых достаточно для запросов реестра.
+
+Масштаб задается FixtureScale: количество организаций, договоров на организацию, месяцев истории. По каждому договору
+формируются выдача, ежемесячные погашения и начисления процентов (последний день месяца), часть договоров
+погашается полностью. Данные детерминированы (seed), поэтому замеры на разных ветках сопоставимы.
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import calendar
+import datetime
+import random
+from collections import namedtuple
+
+from ..migrations import migrate
+
+FixtureScale = namedtuple('FixtureScale', ('orgs', 'loans_by_org', 'months', 'share_repaid', 'seed'))
+FixtureScale.__new__.__defaults__ = (10, 20, 36, 0.3, 1)
+
+# Идентификаторы справочников (должны совпадать с LCDB стенда)
+FixtureIds = namedtuple('FixtureIds', (
+    'issued_type', 'received_type', 'percents_type', 'debt_analytic', 'percent_analytic', 'account', 'link_type',
+))
+FixtureIds.__new__.__defaults__ = (1001, 1002, 1003, 2001, 2002, 3001, 1)
+
+# Количество строк в одной вставке
+BATCH_SIZE = 5000
+
+CREATE_SCHEMA = '''
+    DROP TABLE IF EXISTS "Лицо", "Документ", "РазличныеДокументы", "ДебетКредит", "СвязьДокументов",
+        "ДокументРасширение";
+    CREATE TABLE "Лицо" (
+        "@Лицо" integer PRIMARY KEY,
+        "Название" text
+    );
+    CREATE TABLE "Документ" (
+        "@Документ" integer PRIMARY KEY,
+        "ТипДокумента" integer NOT NULL,
+        "Дата" date NOT NULL,
+        "Номер" text,
+        "Лицо" integer,
+        "Лицо1" integer,
+        "ДокументНашаОрганизация" integer,
+        "$Черновик" integer,
+        "Удален" boolean
+    );
+    CREATE TABLE "РазличныеДокументы" (
+        "@Документ" integer PRIMARY KEY,
+        "Коэффициент" numeric,
+        "ДатаНач" date,
+        "ДатаКнц" date
+    );
+    CREATE TABLE "ДебетКредит" (
+        "@ДебетКредит" serial PRIMARY KEY,
+        "Документ" integer,
+        "Дата" date NOT NULL,
+        "Тип" integer NOT NULL,
+        "Сумма" numeric NOT NULL,
+        "Счет" integer,
+        "НашаОрганизация" integer,
+        "Лицо2" integer,
+        "Лицо3" integer
+    );
+    CREATE TABLE "СвязьДокументов" (
+        "@СвязьДокументов" serial PRIMARY KEY,
+        "ДокументОснование" integer,
+        "ДокументСледствие" integer,
+        "ВидСвязи" integer,
+        "Дата" date
+    );
+    CREATE TABLE "ДокументРасширение" (
+        "@Документ" integer PRIMARY KEY,
+        "ДатаВремяСоздания" timestamp,
+        "Параметры" text
+    );
+'''
+
+CREATE_HSTORE = r'''
+    DO $$
+    BEGIN
+        IF to_regtype('hstore') IS NULL THEN
+            CREATE TYPE hstore AS ("pairs" jsonb);
+            CREATE FUNCTION hstore_from_text(text) RETURNS hstore LANGUAGE sql IMMUTABLE STRICT AS $f$
+                SELECT ROW(COALESCE(jsonb_object_agg(pair[1], pair[2]), '{}'))::hstore
+                FROM regexp_matches($1, '"((?:[^"\\]|\\.)*)"\s*=>\s*"((?:[^"\\]|\\.)*)"', 'g') pair
+            $f$;
+            CREATE CAST (text AS hstore) WITH FUNCTION hstore_from_text(text);
+            CREATE FUNCTION hstore_get(hstore, text) RETURNS text LANGUAGE sql IMMUTABLE AS $f$
+                SELECT ($1)."pairs" ->> $2
+            $f$;
+            CREATE OPERATOR -> (LEFTARG = hstore, RIGHTARG = text, FUNCTION = hstore_get);
+        END IF;
+    END
+    $$;
+'''
+
+CREATE_INDEXES = '''
+    CREATE INDEX ON "Документ" ("Лицо");
+    CREATE INDEX ON "ДебетКредит" ("Лицо2", "Лицо3");
+    CREATE INDEX ON "СвязьДокументов" ("ДокументСледствие");
+'''
+
+# Синтетические документы начисления процентов без проводок и связей (нагрузка на список фактических документов).
+# Документы распределяются по нашим организациям фикстуры и датам истории
+ADD_PERCENT_DOCS = '''
+    WITH "orgs" AS (
+        SELECT array_agg(DISTINCT "ДокументНашаОрганизация") "ids"
+        FROM "Документ"
+        WHERE "ДокументНашаОрганизация" IS NOT NULL
+    ), "base" AS (
+        SELECT COALESCE(MAX("@Документ"), 0) "id" FROM "Документ"
+    )
+    INSERT INTO "Документ"
+    SELECT
+        "base"."id" + "n",
+        %(percents_type)s,
+        %(today)s::date - (random() * %(days)s)::integer,
+        ("base"."id" + "n")::text,
+        NULL,
+        NULL,
+        "orgs"."ids"[1 + ("n" %% cardinality("orgs"."ids"))],
+        NULL,
+        NULL
+    FROM
+        generate_series(1, %(count)s) "n", "orgs", "base"
+'''
+
+
+class RegistryFixtures:
+    """Класс формирует и загружает синтетические данные реестра процентов"""
+    def __init__(self, connection, scale=None, ids=None, today=None):
+        """
+        :param connection: подключение psycopg2
+        :param scale: масштаб данных, FixtureScale
+        :param ids: идентификаторы справочников, FixtureIds
+        :param today: дата, от которой строится история (по умолчанию текущая)
+        """
+        self.connection = connection
+        self.scale = scale or FixtureScale()
+        self.ids = ids or FixtureIds()
+        self.today = today or datetime.date.today()
+        self.random = random.Random(self.scale.seed)
+        self.__next_id = 0
+
+    def fill(self):
+        """
+        Пересоздает таблицы и заполняет их данными
+        :return: количество строк по таблицам
+        """
+        rows = {
+            'Лицо': [],
+            'Документ': [],
+            'РазличныеДокументы': [],
+            'ДебетКредит': [],
+            'СвязьДокументов': [],
+            'ДокументРасширение': [],
+        }
+        for index_org in range(self.scale.orgs):
+            self.__add_org(rows, index_org)
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(CREATE_HSTORE)
+            cursor.execute(CREATE_SCHEMA)
+            for table, table_rows in rows.items():
+                self.__insert(cursor, table, table_rows)
+            cursor.execute(CREATE_INDEXES)
+        migrate()
+        with self.connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return {table: len(table_rows) for table, table_rows in rows.items()}
+
+    def add_percent_docs(self, count):
+        """
+        Добавляет синтетические документы начисления процентов (см. ADD_PERCENT_DOCS)
+        :param count: количество документов
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT setseed(%s)', (1 / (self.scale.seed + 1),))
+            cursor.execute(ADD_PERCENT_DOCS, {
+                'percents_type': self.ids.percents_type,
+                'today': self.today,
+                'days': self.scale.months * 30,
+                'count': count,
+            })
+            cursor.execute('ANALYZE "Документ"')
+
+    def __get_id(self):
+        """Возвращает следующий идентификатор"""
+        self.__next_id += 1
+        return self.__next_id
+
+    def __add_org(self, rows, index_org):
+        """
+        Формирует данные одной нашей организации
+        :param rows: строки по таблицам
+        :param index_org: порядковый номер организации
+        """
+        id_org = self.__get_id()
+        rows['Лицо'].append((id_org, f'Организация {index_org:05d}'))
+        first_month = self.__add_months(self.today, -self.scale.months)
+        percent_docs = {}
+        for index_loan in range(self.scale.loans_by_org):
+            self.__add_loan(rows, id_org, index_loan, first_month, percent_docs)
+
+    def __add_loan(self, rows, id_org, index_loan, first_month, percent_docs):
+        """
+        Формирует договор займа с проводками и начислениями процентов
+        :param rows: строки по таблицам
+        :param id_org: наша организация
+        :param index_loan: порядковый номер договора в организации
+        :param first_month: первый месяц истории
+        :param percent_docs: документы начисления процентов организации по датам (общие для договоров одной даты)
+        """
+        ids = self.ids
+        is_issued = index_loan % 2 == 0
+        id_loan, id_face, id_contractor = self.__get_id(), self.__get_id(), self.__get_id()
+        date_issue = self.__add_months(first_month, self.random.randrange(self.scale.months))
+        date_issue = date_issue.replace(day=self.random.randint(1, 28))
+        count_months = self.random.randint(6, 60)
+        amount = self.random.randrange(100, 10000) * 1000
+
+        rows['Лицо'].append((id_face, f'Договор {id_loan}'))
+        rows['Лицо'].append((id_contractor, f'Контрагент {id_contractor:07d}'))
+        rows['Документ'].append((
+            id_loan, ids.issued_type if is_issued else ids.received_type, date_issue, str(id_loan),
+            id_face, id_contractor, id_org, None, None,
+        ))
+        rows['РазличныеДокументы'].append((
+            id_loan, self.random.choice((7.5, 10, 12.25, 15)), date_issue, self.__add_months(date_issue, count_months),
+        ))
+        type_issue, type_repay = (1, 2) if is_issued else (2, 1)
+        self.__add_posting(rows, id_loan, date_issue, type_issue, amount, id_org, id_face, ids.debt_analytic)
+
+        is_repaid = self.random.random() < self.scale.share_repaid
+        payment = amount // count_months
+        rest = amount
+        for index_month in range(count_months):
+            date = self.__get_month_end(self.__add_months(date_issue, index_month))
+            if date >= self.today:
+                break
+            id_percent = percent_docs.get(date)
+            if id_percent is None:
+                id_percent = percent_docs[date] = self.__get_id()
+                rows['Документ'].append((
+                    id_percent, ids.percents_type, date, str(id_percent), None, None, id_org, None, None,
+                ))
+                rows['ДокументРасширение'].append(self.__get_doc_ext(id_percent, date))
+            rows['СвязьДокументов'].append((id_loan, id_percent, ids.link_type, date))
+            self.__add_posting(
+                rows, id_percent, date, type_issue, round(rest * 0.01, 2), id_org, id_face, ids.percent_analytic,
+            )
+            repay = rest if is_repaid and index_month == count_months - 1 else min(payment, rest)
+            if repay:
+                rest -= repay
+                self.__add_posting(rows, id_loan, date, type_repay, repay, id_org, id_face, ids.debt_analytic)
+
+    def __get_doc_ext(self, id_doc, date):
+        """
+        Формирует расширение документа начисления процентов
+        Примечание: у половины документов в параметрах есть дата изменения
+        """
+        created = datetime.datetime.combine(date, datetime.time(10))
+        params = None
+        if self.random.random() < 0.5:
+            params = f'"date_update"=>"{date + datetime.timedelta(days=self.random.randint(0, 30)):%Y-%m-%d %H:%M:%S}"'
+        return id_doc, created, params
+
+    def __add_posting(self, rows, id_doc, date, type_posting, amount, id_org, id_face, analytic):
+        """Добавляет проводку"""
+        rows['ДебетКредит'].append((id_doc, date, type_posting, amount, self.ids.account, id_org, id_face, analytic))
+
+    @staticmethod
+    def __add_months(date, count_months):
+        """Сдвигает дату на количество месяцев (число месяца ограничивается последним днем)"""
+        month = date.month - 1 + count_months
+        year, month = date.year + month // 12, month % 12 + 1
+        return date.replace(year=year, month=month, day=min(date.day, calendar.monthrange(year, month)[1]))
+
+    @staticmethod
+    def __get_month_end(date):
+        """Возвращает последний день месяца"""
+        return date.replace(day=calendar.monthrange(date.year, date.month)[1])
+
+    @staticmethod
+    def __insert(cursor, table, rows):
+        """
+        Вставляет строки в таблицу пачками
+        Примечание: колонки с serial ключом ("ДебетКредит", "СвязьДокументов") заполняются базой
+        """
+        from psycopg2.extras import execute_values
+
+        columns = {
+            'ДебетКредит': '("Документ", "Дата", "Тип", "Сумма", "Счет", "НашаОрганизация", "Лицо2", "Лицо3")',
+            'СвязьДокументов': '("ДокументОснование", "ДокументСледствие", "ВидСвязи", "Дата")',
+        }.get(table, '')
+        for index in range(0, len(rows), BATCH_SIZE):
+            execute_values(cursor, f'INSERT INTO "{table}" {columns} VALUES %s', rows[index:index + BATCH_SIZE])
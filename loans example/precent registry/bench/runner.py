@@ -0,0 +1,380 @@
+"""
+Модуль замеряет построение реестра процентов на локальной базе (см. fixtures.py).
+
+Сценарии (PercentsListAggregator.get_documents):
+- first_page - первая страница (BOTHWAYS от текущей даты)
+- deep_page - страница FORWARD после пролистывания DEEP_PAGES страниц вниз
+- backward_page - страница BACKWARD (будущие плановые начисления) от курсора первой страницы
+- period_page - первая страница с фильтром по периоду (последний полный год)
+- fact_page_N - страница N только фактических документов (ТипЗаписи), номера страниц задает --fact-pages. Позиция
+  страницы вычисляется запросом FACT_PAGE_POSITION, а не пролистыванием, поэтому доступны страницы порядка 1000.
+  Для замера на миллионе документов база дополняется синтетическими начислениями (--fact-docs)
+
+Каждый сценарий выполняется repeat раз, выводится минимальное и медианное время. Пролистывание до глубокой страницы
+в замер не входит. Если данных меньше DEEP_PAGES страниц, замер прерывается: глубокая страница не была бы глубокой.
+
+Замер планирования (--planning N, см. PlanningBenchmark) сравнивает время планирования запроса списка договоров
+(PercentsToAccruedSqlMaker.create_sql) для N наборов разрешенных организаций: с организациями в тексте запроса и с
+организациями параметром подготовленного запроса.
+
+Пакеты платформы loans и doclist берутся из PYTHONPATH, а при их отсутствии - из замены (каталог shims), поэтому
+замер выполняется без платформы.
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import argparse
+import datetime
+import importlib
+import logging
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import types
+
+REGISTRY_PACKAGE = 'percent_registry'
+REGISTRY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHIMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shims')
+
+# Количество страниц, пролистываемых до глубокой страницы
+DEEP_PAGES = 20
+PAGE_LIMIT = 30
+
+# Последний документ страницы, предшествующей странице фактических документов (порядок и фильтры доклиста реестра)
+FACT_PAGE_POSITION = '''
+    SELECT
+        "@Документ",
+        "Дата"
+    FROM
+        "Документ"
+    WHERE
+        "ТипДокумента" = $1::integer AND
+        "Удален" IS NOT TRUE AND
+        "$Черновик" IS NULL AND
+        "ДокументНашаОрганизация" != $2::integer AND
+        "Дата" <= $3::date
+    ORDER BY
+        "Дата" DESC, "@Документ" DESC
+    OFFSET $4::integer
+    LIMIT 1
+'''
+
+PLANNING_PATTERN = re.compile(r'^(Planning|Execution) Time: ([\d.]+) ms$')
+PREPARED_NAME = 'bench_plan_loans'
+# Режимы замера планирования: {режим: plan_cache_mode}
+PLANNING_MODES = {'literal': 'auto', 'prepared': 'auto', 'prepared_generic': 'force_generic_plan'}
+# Запросы списка договоров, время планирования которых замеряется (см. PlanningBenchmark)
+PLANNING_SQL_METHODS = ('create_sql', 'create_cache_sql')
+
+
+def load_registry():
+    """
+    Подключает замену sbis и регистрирует каталог реестра как пакет REGISTRY_PACKAGE
+    :return: (модуль замены sbis, модуль fixtures, модуль base реестра)
+    Примечание: каталог замены пакетов платформы добавляется в конец sys.path, поэтому установленные пакеты
+    платформы имеют приоритет
+    """
+    package = types.ModuleType(REGISTRY_PACKAGE)
+    package.__path__ = [REGISTRY_PATH]
+    sys.modules[REGISTRY_PACKAGE] = package
+    sbis_stub = importlib.import_module(f'{REGISTRY_PACKAGE}.bench.sbis_stub')
+    sys.modules['sbis'] = sbis_stub
+    if SHIMS_PATH not in sys.path:
+        sys.path.append(SHIMS_PATH)
+    fixtures = importlib.import_module(f'{REGISTRY_PACKAGE}.bench.fixtures')
+    base = importlib.import_module(f'{REGISTRY_PACKAGE}.base')
+    return sbis_stub, fixtures, base
+
+
+class RegistryBenchmark:
+    """Класс выполняет сценарии замера реестра процентов"""
+    def __init__(self, sbis, base, limit=PAGE_LIMIT, repeat=5, fact_pages=()):
+        """
+        :param sbis: модуль замены sbis
+        :param base: модуль base реестра
+        :param limit: размер страницы
+        :param repeat: количество повторов сценария
+        :param fact_pages: номера страниц сценариев fact_page_N
+        """
+        self.sbis = sbis
+        self.base = base
+        self.cursor_module = importlib.import_module(f'{REGISTRY_PACKAGE}.cursor')
+        self.limit = limit
+        self.repeat = repeat
+        self.fact_pages = fact_pages
+        self.count_rows = 0
+
+    def run(self):
+        """
+        Выполняет все сценарии
+        :return: {сценарий: [время выполнения, с]}
+        """
+        sbis = self.sbis
+        first_page = self.__get_page(self.__get_filter(), sbis.NavigationDirection.ndBOTHWAYS)
+        next_position = first_page.Metadata().Get('nextPosition')
+        self.count_rows = first_page.Size()
+
+        deep_position = next_position['forward']
+        for count_pages in range(DEEP_PAGES):
+            page = self.__get_page(self.__get_filter(), sbis.NavigationDirection.ndFORWARD, deep_position)
+            if not page.Size() or not page.nav_result.GetIsNext():
+                raise sbis.Error(
+                    f'Реестр закончился на {count_pages + 1} странице из {DEEP_PAGES}, требуется увеличить --orgs'
+                )
+            self.count_rows += page.Size()
+            deep_position = page.Metadata().Get('nextPosition')
+
+        year = datetime.date.today().year - 1
+        scenarios = {
+            'first_page': lambda: self.__get_page(self.__get_filter(), sbis.NavigationDirection.ndBOTHWAYS),
+            'deep_page': lambda: self.__get_page(
+                self.__get_filter(), sbis.NavigationDirection.ndFORWARD, deep_position,
+            ),
+            'backward_page': lambda: self.__get_page(
+                self.__get_filter(), sbis.NavigationDirection.ndBACKWARD, next_position['backward'],
+            ),
+            'period_page': lambda: self.__get_page(
+                self.__get_filter(datetime.date(year, 1, 1), datetime.date(year, 12, 31)),
+                sbis.NavigationDirection.ndBOTHWAYS,
+            ),
+        }
+        for number in self.fact_pages:
+            scenarios[f'fact_page_{number}'] = self.__get_fact_page_scenario(number)
+        return {name: self.__measure(scenario) for name, scenario in scenarios.items()}
+
+    def __measure(self, scenario):
+        """Замеряет время выполнения сценария"""
+        timings = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            scenario()
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    def __get_filter(self, date_begin=None, date_end=None):
+        """Возвращает фильтр реестра"""
+        _filter = self.sbis.Record({'ФильтрДокументНашаОрганизация': -2})
+        if date_begin:
+            _filter.Set('ФильтрДатаС', date_begin)
+        if date_end:
+            _filter.Set('ФильтрДатаП', date_end)
+        return _filter
+
+    def __get_fact_page_scenario(self, number):
+        """Возвращает сценарий запроса страницы number фактических документов"""
+        sbis = self.sbis
+        _filter = self.__get_filter()
+        _filter.Set('ТипЗаписи', 0)
+        position = None
+        if number > 1:
+            from loans.loanDBConsts import LCDB
+            lcdb = LCDB()
+            rec = sbis.SqlQueryRecord(
+                FACT_PAGE_POSITION, lcdb.percents_id(), lcdb.our_company_id(), datetime.date.today(),
+                (number - 1) * self.limit - 1,
+            )
+            if rec is None:
+                raise sbis.Error(f'Нет страницы {number} фактических документов, требуется увеличить --fact-docs')
+            position = [str(rec.Get('@Документ')), rec.Get('Дата').isoformat(), None, None, '0', 'False']
+        return lambda: self.__get_page(sbis.Record(_filter), sbis.NavigationDirection.ndFORWARD, position)
+
+    def __get_page(self, _filter, direction, position=None):
+        """
+        Запрашивает страницу реестра
+        :param _filter: фильтр реестра
+        :param direction: направление навигации
+        :param position: значения курсора (nextPosition предыдущей страницы)
+        """
+        if position is not None:
+            position = self.sbis.Record(dict(zip(self.cursor_module.CURSOR_FIELDS, position)))
+        navigation = self.sbis.Navigation(self.sbis.NavigationPositionTag(), position, self.limit, direction, True)
+        return self.base.PercentsListAggregator(_filter, navigation).get_documents()
+
+
+class PlanningBenchmark:
+    """
+    Класс замеряет время планирования и выполнения запроса списка договоров для разных наборов разрешенных организаций
+    Запросы и их параметры перехватываются при построении первой страницы реестра. Режимы:
+    - literal - организации подставлены в текст запроса: текст каждого набора новый, план строится заново
+    - prepared - запрос подготовлен (PREPARE) по тексту с параметрами $N, организации передаются в EXECUTE: после пяти
+      выполнений PostgreSQL может перейти на общий план и не планировать запрос
+    - prepared_generic - подготовленный запрос с общим планом (plan_cache_mode = force_generic_plan): нижняя граница
+      времени планирования, которая доступна только при организациях параметром
+    Время берется из EXPLAIN (ANALYZE, SUMMARY ON).
+    """
+    def __init__(self, sbis, base, count_sets, limit=PAGE_LIMIT, repeat=5, seed=0):
+        """
+        :param sbis: модуль замены sbis
+        :param base: модуль base реестра
+        :param count_sets: количество наборов разрешенных организаций
+        :param limit: размер страницы
+        :param repeat: количество проходов по наборам организаций
+        :param seed: начальное значение генератора наборов организаций
+        """
+        self.sbis = sbis
+        self.base = base
+        self.plan_docs = importlib.import_module(f'{REGISTRY_PACKAGE}.plan_docs')
+        self.count_sets = count_sets
+        self.limit = limit
+        self.repeat = repeat
+        self.random = random.Random(seed)
+        self.count_queries = 0
+        self.count_texts = {}
+
+    def run(self):
+        """
+        Выполняет замер
+        :return: {режим: [(время планирования, мс, время выполнения, мс)]}
+        """
+        queries = []
+        for orgs in self.__get_org_sets():
+            queries.extend(self.__capture_queries(orgs))
+        self.count_queries = len(queries)
+        if not queries:
+            raise self.sbis.Error('Запросы списка договоров не выполнялись (включено построение по таблице месяцев?)')
+
+        timings = {mode: [] for mode in PLANNING_MODES}
+        literal_texts = set()
+        cursor = self.sbis.get_connection().cursor()
+        prepared = {}
+        try:
+            for _ in range(self.repeat):
+                for sql, params in queries:
+                    literal_sql = cursor.mogrify(*self.sbis._prepare_sql(sql, params))
+                    literal_texts.add(literal_sql)
+                    timings['literal'].append(self.__explain(cursor, literal_sql.decode()))
+                    if sql not in prepared:
+                        prepared[sql] = f'{PREPARED_NAME}_{len(prepared)}'
+                        cursor.execute(f'PREPARE {prepared[sql]} AS {sql}')
+                    execute_sql = cursor.mogrify(f'EXECUTE {prepared[sql]}({", ".join(["%s"] * len(params))})', params)
+                    for mode in ('prepared', 'prepared_generic'):
+                        cursor.execute('SET plan_cache_mode = %s', (PLANNING_MODES[mode],))
+                        timings[mode].append(self.__explain(cursor, execute_sql.decode()))
+        finally:
+            cursor.execute('RESET plan_cache_mode')
+            for name in prepared.values():
+                cursor.execute(f'DEALLOCATE {name}')
+            cursor.close()
+        self.count_texts = {'literal': len(literal_texts), 'prepared': len(prepared)}
+        return timings
+
+    def __get_org_sets(self):
+        """Возвращает наборы разрешенных организаций: случайные половины организаций договоров"""
+        from loans.loanDBConsts import LCDB
+        sql_maker = self.plan_docs.PercentsToAccruedSqlMaker(self.plan_docs.AllowedOrgsChecker(None))
+        orgs = self.sbis.SqlQuery(
+            sql_maker.create_orgs_sql(), LCDB().issued_id(), *sql_maker.get_params(),
+        ).ToList('@Лицо')
+        size = max(1, len(orgs) // 2)
+        return [sorted(self.random.sample(orgs, size)) for _ in range(self.count_sets)]
+
+    def __capture_queries(self, orgs):
+        """
+        Строит первую страницу реестра с разрешенными организациями orgs
+        :return: выполненные запросы списка договоров [(текст с параметрами $N, параметры)]
+        """
+        sbis = self.sbis
+        maker_class = self.plan_docs.PercentsToAccruedSqlMaker
+        checker_class = self.plan_docs.AllowedOrgsChecker
+        sql_texts = set()
+        queries = []
+
+        def wrap_sql_method(method):
+            def wrapper(sql_maker):
+                sql = method(sql_maker)
+                sql_texts.add(sql)
+                return sql
+            return wrapper
+
+        def sql_query(sql, *params):
+            if sql in sql_texts:
+                queries.append((sql, params))
+            return original_sql_query(sql, *params)
+
+        original_sql_query = sbis.SqlQuery
+        original_methods = {name: getattr(maker_class, name) for name in PLANNING_SQL_METHODS}
+        original_get_allowed_orgs = checker_class.get_allowed_orgs
+        sbis.SqlQuery = sql_query
+        for name, method in original_methods.items():
+            setattr(maker_class, name, wrap_sql_method(method))
+        checker_class.get_allowed_orgs = lambda checker: orgs
+        try:
+            navigation = sbis.Navigation(
+                sbis.NavigationPositionTag(), None, self.limit, sbis.NavigationDirection.ndBOTHWAYS, True,
+            )
+            _filter = sbis.Record({'ФильтрДокументНашаОрганизация': -2})
+            self.base.PercentsListAggregator(_filter, navigation).get_documents()
+        finally:
+            sbis.SqlQuery = original_sql_query
+            for name, method in original_methods.items():
+                setattr(maker_class, name, method)
+            checker_class.get_allowed_orgs = original_get_allowed_orgs
+        return queries
+
+    @staticmethod
+    def __explain(cursor, sql):
+        """Возвращает (время планирования, мс, время выполнения, мс) запроса по EXPLAIN"""
+        cursor.execute(f'EXPLAIN (ANALYZE, SUMMARY ON) {sql}')
+        times = dict(
+            match.groups() for match in (PLANNING_PATTERN.match(row[0].strip()) for row in cursor.fetchall()) if match
+        )
+        return float(times['Planning']), float(times['Execution'])
+
+
+def main(argv=None):
+    """Точка входа: заполняет базу (при --fill) и выполняет сценарии"""
+    parser = argparse.ArgumentParser(description='Замер реестра процентов на локальной базе')
+    parser.add_argument('--dsn', required=True, help='строка подключения psycopg2')
+    parser.add_argument('--fill', action='store_true', help='пересоздать и заполнить таблицы')
+    parser.add_argument('--orgs', type=int, default=50)
+    parser.add_argument('--loans', type=int, default=20, help='договоров на организацию')
+    parser.add_argument('--months', type=int, default=36, help='месяцев истории')
+    parser.add_argument('--limit', type=int, default=PAGE_LIMIT)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--fact-docs', type=int, default=0, help='добавить синтетических начислений (с --fill)')
+    parser.add_argument('--fact-pages', default='', help='номера страниц сценариев fact_page_N через запятую (1,1000)')
+    parser.add_argument('--planning', type=int, default=0, help='замер планирования по N наборам организаций')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    sbis, fixtures, base = load_registry()
+    connection = sbis.connect(args.dsn)
+
+    from loans.loanConsts import LC
+    sbis.Session.object_name = LC.PERCENTS_ON_ISSUED_LOANS
+
+    if args.fill:
+        scale = fixtures.FixtureScale(orgs=args.orgs, loans_by_org=args.loans, months=args.months)
+        started = time.perf_counter()
+        registry_fixtures = fixtures.RegistryFixtures(connection, scale)
+        counts = registry_fixtures.fill()
+        if args.fact_docs:
+            registry_fixtures.add_percent_docs(args.fact_docs)
+            counts['Документ'] += args.fact_docs
+        print(f'filled in {time.perf_counter() - started:.1f}s: {counts}')
+
+    if args.planning:
+        planning = PlanningBenchmark(sbis, base, args.planning, limit=args.limit, repeat=args.repeat)
+        timings = planning.run()
+        print(f'planning: {args.planning} org sets, {planning.count_queries} loans queries, repeat {args.repeat}, '
+              f'query texts {planning.count_texts}')
+        for name, values in timings.items():
+            planning_ms, execution_ms = zip(*values)
+            print(f'{name:<17} planning median {statistics.median(planning_ms):8.2f} ms  '
+                  f'execution median {statistics.median(execution_ms):8.2f} ms')
+        return
+
+    fact_pages = [int(number) for number in args.fact_pages.split(',') if number]
+    benchmark = RegistryBenchmark(sbis, base, limit=args.limit, repeat=args.repeat, fact_pages=fact_pages)
+    timings = benchmark.run()
+    print(f'deep_page after {DEEP_PAGES} pages ({benchmark.count_rows} rows scrolled)')
+    for name, values in timings.items():
+        print(f'{name:<15} min {min(values) * 1000:8.1f} ms  median {statistics.median(values) * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+"""
+Модуль содержит минимальную замену модуля sbis для локального замера реестра процентов (см. runner.py).
+
+Реализовано только то, что использует реестр:
+- Record, RecordSet, CreateRecordSet, MethodResultFormat - записи и наборы записей поверх dict/list
+- Navigation, NavigationResult, NavigationDirection, NavigationPositionTag - навигация по курсору
+- SqlQuery, SqlQueryRecord, SqlQueryScalar, CreateTransaction - запросы к локальной базе через psycopg2 (параметры
+$N запроса переводятся в формат psycopg2)
+- Session, CheckRights, ObjectId, LogMsg, rk, Error - окружение метода
+- Документ.КоличествоОснований - количество документов-оснований (запрос к "СвязьДокументов")
+
+Перед использованием требуется подключение к базе: connect(dsn). Объект реестра задается в Session.object_name.
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import logging
+import re
+
+logger = logging.getLogger('percent_registry.bench')
+
+PARAM_PATTERN = re.compile(r'\$(\d+)')
+
+_connection = None
+
+COUNT_BASE_DOCS = '''
+    SELECT
+        "ДокументСледствие" "@Документ",
+        COUNT(*) "Количество"
+    FROM
+        "СвязьДокументов"
+    WHERE
+        "ДокументСледствие" = ANY($1::integer[])
+    GROUP BY
+        "ДокументСледствие"
+'''
+
+
+class Error(Exception):
+    """Ошибка метода"""
+
+
+def connect(dsn):
+    """
+    Подключается к локальной базе
+    :param dsn: строка подключения psycopg2
+    """
+    global _connection
+    import psycopg2
+    _connection = psycopg2.connect(dsn)
+    _connection.autocommit = True
+    return _connection
+
+
+def get_connection():
+    """Возвращает текущее подключение к базе"""
+    if _connection is None:
+        raise Error('Нет подключения к базе, требуется вызвать sbis_stub.connect(dsn)')
+    return _connection
+
+
+class NavigationDirection:
+    """Направления навигации"""
+    ndBOTHWAYS = 0
+    ndFORWARD = 1
+    ndBACKWARD = 2
+
+
+class NavigationPositionTag:
+    """Признак навигации по курсору"""
+
+
+class Navigation:
+    """
+    Навигация запроса
+    Поддерживаются формы: Navigation(limit, page, has_more) и
+    Navigation(NavigationPositionTag(), position, limit, direction, has_more)
+    """
+    def __init__(self, *args):
+        if args and isinstance(args[0], NavigationPositionTag):
+            _, self._position, self._limit, self._direction, self._has_more = args
+            self._page = None
+        else:
+            self._limit, self._page, self._has_more = args
+            self._position, self._direction = None, NavigationDirection.ndFORWARD
+
+    def Limit(self):
+        return self._limit
+
+    def Page(self):
+        return self._page
+
+    def Position(self):
+        return self._position
+
+    def Direction(self):
+        return self._direction
+
+
+class NavigationResult:
+    """Результат навигации"""
+    def __init__(self, is_next, is_next_forward=None):
+        self._is_next = is_next
+        self._is_next_forward = is_next_forward
+
+    def GetIsNext(self):
+        return self._is_next
+
+    def GetIsNextForward(self):
+        return self._is_next_forward
+
+    def HaveDataBefore(self):
+        """Наличие записей выше страницы (для BACKWARD навигации совпадает с GetIsNext)"""
+        return self._is_next
+
+
+class _Field:
+    """Поле записи (для обращений вида rec['Поле'].From(value))"""
+    def __init__(self, record, name):
+        self._record = record
+        self._name = name
+
+    def From(self, value):
+        self._record.Set(self._name, value)
+
+    def Get(self):
+        return self._record.Get(self._name)
+
+
+class Record:
+    """Запись: упорядоченный набор полей"""
+    def __init__(self, data=None):
+        # как и в платформе, конструктор копирования копирует поля вместе со значениями
+        if isinstance(data, Record):
+            data = data._data
+        self._data = dict(data or {})
+
+    def Get(self, name, default=None):
+        return self._data.get(name, default)
+
+    def Set(self, name, value):
+        self._data[name] = value
+
+    def Names(self):
+        return list(self._data)
+
+    def Add(self, name, value=None):
+        """Добавляет поле (значение существующего поля заменяется)"""
+        self._data[name] = value
+
+    AddBool = AddInt16 = AddInt32 = AddInt64 = AddString = AddDate = AddMoney = AddJson = Add
+    AddArrayInt32 = AddArrayInt64 = AddArrayString = Add
+
+    def AddRecord(self, name):
+        self.Add(name, Record())
+
+    def AddColRecord(self, name, value=None):
+        self.Add(name, value)
+
+    def Remove(self, name):
+        self._data.pop(name, None)
+
+    def CopyOwnFormat(self):
+        pass
+
+    def __getitem__(self, name):
+        return _Field(self, name)
+
+    def __setitem__(self, name, value):
+        self.Set(name, value)
+
+    def __contains__(self, name):
+        return name in self._data
+
+    def __repr__(self):
+        return f'Record({self._data!r})'
+
+
+def MethodResultFormat(method_name, version):
+    """Формат результата метода (пустая запись, поля добавляются по мере заполнения)"""
+    return Record()
+
+
+class RecordSet:
+    """Набор записей"""
+    def __init__(self, _format=None):
+        self._format = _format
+        self._rows = []
+        self._metadata = Record()
+        self.nav_result = None
+        self.outcome = None
+
+    @property
+    def rsPtr(self):
+        return self
+
+    def AddRow(self, rec=None):
+        rec = rec if isinstance(rec, Record) else Record(rec)
+        self._rows.append(rec)
+        return rec
+
+    def DelRow(self, index):
+        del self._rows[index]
+
+    def AddColRecord(self, name):
+        for rec in self._rows:
+            rec.Add(name)
+
+    def DelCol(self, name):
+        for rec in self._rows:
+            rec._data.pop(name, None)
+
+    def Get(self, index, name):
+        return self._rows[index].Get(name)
+
+    def Set(self, index, name, value):
+        self._rows[index].Set(name, value)
+
+    def Size(self):
+        return len(self._rows)
+
+    def ToList(self, name):
+        return [rec.Get(name) for rec in self._rows]
+
+    def Migrate(self, _format):
+        self._format = _format
+
+    def Metadata(self):
+        return self._metadata
+
+    def SetMetadataHashTable(self, name, value):
+        self._metadata.Set(name, value)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __getitem__(self, index):
+        return self._rows[index]
+
+
+CreateRecordSet = RecordSet
+
+
+def ObjectId(object_name, id_object):
+    """Идентификатор объекта (в замене - значение идентификатора)"""
+    return id_object
+
+
+class Session:
+    """Сессия метода"""
+    object_name = None
+
+    @classmethod
+    def ObjectName(cls):
+        return cls.object_name
+
+
+class CheckRights:
+    """Права пользователя (в замене - полный доступ)"""
+    @staticmethod
+    def AccessAreaRestrictions(zone):
+        return Record({'Access': 0xFF})
+
+
+class TransactionLevel:
+    READ_COMMITTED = 'READ COMMITTED'
+
+
+class TransactionMode:
+    WRITE = 'READ WRITE'
+
+
+class CreateTransaction:
+    """Транзакция (контекстный менеджер)"""
+    def __init__(self, level=TransactionLevel.READ_COMMITTED, mode=TransactionMode.WRITE):
+        self.level = level
+        self.mode = mode
+
+    def __enter__(self):
+        get_connection().cursor().execute(f'BEGIN ISOLATION LEVEL {self.level} {self.mode}')
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        get_connection().cursor().execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+def _prepare_sql(sql, params):
+    """Переводит параметры $N запроса в формат psycopg2"""
+    sql = PARAM_PATTERN.sub(lambda match: f'%(p{match.group(1)})s', sql.replace('%', '%%'))
+    return sql, {f'p{i}': param for i, param in enumerate(params, start=1)}
+
+
+def SqlQuery(sql, *params):
+    """Выполняет запрос, возвращает RecordSet"""
+    sql, params = _prepare_sql(sql, params)
+    result = RecordSet()
+    with get_connection().cursor() as cursor:
+        cursor.execute(sql, params)
+        if cursor.description is not None:
+            names = [column.name for column in cursor.description]
+            for row in cursor.fetchall():
+                result.AddRow(Record(zip(names, row)))
+    return result
+
+
+def SqlQueryRecord(sql, *params):
+    """Выполняет запрос, возвращает первую запись или None"""
+    result = SqlQuery(sql, *params)
+    return result[0] if result.Size() else None
+
+
+def SqlQueryScalar(sql, *params):
+    """Выполняет запрос, возвращает значение первого поля первой записи или None"""
+    rec = SqlQueryRecord(sql, *params)
+    return rec.Get(rec.Names()[0]) if rec is not None else None
+
+
+class Документ:
+    """Методы объекта Документ"""
+    @staticmethod
+    def КоличествоОснований(rs, _filter):
+        """
+        Количество документов-оснований по документам набора
+        :param rs: набор документов
+        :param _filter: фильтр метода (в замене не используется, направление связи - вверх)
+        :return: RecordSet с полями "@Документ", "Количество"
+        """
+        return SqlQuery(COUNT_BASE_DOCS, [rec.Get('@Документ') for rec in rs])
+
+
+def LogMsg(message):
+    logger.info(message)
+
+
+def rk(text):
+    """Локализация строки (в замене - исходная строка)"""
+    return text
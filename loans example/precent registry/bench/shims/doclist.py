@@ -0,0 +1,102 @@
+"""
+Минимальная замена модуля платформы doclist для локального замера реестра процентов (см. bench/runner.py).
+
+DocList строит запрос списка документов объекта метода: базовые поля документа, дополнительные поля (additionalFields),
+фильтры записи фильтра (черновики, период, организация) и условие whereText. Записи упорядочены по ("Дата",
+"@Документ") по убыванию для FORWARD и по возрастанию для BACKWARD навигации, запрашивается LIMIT + 1 запись (лишняя
+запись - признак наличия следующей страницы). Позицию навигации доклист не применяет, условие курсора задает
+вызывающий код в whereText.
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import sbis
+from loans.loanConsts import LC
+from loans.loanDBConsts import LCDB
+
+DOC_LIST_SQL = '''
+    SELECT
+        "Д"."@Документ",
+        "Д"."Дата",
+        "Д"."Номер",
+        "Д"."ТипДокумента",
+        "Д"."ДокументНашаОрганизация",
+        "НО"."Название" AS "ДокументНашаОрганизация.Контрагент.Название",
+        {additional_fields}
+    FROM
+        "Документ" "Д"
+    LEFT JOIN
+        "ДокументРасширение" "ДР"
+        ON "ДР"."@Документ" = "Д"."@Документ"
+    LEFT JOIN
+        "Лицо" "НО"
+        ON "НО"."@Лицо" = "Д"."ДокументНашаОрганизация"
+    WHERE
+        {where_text}
+    ORDER BY
+        "Д"."Дата" {order}, "Д"."@Документ" {order}
+    LIMIT {limit}
+'''
+
+
+class DocList:
+    """Список документов"""
+    def __init__(self, filter_rec, navigation, join_text='', fields_text='', options=None, search_strategy=None):
+        self.filter_rec = filter_rec
+        self.navigation = navigation
+        self.whereText = 'TRUE'
+        self.additionalFields = ''
+        self.result = None
+        self.rsPtr = None
+        self.sql = None
+
+    def CreateAndExecuteSql(self, method):
+        """
+        Формирует и выполняет запрос списка
+        :param method: полное название списочного метода ("Объект.Метод")
+        """
+        self.sql, params = self.__create_sql(method)
+        limit = self.navigation.Limit()
+        rows = sbis.SqlQuery(self.sql, *params)
+        self.result = sbis.RecordSet()
+        for rec in list(rows)[:limit]:
+            self.result.AddRow(rec)
+        self.result.nav_result = sbis.NavigationResult(rows.Size() > limit)
+        self.rsPtr = self.result
+
+    def __create_sql(self, method):
+        """Возвращает текст запроса и параметры фильтров"""
+        params = [self.__get_id_type_doc(method)]
+        where = ['"Д"."ТипДокумента" = $1::integer', '"Д"."Удален" IS NOT TRUE']
+        if self.filter_rec.Get('ФильтрБезЧерновиков'):
+            where.append('"Д"."$Черновик" IS NULL')
+        for field, condition in (
+                ('ФильтрДатаС', '"Д"."Дата" >= ${}::date'),
+                ('ФильтрДатаП', '"Д"."Дата" <= ${}::date'),
+                (LC.FLD_FILTER_OUR_ORG, '"Д"."ДокументНашаОрганизация" = ${}::integer'),
+        ):
+            value = self.filter_rec.Get(field)
+            if value is not None:
+                params.append(value)
+                where.append(condition.format(len(params)))
+        where.append(f'({self.whereText})')
+
+        additional_fields = self.additionalFields.strip().rstrip(',') or 'NULL AS "_"'
+        order = 'ASC' if self.navigation.Direction() == sbis.NavigationDirection.ndBACKWARD else 'DESC'
+        sql = DOC_LIST_SQL.format(
+            additional_fields=additional_fields,
+            where_text=' AND '.join(where),
+            order=order,
+            limit=int(self.navigation.Limit()) + 1,
+        )
+        return sql, params
+
+    @staticmethod
+    def __get_id_type_doc(method):
+        """Тип документа объекта метода"""
+        lcdb = LCDB()
+        return {
+            LC.PERCENTS_ON_ISSUED_LOANS: lcdb.percents_id(),
+            LC.PERCENTS_ON_RECEIVED_LOANS: lcdb.percents_id(),
+        }[method.split('.')[0]]
@@ -0,0 +1,9 @@
+"""
+Минимальная замена пакета платформы loans для локального замера реестра процентов (см. bench/runner.py).
+
+Реализовано только то, что импортирует реестр. Значения констант и идентификаторы справочников совпадают с данными
+bench/fixtures.py (FixtureIds). Если пакет платформы доступен в PYTHONPATH раньше замены, используется он.
+"""
+
+
+__author__ = 'Glukhenko A.V.'
@@ -0,0 +1,27 @@
+"""
+Константы модуля займов (замена loans.loanConsts)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+
+class LC:
+    """Константы займов, используемые реестром процентов"""
+    PERCENTS_ON_ISSUED_LOANS = 'ПроцентыПоВыданнымЗаймам'
+    PERCENTS_ON_RECEIVED_LOANS = 'ПроцентыПоПолученнымЗаймам'
+    LIST_TO_ACCRUED = 'СписокКНачислению'
+
+    # виды связи документа начисления процентов с договором (FixtureIds.link_type)
+    LINK_TYPE = 1
+    NORMAL_LINK_TYPE = 0
+
+    FLD_FILTER_OUR_ORG = 'ФильтрДокументНашаОрганизация'
+    FLD_FACE1_NAMES_LIST = 'РП.Лицо1.СписокНазваний'
+    FLD_PERCENTS_ISSUED_LOANS = 'РП.Начислено'
+    FLD_PERCENTS_RECEIVED_LOANS = 'РП.Остаток'
+
+    ALL_OUR_ORG = -2
+    OUR_COMPANY = -1
+
+    DOCLIST_OPTIONS = None
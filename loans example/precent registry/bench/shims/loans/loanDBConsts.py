@@ -0,0 +1,34 @@
+"""
+Идентификаторы справочников базы (замена loans.loanDBConsts). Значения совпадают с FixtureIds (bench/fixtures.py)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+
+class LCDB:
+    """Идентификаторы типов документов, счетов и аналитик"""
+    def issued_id(self):
+        return 1001
+
+    def received_id(self):
+        return 1002
+
+    def percents_id(self):
+        return 1003
+
+    def debt_analytic(self):
+        return 2001
+
+    def percent_analytic(self):
+        return 2002
+
+    def accounts_ids(self):
+        return [3001]
+
+    def our_company_id(self):
+        """Организация "Наша компания" (в синтетических данных - первая организация)"""
+        return 1
+
+    def is_accounting_used(self):
+        return True
@@ -0,0 +1,21 @@
+"""
+Общие функции модуля займов (замена loans.loansCommon)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import sbis
+
+
+def fill_rp_document(rs):
+    """
+    Заполняет поле "РП.Документ" набора документов
+    :param rs: набор документов доклиста
+    """
+    for rec in rs:
+        rec['РП.Документ'] = sbis.Record({
+            '@Документ': rec.Get('@Документ'),
+            'Дата': rec.Get('Дата'),
+            'Номер': rec.Get('Номер'),
+        })
@@ -0,0 +1,28 @@
+"""
+Проверка прав на организации (замена loans.loansRightsHelpers)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+
+class AllowedOrgsChecker:
+    """Права на организации. На локальной базе доступны все организации"""
+    def __init__(self, _filter):
+        self._filter = _filter
+
+    @classmethod
+    def create(cls, _filter):
+        return cls(_filter)
+
+    def get_allowed_orgs(self):
+        """Разрешенные организации (None - ограничений нет)"""
+        return None
+
+    def get_blocked_orgs(self):
+        """Запрещенные организации"""
+        return []
+
+    def is_target_org_blocked(self):
+        """Признак, что выбранная в фильтре организация недоступна"""
+        return False
@@ -0,0 +1,67 @@
+"""
+Данные документов начисления процентов (замена loans.percents)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import sbis
+
+PERCENT_DATA = '''
+    WITH docs AS (
+        SELECT UNNEST($1::integer[]) "@Документ"
+    )
+    , names AS (
+        SELECT
+            link."ДокументСледствие" "@Документ",
+            string_agg(DISTINCT contractor."Название", '; ') "РП.Лицо1.СписокНазваний"
+        FROM
+            "СвязьДокументов" link
+        JOIN
+            "Документ" loan
+            ON loan."@Документ" = link."ДокументОснование"
+        JOIN
+            "Лицо" contractor
+            ON contractor."@Лицо" = loan."Лицо1"
+        WHERE
+            link."ДокументСледствие" = ANY($1::integer[])
+        GROUP BY
+            link."ДокументСледствие"
+    )
+    , sums AS (
+        SELECT
+            dc."Документ" "@Документ",
+            SUM(dc."Сумма") "РП.Начислено"
+        FROM
+            "ДебетКредит" dc
+        WHERE
+            dc."Документ" = ANY($1::integer[])
+        GROUP BY
+            dc."Документ"
+    )
+    SELECT
+        docs."@Документ",
+        names."РП.Лицо1.СписокНазваний",
+        COALESCE(sums."РП.Начислено", 0) "РП.Начислено",
+        0::numeric "РП.Остаток"
+    FROM
+        docs
+    LEFT JOIN
+        names
+        USING("@Документ")
+    LEFT JOIN
+        sums
+        USING("@Документ")
+'''
+
+
+def get_percent_data(lcdb, id_docs):
+    """
+    Возвращает наименования контрагентов и суммы документов начисления процентов
+    :param lcdb: LCDB
+    :param id_docs: идентификаторы документов
+    :return: {id_doc: Record}
+    """
+    if not id_docs:
+        return {}
+    return {rec.Get('@Документ'): rec for rec in sbis.SqlQuery(PERCENT_DATA, list(id_docs))}
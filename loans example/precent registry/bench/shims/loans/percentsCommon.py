@@ -0,0 +1,60 @@
+"""
+Работа с датами начисления процентов (замена loans.percentsCommon)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import calendar
+import datetime
+
+# Периоды фильтра ФильтрДатаПериод в месяцах
+MONTHS_BY_PERIOD = {
+    'month': 1,
+    'quarter': 3,
+    'halfyear': 6,
+    'year': 12,
+}
+
+
+class LoansDates:
+    """Операции с датами займов"""
+    @staticmethod
+    def add_months(date, count_months, return_last_day_of_month=False):
+        """
+        Сдвигает дату на количество месяцев
+        :param date: дата
+        :param count_months: количество месяцев (может быть отрицательным)
+        :param return_last_day_of_month: вернуть последний день полученного месяца
+        """
+        month = date.month - 1 + count_months
+        year, month = date.year + month // 12, month % 12 + 1
+        last_day = calendar.monthrange(year, month)[1]
+        return date.replace(year=year, month=month, day=last_day if return_last_day_of_month else min(date.day, last_day))
+
+    @classmethod
+    def getDateAgo(cls, date, period):
+        """
+        Возвращает дату начала периода, отсчитанного назад от даты
+        :param date: дата
+        :param period: период ('month', 'quarter', 'halfyear', 'year') или количество дней
+        """
+        if period in MONTHS_BY_PERIOD:
+            return cls.add_months(date, -MONTHS_BY_PERIOD[period]) + datetime.timedelta(days=1)
+        return date - datetime.timedelta(days=int(period))
+
+    @staticmethod
+    def getMonthEndsForPeriod(date_begin, date_end):
+        """
+        Возвращает даты планового начисления периода: последние дни месяцев, в последнем месяце - дата окончания
+        :param date_begin: дата начала
+        :param date_end: дата окончания
+        """
+        dates = []
+        year, month = date_begin.year, date_begin.month
+        while (year, month) < (date_end.year, date_end.month):
+            dates.append(datetime.date(year, month, calendar.monthrange(year, month)[1]))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        if date_begin <= date_end:
+            dates.append(date_end)
+        return dates
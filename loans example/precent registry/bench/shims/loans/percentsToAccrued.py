@@ -0,0 +1,50 @@
+"""
+Объединение периодов начисления процентов (замена loans.percentsToAccrued)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+from collections import defaultdict
+
+from .percentsCommon import LoansDates
+
+
+class LinkedRangesMerger:
+    """
+    Объединяет периоды начисления договоров одной организации в непрерывные диапазоны
+    Вход - список договоров, упорядоченный по организации и началу периода (поля "@Лицо", "Название", "ДатаС",
+    "ДатаПо", "Лицо1.Название"). Для каждой даты планового начисления диапазона запоминаются контрагенты договоров,
+    период которых содержит эту дату.
+    """
+    def __init__(self, loans):
+        self.loans = loans
+
+    def mergeAll(self, date_begin=None):
+        """
+        Объединяет периоды
+        :param date_begin: начало периода реестра (более ранние даты отбрасываются)
+        :return: [{"@Лицо", "Название", "ДатаС", "ДатаПо", "Лицо1.СписокНазваний": {дата: [контрагенты]}}, ...]
+        """
+        merged_ranges = []
+        current = None
+        for loan in self.loans:
+            begin, end = loan.Get('ДатаС'), loan.Get('ДатаПо')
+            if date_begin and begin and begin < date_begin:
+                begin = date_begin
+            if not begin or not end or begin > end:
+                continue
+            id_org = loan.Get('@Лицо')
+            if current is None or current['@Лицо'] != id_org or begin > current['ДатаПо']:
+                current = {
+                    '@Лицо': id_org,
+                    'Название': loan.Get('Название'),
+                    'ДатаС': begin,
+                    'ДатаПо': end,
+                    'Лицо1.СписокНазваний': defaultdict(list),
+                }
+                merged_ranges.append(current)
+            current['ДатаПо'] = max(current['ДатаПо'], end)
+            for date in LoansDates.getMonthEndsForPeriod(begin, end):
+                current['Лицо1.СписокНазваний'][date].append(loan.Get('Лицо1.Название'))
+        return merged_ranges
@@ -0,0 +1,23 @@
+"""
+Названия дат (замена loans.utils.periods)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+MONTHS = ('Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь', 'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь',
+          'Декабрь')
+SHORT_MONTHS = ('янв', 'фев', 'мар', 'апр', 'май', 'июн', 'июл', 'авг', 'сен', 'окт', 'ноя', 'дек')
+
+
+class BeautifulDateName:
+    """Красивые названия дат"""
+    @staticmethod
+    def get_beautiful_date(date):
+        """Дата в виде "25 фев" """
+        return f'{date.day} {SHORT_MONTHS[date.month - 1]}'
+
+    @staticmethod
+    def get_beautiful_month(date):
+        """Месяц в виде "Март" """
+        return MONTHS[date.month - 1]
@@ -29,3 +29,21 @@ ACCESS_EXCLUDE = 0
 ACCESS_READ = 2
 ACCESS_WRITE = 4
 ACCESS_ADMIN = 8
+
+# Построение плановых документов по таблице плановых месяцев (см. plan_months.py) вместо расчета диапазонов
+PLAN_DOCS_BY_MONTHS_TABLE = False
+PLAN_MONTHS_TABLE = 'loans_plan_percent_months'
+
+# Построение списка договоров плановых документов по кешу (см. converter.py) вместо живого запроса
+PLAN_DOCS_BY_CACHE = False
+PLAN_CONTRACTS_TABLE = 'loans_plan_percent_contracts'
+PLAN_CACHE_CHANGES_TABLE = 'loans_plan_percent_cache_changes'
+
+# Параллельное построение плановых документов по организациям (см. PlanPercentsList.__build_ranges):
+# количество потоков (1 - построение одним запросом без разбиения), наибольшее количество потоков (ограничивает
+# значение из фильтра PlanDocsWorkers) и количество организаций в одной части.
+# По умолчанию выключено: на стенде (400 организаций) запросы частей в сумме дольше одного запроса, а объединение
+# диапазонов, которое выполняется в пуле, занимает единицы процентов времени (см. лог Plan percents built by)
+PLAN_DOCS_WORKERS = 1
+PLAN_DOCS_MAX_WORKERS = 4
+PLAN_DOCS_ORGS_BY_PARTITION = 50
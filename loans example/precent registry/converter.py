@@ -6,65 +6,421 @@ PS: ранее чтобы выяснить основной долг по дог
 ДебетКредит, причем дважды. Закешировав эту информацию мы можем быстро
 получить список плановых процентов.
 
-Кешируемая информация:
-Основной долг по договору
-Начальная дата планового периода
-Конечная дата планового периода
+Кешируемая информация (таблица PLAN_CONTRACTS_TABLE, типизированные колонки):
+Основной долг по договору (debt)
+Начальная дата планового периода (date_begin)
+Дата последнего погашения, по ней рассчитывается конечная дата планового периода (date_last_payment)
+
+Обновление кеша:
+- recalc_cache - полный пересчет по всем договорам
+- refresh_cache - пересчет только договоров, изменившихся с прошлого обновления. Изменения записывают триггеры в
+журнал PLAN_CACHE_CHANGES_TABLE: добавление, изменение и удаление проводок, изменение договоров и документов начисления
+процентов (в т.ч. пометка удаления и черновик), их связей, ставки и периода договора. Обработанные записи журнала
+удаляются по идентификаторам, поэтому записи транзакций, зафиксированных позже начала обновления, обрабатываются
+следующим обновлением. Записываются только изменившиеся записи кеша.
+
+Построение реестра по кешу включается константой PLAN_DOCS_BY_CACHE (см. PlanPercentsList.__get_use_cache).
+Перед включением результат построения по кешу сверяется с живым запросом (check_cache_equivalence).
 """
 
 
 __author__ = 'Glukhenko A.V.'
 
 
+import time
+
 import sbis
 from loans.loanConsts import LC
+from loans.loanDBConsts import LCDB
 from loans.cache.base import BaseCacheLoan
+from .const import PLAN_CONTRACTS_TABLE, PLAN_CACHE_CHANGES_TABLE, PLAN_DOCS_BY_MONTHS_TABLE
 from .plan_docs import PlanPercentsList
+from .plan_months import refresh_plan_months
+
+
+CREATE_PLAN_CONTRACTS_TABLE = f'''
+    CREATE TABLE IF NOT EXISTS "{PLAN_CONTRACTS_TABLE}" (
+        "id_contract" integer PRIMARY KEY,
+        "id_type_doc" integer NOT NULL,
+        "date_begin" date,
+        "date_last_payment" date,
+        "debt" numeric
+    );
+    CREATE INDEX IF NOT EXISTS "{PLAN_CONTRACTS_TABLE}_type_idx"
+        ON "{PLAN_CONTRACTS_TABLE}" ("id_type_doc");
+'''
+
+DELETE_PLAN_CONTRACTS = f'''
+    DELETE FROM
+        "{PLAN_CONTRACTS_TABLE}"
+    WHERE
+        "id_type_doc" = $1::integer AND
+        "id_contract" <> ALL($2::integer[]) AND
+        ($3::integer[] IS NULL OR "id_contract" = ANY($3::integer[]))
+    RETURNING
+        "id_contract"
+'''
+
+UPSERT_PLAN_CONTRACTS = f'''
+    INSERT INTO "{PLAN_CONTRACTS_TABLE}"
+        ("id_contract", "id_type_doc", "date_begin", "date_last_payment", "debt")
+    SELECT
+        data."id_contract", $1::integer, data."date_begin", data."date_last_payment", data."debt"
+    FROM
+        unnest($2::integer[], $3::date[], $4::date[], $5::numeric[])
+        AS data("id_contract", "date_begin", "date_last_payment", "debt")
+    ON CONFLICT ("id_contract") DO UPDATE SET
+        "id_type_doc" = EXCLUDED."id_type_doc",
+        "date_begin" = EXCLUDED."date_begin",
+        "date_last_payment" = EXCLUDED."date_last_payment",
+        "debt" = EXCLUDED."debt"
+    WHERE
+        -- записываем только изменившиеся записи
+        ("{PLAN_CONTRACTS_TABLE}"."id_type_doc", "{PLAN_CONTRACTS_TABLE}"."date_begin",
+         "{PLAN_CONTRACTS_TABLE}"."date_last_payment", "{PLAN_CONTRACTS_TABLE}"."debt")
+        IS DISTINCT FROM
+        (EXCLUDED."id_type_doc", EXCLUDED."date_begin", EXCLUDED."date_last_payment", EXCLUDED."debt")
+    RETURNING
+        "id_contract"
+'''
+
+# Журнал изменений для обновления кеша (refresh_cache). Журнал заполняется триггерами (PLAN_CACHE_TRIGGERS):
+# id_face - лицо договора ("Лицо2" проводки), id_doc - договор или документ начисления процентов
+CREATE_PLAN_CACHE_CHANGES_TABLE = f'''
+    CREATE TABLE IF NOT EXISTS "{PLAN_CACHE_CHANGES_TABLE}" (
+        "@change" bigserial PRIMARY KEY,
+        "id_face" integer,
+        "id_doc" integer
+    )
+'''
+
+# Функции триггеров журнала изменений, TG_ARGV - допустимые значения условия (счета, типы документов, виды связей).
+# Функции построчные со статическими запросами: на запись одной проводки это дешевле триггера уровня оператора
+CREATE_PLAN_CACHE_CHANGES_FUNCTIONS = f'''
+    CREATE OR REPLACE FUNCTION "{PLAN_CACHE_CHANGES_TABLE}_dc"() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' AND OLD."Лицо2" IS NOT NULL AND OLD."Счет"::text = ANY(TG_ARGV) THEN
+            INSERT INTO "{PLAN_CACHE_CHANGES_TABLE}" ("id_face") VALUES (OLD."Лицо2");
+        END IF;
+        IF TG_OP <> 'DELETE' AND NEW."Лицо2" IS NOT NULL AND NEW."Счет"::text = ANY(TG_ARGV) AND
+                (TG_OP = 'INSERT' OR (OLD."Лицо2", OLD."Счет") IS DISTINCT FROM (NEW."Лицо2", NEW."Счет")) THEN
+            INSERT INTO "{PLAN_CACHE_CHANGES_TABLE}" ("id_face") VALUES (NEW."Лицо2");
+        END IF;
+        RETURN NULL;
+    END
+    $$;
+    CREATE OR REPLACE FUNCTION "{PLAN_CACHE_CHANGES_TABLE}_doc"() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' AND OLD."ТипДокумента"::text = ANY(TG_ARGV) THEN
+            INSERT INTO "{PLAN_CACHE_CHANGES_TABLE}" ("id_doc") VALUES (OLD."@Документ");
+        ELSIF TG_OP <> 'DELETE' AND NEW."ТипДокумента"::text = ANY(TG_ARGV) THEN
+            INSERT INTO "{PLAN_CACHE_CHANGES_TABLE}" ("id_doc") VALUES (NEW."@Документ");
+        END IF;
+        RETURN NULL;
+    END
+    $$;
+    CREATE OR REPLACE FUNCTION "{PLAN_CACHE_CHANGES_TABLE}_link"() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' AND OLD."ДокументОснование" IS NOT NULL AND OLD."ВидСвязи"::text = ANY(TG_ARGV) THEN
+            INSERT INTO "{PLAN_CACHE_CHANGES_TABLE}" ("id_doc") VALUES (OLD."ДокументОснование");
+        END IF;
+        IF TG_OP <> 'DELETE' AND NEW."ДокументОснование" IS NOT NULL AND NEW."ВидСвязи"::text = ANY(TG_ARGV) AND
+                (TG_OP = 'INSERT' OR
+                 (OLD."ДокументОснование", OLD."ВидСвязи") IS DISTINCT FROM (NEW."ДокументОснование", NEW."ВидСвязи")) THEN
+            INSERT INTO "{PLAN_CACHE_CHANGES_TABLE}" ("id_doc") VALUES (NEW."ДокументОснование");
+        END IF;
+        RETURN NULL;
+    END
+    $$;
+    CREATE OR REPLACE FUNCTION "{PLAN_CACHE_CHANGES_TABLE}_rd"() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO "{PLAN_CACHE_CHANGES_TABLE}" ("id_doc") VALUES (CASE WHEN TG_OP = 'DELETE' THEN OLD."@Документ" ELSE NEW."@Документ" END);
+        RETURN NULL;
+    END
+    $$;
+'''
+
+# Триггеры журнала изменений. Отслеживаются:
+# - проводки по счетам договоров (добавление, изменение, удаление) - по лицу договора
+# - договоры и документы начисления процентов (в т.ч. "Удален", "$Черновик")
+# - связи документов начисления процентов с договорами
+# - ставка и период договора
+# Создаются только отсутствующие триггеры (см. GET_PLAN_CACHE_TRIGGERS): создание триггера блокирует таблицу
+PLAN_CACHE_TRIGGERS = {
+    f'{PLAN_CACHE_CHANGES_TABLE}_dc': f'''
+        CREATE TRIGGER "{PLAN_CACHE_CHANGES_TABLE}_dc"
+            AFTER INSERT OR UPDATE OR DELETE ON "ДебетКредит"
+            FOR EACH ROW EXECUTE FUNCTION "{PLAN_CACHE_CHANGES_TABLE}_dc"({{accounts}})
+    ''',
+    f'{PLAN_CACHE_CHANGES_TABLE}_doc': f'''
+        CREATE TRIGGER "{PLAN_CACHE_CHANGES_TABLE}_doc"
+            AFTER INSERT OR DELETE OR UPDATE OF
+                "ТипДокумента", "Дата", "Лицо", "ДокументНашаОрганизация", "Удален", "$Черновик"
+            ON "Документ"
+            FOR EACH ROW EXECUTE FUNCTION "{PLAN_CACHE_CHANGES_TABLE}_doc"({{types}})
+    ''',
+    f'{PLAN_CACHE_CHANGES_TABLE}_link': f'''
+        CREATE TRIGGER "{PLAN_CACHE_CHANGES_TABLE}_link"
+            AFTER INSERT OR UPDATE OR DELETE ON "СвязьДокументов"
+            FOR EACH ROW EXECUTE FUNCTION "{PLAN_CACHE_CHANGES_TABLE}_link"({{link_types}})
+    ''',
+    f'{PLAN_CACHE_CHANGES_TABLE}_rd': f'''
+        CREATE TRIGGER "{PLAN_CACHE_CHANGES_TABLE}_rd"
+            AFTER INSERT OR DELETE OR UPDATE OF "Коэффициент", "ДатаНач", "ДатаКнц" ON "РазличныеДокументы"
+            FOR EACH ROW EXECUTE FUNCTION "{PLAN_CACHE_CHANGES_TABLE}_rd"()
+    ''',
+}
+
+GET_PLAN_CACHE_TRIGGERS = '''
+    SELECT
+        "tgname"
+    FROM
+        pg_trigger
+    WHERE
+        "tgname" = ANY($1::text[])
+'''
 
+GET_PLAN_CACHE_CHANGES = f'''
+    SELECT
+        array_agg("@change") "changes",
+        COALESCE(array_agg(DISTINCT "id_face") FILTER (WHERE "id_face" IS NOT NULL), '{{}}') "faces",
+        COALESCE(array_agg(DISTINCT "id_doc") FILTER (WHERE "id_doc" IS NOT NULL), '{{}}') "docs"
+    FROM
+        "{PLAN_CACHE_CHANGES_TABLE}"
+'''
 
-KEY_CACHE_PLAN_CONTRACTORS = 'plan_docs'
+DELETE_PLAN_CACHE_CHANGES = f'''
+    DELETE FROM
+        "{PLAN_CACHE_CHANGES_TABLE}"
+    WHERE
+        "@change" = ANY($1::bigint[])
+'''
+
+# Договоры по изменившимся лицам ($1) и документам ($2): сами договоры и договоры документов начисления процентов
+CHANGED_PLAN_CONTRACTS = '''
+    WITH changed_loans AS (
+        SELECT
+            unnest($2::integer[]) "@Документ"
+        UNION
+        SELECT
+            link_docs."ДокументОснование"
+        FROM
+            "СвязьДокументов" link_docs
+        WHERE
+            link_docs."ДокументСледствие" = ANY($2::integer[]) AND
+            link_docs."ВидСвязи" = ANY($3::integer[])
+    )
+    SELECT
+        doc."@Документ"
+    FROM
+        "Документ" doc
+    WHERE
+        doc."ТипДокумента" = $4::integer AND
+        (
+            doc."Лицо" = ANY($1::integer[]) OR
+            doc."@Документ" IN (SELECT "@Документ" FROM changed_loans)
+        )
+'''
 
 
 class CachePlanPercent(BaseCacheLoan):
     """Класс отчечает за кеширования договоров для построения планового реестра процентов"""
     def __init__(self):
-        pass
+        self.lcdb = LCDB()
+
+    def get_types_obj(self):
+        """Возвращает объекты реестра и соответствующие им типы договоров"""
+        return (
+            (LC.PERCENTS_ON_ISSUED_LOANS, self.lcdb.issued_id()),
+            (LC.PERCENTS_ON_RECEIVED_LOANS, self.lcdb.received_id()),
+        )
 
     def recalc_cache(self):
         """Пересчитывает кеш по всем договорам"""
-        issues_contractors = self.__get_contractors(LC.PERCENTS_ON_ISSUED_LOANS)
-        self.save_cache_contracts(issues_contractors)
-        received_contractors = self.__get_contractors(LC.PERCENTS_ON_RECEIVED_LOANS)
-        self.save_cache_contracts(received_contractors)
+        self.__create_tables()
+        self.__recalc_all()
+
+    def refresh_cache(self):
+        """
+        Пересчитывает кеш по договорам, изменившимся с прошлого обновления (см. журнал PLAN_CACHE_CHANGES_TABLE)
+        :return: пересчитанные договоры (и документы журнала), None - выполнен полный пересчет
+        Примечание: если кеш еще не заполнялся - выполняется полный пересчет
+        """
+        if not self.__create_tables():
+            self.__recalc_all()
+            return None
+
+        started = time.monotonic()
+        changes = self.__get_changes()
+        refreshed = set()
+        for type_obj, id_type_doc in self.get_types_obj():
+            started_type = time.monotonic()
+            id_loans = self.__get_changed_contracts(changes, id_type_doc)
+            # удаленные договоры есть в журнале, но уже нет в "Документ" - их записи удаляются из кеша
+            scope = sorted(set(id_loans) | set(changes.Get('docs')))
+            refreshed.update(scope)
+            count_written = count_deleted = 0
+            if scope:
+                contractors = self.__get_contractors(type_obj, id_loans) if id_loans else []
+                count_written, count_deleted = self.save_cache_contracts(contractors, id_type_doc, scope)
+            sbis.LogMsg(
+                f'Refresh plan percents cache for {type_obj}: {len(id_loans)} changed contracts, '
+                f'{count_written} written, {count_deleted} deleted in {time.monotonic() - started_type:.1f}s'
+            )
+        sbis.SqlQuery(DELETE_PLAN_CACHE_CHANGES, changes.Get('changes'))
+        sbis.LogMsg(
+            f'Refresh plan percents cache finished in {time.monotonic() - started:.1f}s, '
+            f'{len(changes.Get("changes") or [])} changes processed'
+        )
+        return sorted(refreshed)
+
+    def __recalc_all(self):
+        """Пересчитывает кеш по всем договорам и очищает прочитанный журнал изменений"""
+        # журнал читаем до пересчета: изменения, сделанные во время пересчета, останутся для следующего обновления
+        changes = self.__get_changes()
+        for type_obj, id_type_doc in self.get_types_obj():
+            contractors = self.__get_contractors(type_obj)
+            self.save_cache_contracts(contractors, id_type_doc)
+        sbis.SqlQuery(DELETE_PLAN_CACHE_CHANGES, changes.Get('changes'))
+
+    def __create_tables(self):
+        """
+        Создает таблицы, функции и отсутствующие триггеры журнала изменений
+        :return: признак, что таблица кеша уже существовала
+        Примечание: существующие триггеры не пересоздаются, поэтому регулярное обновление не блокирует таблицы
+        проводок и документов
+        """
+        exists = sbis.SqlQueryScalar('SELECT to_regclass($1::text) IS NOT NULL', f'"{PLAN_CONTRACTS_TABLE}"')
+        sbis.SqlQuery(CREATE_PLAN_CONTRACTS_TABLE)
+        sbis.SqlQuery(CREATE_PLAN_CACHE_CHANGES_TABLE)
+        # замена функции не блокирует таблицы, поэтому тексты функций обновляются при каждом вызове
+        sbis.SqlQuery(CREATE_PLAN_CACHE_CHANGES_FUNCTIONS)
+        existing_triggers = sbis.SqlQuery(GET_PLAN_CACHE_TRIGGERS, list(PLAN_CACHE_TRIGGERS)).ToList('tgname')
+        missing_triggers = [name for name in PLAN_CACHE_TRIGGERS if name not in existing_triggers]
+        if missing_triggers:
+            trigger_args = {
+                'accounts': self.__get_trigger_args(self.lcdb.accounts_ids()),
+                'types': self.__get_trigger_args(
+                    (self.lcdb.issued_id(), self.lcdb.received_id(), self.lcdb.percents_id())
+                ),
+                'link_types': self.__get_trigger_args((LC.LINK_TYPE, LC.NORMAL_LINK_TYPE)),
+            }
+            for name in missing_triggers:
+                sbis.SqlQuery(PLAN_CACHE_TRIGGERS[name].format(**trigger_args))
+                sbis.LogMsg(f'Create trigger {name}')
+        return exists
 
-    def __get_contractors(self, type_obj):
+    @staticmethod
+    def __get_trigger_args(ids):
+        """Аргументы триггера: идентификаторы строковыми литералами"""
+        return ', '.join(f"'{int(_id):d}'" for _id in ids)
+
+    @staticmethod
+    def __get_changes():
+        """Возвращает записи журнала изменений: идентификаторы записей, лица и документы"""
+        return sbis.SqlQueryRecord(GET_PLAN_CACHE_CHANGES)
+
+    def __get_changed_contracts(self, changes, id_type_doc):
+        """
+        Возвращает договоры, по которым изменились проводки, документы начисления процентов или параметры договора
+        :param changes: записи журнала изменений, Record (см. __get_changes)
+        :param id_type_doc: тип договоров
+        """
+        if not changes.Get('changes'):
+            return []
+        changed = sbis.SqlQuery(
+            CHANGED_PLAN_CONTRACTS,
+            changes.Get('faces'),
+            changes.Get('docs'),
+            [LC.LINK_TYPE, LC.NORMAL_LINK_TYPE],
+            id_type_doc,
+        )
+        return [rec.Get('@Документ') for rec in changed]
+
+    def __get_contractors(self, type_obj, id_loans=None):
         """Возвращает список договоров"""
         _filter = sbis.Record({
-            'ФильтрДокументНашаОрганизация': -2
+            'ФильтрДокументНашаОрганизация': -2,
+            'ScriptInitCache': True,
         })
+        if id_loans is not None:
+            _filter.AddArrayInt32('ФильтрИдДоговоров', list(id_loans))
         navigation = sbis.Navigation(999999, 0, True)
 
         return PlanPercentsList(_filter, navigation, type_obj=type_obj).get_documents(only_contractors=True)
 
-    def save_cache_contracts(self, contracts):
+    def save_cache_contracts(self, contracts, id_type_doc, id_loans=None):
         """
         Сохраняет расчитанные договора в кэш
         :param contracts: список договоров, RecorsSet
+        :param id_type_doc: тип договоров
+        :param id_loans: список пересчитанных договоров, если не задан - пересчитаны все договоры типа
+        :return: количество записанных (изменившихся) и удаленных записей кеша
+        Примечание: договоры типа (или из id_loans), которых нет в contracts, удаляются из кеша
         """
-        cache_contracts = []
-
+        columns = ([], [], [], [])
         for contract in contracts:
-            params = ';'.join([
-                str(contract.Get('ДатаС')),
-                str(contract.Get('date_last_payment') or ''),
-                str(contract.Get('debt')),
-            ])
-            cache_contracts.append(
-                {
-                    'id_doc': contract.Get('id_contract'),
-                    'params': sbis.CreateHstore({KEY_CACHE_PLAN_CONTRACTORS: params}),
-                },
+            for column, field in zip(columns, ('id_contract', 'ДатаС', 'date_last_payment', 'debt')):
+                column.append(contract.Get(field))
+
+        count_written = 0
+        with sbis.CreateTransaction(sbis.TransactionLevel.READ_COMMITTED, sbis.TransactionMode.WRITE):
+            deleted = sbis.SqlQuery(
+                DELETE_PLAN_CONTRACTS,
+                id_type_doc,
+                columns[0],
+                list(id_loans) if id_loans is not None else None,
             )
+            if columns[0]:
+                count_written = sbis.SqlQuery(UPSERT_PLAN_CONTRACTS, id_type_doc, *columns).Size()
+
+        sbis.LogMsg(f'Write cache for {count_written} of {len(columns[0])} contractors, {deleted.Size()} deleted')
+        return count_written, deleted.Size()
+
+    def check_cache_equivalence(self):
+        """
+        Сверяет плановые месяцы, построенные по кешу, с построенными живым запросом
+        :return: расхождения вида {(type_obj, организация, дата): (по кешу, живым запросом)}
+        """
+        differences = {}
+        for type_obj, id_type_doc in self.get_types_obj():
+            live_months = self.__get_plan_months(type_obj, use_cache=False)
+            cache_months = self.__get_plan_months(type_obj, use_cache=True)
+            for key in live_months.keys() | cache_months.keys():
+                if live_months.get(key) != cache_months.get(key):
+                    differences[(type_obj, *key)] = (cache_months.get(key), live_months.get(key))
+            sbis.LogMsg(
+                f'Check plan percents cache for {type_obj}: {len(live_months)} live months, '
+                f'{len(cache_months)} cache months, {len(differences)} differences in total'
+            )
+        return differences
+
+    @staticmethod
+    def __get_plan_months(type_obj, use_cache):
+        """
+        Возвращает плановые месяцы по всем организациям
+        :param type_obj: объект реестра (проценты по выданным/полученным займам)
+        :param use_cache: признак построения по кешу
+        """
+        _filter = sbis.Record({
+            'ФильтрДокументНашаОрганизация': -2,
+            'PlanDocsByCache': use_cache,
+        })
+        navigation = sbis.Navigation(999999, 0, True)
+        return PlanPercentsList(_filter, navigation, type_obj=type_obj).get_plan_months()
+
+
+def check_cache_equivalence():
+    """Сверяет кеш плановых процентов с живым запросом (запускается перед включением PLAN_DOCS_BY_CACHE)"""
+    return CachePlanPercent().check_cache_equivalence()
+
 
-        sbis.LogMsg(f'Write cache for {len(cache_contracts)} contractors')
-        self.mass_update(key_cache=KEY_CACHE_PLAN_CONTRACTORS, values=cache_contracts)
+def refresh_plan_percents_cache():
+    """
+    Обновляет кеш плановых процентов по изменившимся договорам (точка входа ночного обслуживания кеша)
+    Примечание: при построении по таблице плановых месяцев (PLAN_DOCS_BY_MONTHS_TABLE) таблица обновляется по тем же
+    договорам из журнала изменений
+    """
+    id_loans = CachePlanPercent().refresh_cache()
+    if PLAN_DOCS_BY_MONTHS_TABLE:
+        refresh_plan_months(id_loans)
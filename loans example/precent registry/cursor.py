@@ -0,0 +1,146 @@
+"""
+Модуль содержит курсор навигации реестра процентов.
+
+Курсор составной (подробнее в base.py) и состоит из
+1. id_doc, date_doc - идентификатор и дата фактического документа
+2. id_plan_doc, date_plan_doc - идентификатор и дата плановой записи
+3. count_create_buttons - количество кнопок создания, которые осталось отобразить
+4. need_today - признак, что линию текущего дня еще предстоит добавить
+
+Курсор разбирается один раз на входе в реестр (RegistryCursor.from_position) и передается в источники
+(PercentsDocListMaker, PlanPercentsList) уже в типизированном виде. Курсор неизменяемый, новый курсор для следующей
+страницы формируется через replace и кодируется методом encode (RegistryCursor.decode(cursor.encode()) == cursor).
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import datetime
+from collections import namedtuple
+
+import sbis
+from .const import BOTHWAYS, FORWARD, BACKWARD
+
+FORMAT_DATE_CURSOR = '%Y-%m-%d'
+COUNT_CREATE_BUTTONS = 2
+
+# Порядок полей совпадает с порядком значений в nextPosition
+CURSOR_FIELDS = ('id_doc', 'date_doc', 'id_plan_doc', 'date_plan_doc', 'count_create_buttons', 'need_today')
+
+
+class RegistryCursor(namedtuple('RegistryCursor', CURSOR_FIELDS)):
+    """Типизированный курсор навигации реестра процентов"""
+    __slots__ = ()
+
+    def __new__(cls, id_doc=None, date_doc=None, id_plan_doc=None, date_plan_doc=None,
+                count_create_buttons=COUNT_CREATE_BUTTONS, need_today=True):
+        return super().__new__(cls, id_doc, date_doc, id_plan_doc, date_plan_doc, count_create_buttons, need_today)
+
+    @classmethod
+    def from_position(cls, position):
+        """
+        Разбирает позицию навигации
+        :param position: позиция навигации (Record или dict), может отсутствовать
+        :return: RegistryCursor
+        """
+        if not position:
+            return cls()
+        getter = position.Get if hasattr(position, 'Get') else position.get
+        return cls.decode([getter(field) for field in CURSOR_FIELDS])
+
+    @classmethod
+    def decode(cls, values):
+        """
+        Разбирает значения курсора
+        :param values: значения полей в порядке CURSOR_FIELDS (см. encode)
+        :return: RegistryCursor
+        """
+        if len(values) != len(CURSOR_FIELDS):
+            raise sbis.Error(f'Некорректная позиция навигации реестра процентов: {values}')
+        id_doc, date_doc, id_plan_doc, date_plan_doc, count_create_buttons, need_today = values
+        count_create_buttons = cls.__parse_int('count_create_buttons', count_create_buttons)
+        return cls(
+            id_doc=cls.__parse_int('id_doc', id_doc),
+            date_doc=cls.__parse_date('date_doc', date_doc),
+            id_plan_doc=cls.__parse_int('id_plan_doc', id_plan_doc),
+            date_plan_doc=cls.__parse_date('date_plan_doc', date_plan_doc),
+            count_create_buttons=COUNT_CREATE_BUTTONS if count_create_buttons is None else count_create_buttons,
+            need_today=cls.__parse_bool('need_today', need_today),
+        )
+
+    def encode(self):
+        """Кодирует курсор в значения nextPosition (строки в порядке CURSOR_FIELDS)"""
+        return [
+            str(self.id_doc) if self.id_doc is not None else None,
+            self.date_doc.strftime(FORMAT_DATE_CURSOR) if self.date_doc else None,
+            str(self.id_plan_doc) if self.id_plan_doc is not None else None,
+            self.date_plan_doc.strftime(FORMAT_DATE_CURSOR) if self.date_plan_doc else None,
+            str(self.count_create_buttons),
+            str(self.need_today),
+        ]
+
+    def replace(self, **fields):
+        """Возвращает копию курсора с измененными полями"""
+        return self._replace(**fields)
+
+    @property
+    def has_fact_position(self):
+        """Признак наличия позиции фактического документа"""
+        return self.id_doc is not None and self.date_doc is not None
+
+    @property
+    def has_plan_position(self):
+        """Признак наличия позиции плановой записи"""
+        return self.id_plan_doc is not None and self.date_plan_doc is not None
+
+    def get_border_date(self, direction, today):
+        """
+        Возвращает ближайшую граничную дату документа из курсора
+        :param direction: направление навигации
+        :param today: текущая дата
+        Примечание: в зависимости от направления скролирования берется минимальная или максимальная дата
+        """
+        cursor_dates = [date for date in (self.date_doc, self.date_plan_doc) if date]
+        if not cursor_dates:
+            return None
+        date_by_direction = {
+            BACKWARD: max(cursor_dates),
+            BOTHWAYS: today,
+            FORWARD: min(cursor_dates),
+        }
+        return date_by_direction.get(direction)
+
+    @staticmethod
+    def __parse_int(field, value):
+        """Разбирает целочисленное значение курсора"""
+        if value is None or value == '':
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise sbis.Error(f'Некорректное значение {field} в позиции навигации реестра процентов: {value}')
+
+    @staticmethod
+    def __parse_date(field, value):
+        """Разбирает дату курсора"""
+        if value is None or value == '':
+            return None
+        if isinstance(value, datetime.datetime):
+            return value.date()
+        if isinstance(value, datetime.date):
+            return value
+        try:
+            return datetime.datetime.strptime(str(value), FORMAT_DATE_CURSOR).date()
+        except ValueError:
+            raise sbis.Error(f'Некорректное значение {field} в позиции навигации реестра процентов: {value}')
+
+    @staticmethod
+    def __parse_bool(field, value):
+        """Разбирает логическое значение курсора (по умолчанию True)"""
+        if value is None or value == '':
+            return True
+        if isinstance(value, str):
+            if value.lower() not in ('true', 'false'):
+                raise sbis.Error(f'Некорректное значение {field} в позиции навигации реестра процентов: {value}')
+            return value.lower() == 'true'
+        return bool(value)
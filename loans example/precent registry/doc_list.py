@@ -15,16 +15,18 @@ from loans.loanConsts import LC
 from loans.loanDBConsts import LCDB
 from loans.version_loans import get_date_build
 from .const import FORWARD, BACKWARD, LIST_PERCENT_FACT
+from .cursor import RegistryCursor
 from .helpers import is_last_month_day
 
 
 class PercentsDocListMaker(metaclass=abc.ABCMeta):
     """Класс конструктор доклиста"""
-    def __init__(self, filter_rec, navigation, doc_type, method_name):
+    def __init__(self, filter_rec, navigation, doc_type, method_name, cursor=None):
         # поскольку необходимо сохранить фильтр в дочерних классах неизменным, то пересоздаем фильтр,
         # необходимый для док листа (тем самым убирается корректировка через __is_all_our_org_or_our_company)
         self.filter_rec = sbis.Record(filter_rec)
         self.navigation = navigation
+        self.cursor = cursor or RegistryCursor.from_position(navigation.Position())
         self._lcdb = LCDB()
         self._doc_type = doc_type
         self._org_id = self.filter_rec.Get(LC.FLD_FILTER_OUR_ORG, None)
@@ -41,6 +43,11 @@ class PercentsDocListMaker(metaclass=abc.ABCMeta):
         return False
 
     def __get_all_our_org_where_text(self):
+        """
+        Фильтр доклиста по организациям: все организации, кроме нашей компании
+        Примечание: доклист не принимает параметры запроса, идентификатор подставляется типизированным литералом.
+        Идентификатор нашей компании постоянен для базы, поэтому текст запроса доклиста от него не зависит.
+        """
         filter_by_org = None
         our_comp_id = self._lcdb.our_company_id()
         if our_comp_id is not None:
@@ -54,42 +61,34 @@ class PercentsDocListMaker(metaclass=abc.ABCMeta):
         return None
 
     def __get_cursor_filter(self):
-        """Фильтр по курсору навигации"""
+        """
+        Фильтр по курсору навигации (keyset)
+        Примечание: условие - сравнение кортежей ("Дата", "@Документ") с позицией курсора, которое обслуживается
+        индексом FACT_DOCS_KEYSET_INDEX (см. migrations), поэтому стоимость страницы не зависит от ее номера. Доклист
+        не принимает параметры запроса, поэтому значения курсора подставляются типизированными литералами (курсор уже
+        разобран и проверен в RegistryCursor).
+        """
         direction = self.navigation.Direction()
-        id_doc_position, date_doc_position = self.__get_data_cursor()
-
-        if all((id_doc_position, date_doc_position)):
+        if self.cursor.has_fact_position:
             if self.is_first_page:
                 sign_by_directions = {FORWARD: '<=', BACKWARD: '>'}
             else:
                 sign_by_directions = {FORWARD: '<', BACKWARD: '>'}
             cursor_filter = '''
-                ("Д"."Дата", "Д"."@Документ") {sign} ('{date_doc_position}'::DATE, {id_doc_position}::INT)
+                ("Д"."Дата", "Д"."@Документ") {sign} ('{date:%Y-%m-%d}'::date, {id_doc:d}::integer)
             '''
         else:
             sign_by_directions = {FORWARD: '<=', BACKWARD: '>'}
             cursor_filter = '''
-                ("Д"."Дата"::date {sign} '{date}'::date)
+                "Д"."Дата" {sign} '{date:%Y-%m-%d}'::date
             '''
 
         return cursor_filter.format(
             sign=sign_by_directions.get(direction),
-            date_doc_position=date_doc_position,
-            id_doc_position=id_doc_position,
-            date=self.today,
+            date=self.cursor.date_doc if self.cursor.has_fact_position else self.today,
+            id_doc=self.cursor.id_doc,
         )
 
-    def __get_data_cursor(self):
-        """Возвращает данные курсора"""
-        position = self.navigation.Position()
-        if position:
-            id_doc_position = position.Get('id_doc')
-            date_doc_position = position.Get('date_doc')
-        else:
-            id_doc_position = None
-            date_doc_position = None
-        return id_doc_position, date_doc_position
-
     def _get_search_mask_strategy(self):
         return None
 
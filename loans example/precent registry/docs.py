@@ -13,8 +13,8 @@ from .const import LIST_PERCENT_FACT
 
 class PercentsListNew(PercentsDocListMaker):
     """Класс отвечает за формирование списка фактических документов начисления процентов на основании доклиста"""
-    def __init__(self, _filter, navigation, doc_type, result_format):
-        super().__init__(_filter, navigation, doc_type, 'СписокЛесенка')
+    def __init__(self, _filter, navigation, doc_type, result_format, cursor=None):
+        super().__init__(_filter, navigation, doc_type, 'СписокЛесенка', cursor)
         self._filter = _filter
         self.navigation = navigation
         self.doc_type = doc_type
@@ -35,5 +35,14 @@ class PercentsListNew(PercentsDocListMaker):
             0::numeric(32,2) AS "{LC.FLD_PERCENTS_RECEIVED_LOANS}",
             NULL AS "РП.Документ",
             "ДР"."ДатаВремяСоздания" AS "ДР.ДатаВремяСоздания",
+            COALESCE(
+                CASE
+                    WHEN
+                        "ДР"."Параметры"::hstore->'date_update' ~ '^[0-9]{{4}}-[0-9]{{2}}-[0-9]{{2}}' AND
+                        pg_input_is_valid(left("ДР"."Параметры"::hstore->'date_update', 10), 'date')
+                    THEN left("ДР"."Параметры"::hstore->'date_update', 10)::date
+                END,
+                "ДР"."ДатаВремяСоздания"::date
+            ) AS "ДатаИзменения",
             {LIST_PERCENT_FACT} "ТипЗаписи"
         '''
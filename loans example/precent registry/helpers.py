@@ -6,45 +6,38 @@
 __author__ = 'Glukhenko A.V.'
 
 import calendar
+import datetime
 
-import sbis
-from .const import FORWARD, BACKWARD
+import numpy
 
+from .const import BACKWARD
 
-def cut_by_navigation(rows, navigation):
+
+def cut_by_navigation(rows, navigation, limit=None, is_counted=None):
     """
     Обрезает результат согласно навигации
-    :param rows: набор данных, RecordSet
+    :param rows: набор данных (последовательность записей)
     :param navigation: объект навигации
+    :param limit: количество оставляемых записей, по умолчанию navigation.Limit()
+    :param is_counted: функция, определяющая учитываемые в лимите записи (остальные записи не удаляются), по умолчанию
+    учитываются все записи
+    :return: список оставшихся записей
+    Примечание: FORWARD (и BOTHWAYS) оставляет первые limit учитываемых записей, BACKWARD - последние. Удаляемые записи
+    определяются по индексам за один проход.
     """
-    direction = navigation.Direction()
-    limit = navigation.Limit()
-    id_docs = rows.ToList('@Документ')
-
-    id_docs_for_remove = []
-    if direction == FORWARD:
-        id_docs_for_remove = id_docs[limit:]
-    if direction == BACKWARD:
-        id_docs_for_remove = id_docs[:len(id_docs) - limit]
-
-    for rec in reversed(rows):
-        if rec.Get('@Документ') in id_docs_for_remove:
-            rows.DelRow(rec)
+    if limit is None:
+        limit = navigation.Limit()
+    rows = list(rows)
+    counted = [i for i, rec in enumerate(rows) if is_counted is None or is_counted(rec)]
+    if len(counted) <= limit:
+        return rows
 
+    if navigation.Direction() == BACKWARD:
+        indexes_for_remove = set(counted[:len(counted) - limit])
+    else:
+        indexes_for_remove = set(counted[limit:])
 
-def get_date_update(rec):
-    """
-    Рассчитывает дату изменения документа
-    :param rec: запись
-    :return:
-    """
-    params = rec.Get('ДокументРасширение.Параметры')
-    try:
-        params = sbis.ParseHstore(params) if params else dict()
-    except Exception as err:
-        sbis.WarningMsg('some problem with ParseHstore: {}'.format(err))
-        params = {}
-    return params.get('date_update') or rec.Get('ДР.ДатаВремяСоздания').date()
+    return [rec for i, rec in enumerate(rows) if i not in indexes_for_remove]
 
 
 def is_last_month_day(date):
@@ -53,3 +46,81 @@ def is_last_month_day(date):
     :param date: дата документа
     """
     return calendar.monthrange(date.year, date.month)[1] == date.day
+
+
+class MonthEnds:
+    """
+    Даты планового начисления периода (как LoansDates.getMonthEndsForPeriod) без построения списка
+    Даты - последние дни месяцев периода, в последнем месяце - дата окончания периода. Дата по номеру и количество дат
+    вычисляются по номерам месяцев, поэтому последовательность подходит для bisect и обхода по номеру, а память и время
+    построения не зависят от длины периода.
+    """
+    def __init__(self, date_begin, date_end, date_max=None):
+        """
+        :param date_begin: дата начала периода
+        :param date_end: дата окончания периода
+        :param date_max: максимальная дата (более поздние даты отбрасываются)
+        """
+        self.date_end = date_end
+        self.__first_month = 0
+        self.__count_months = 0
+        self.__count = 0
+        if date_begin and date_end and date_begin <= date_end:
+            self.__first_month = self.__get_month_number(date_begin)
+            self.__count_months = self.__count = self.__get_month_number(date_end) - self.__first_month + 1
+            if date_max is not None and date_max < date_end:
+                count_by_max = self.__get_month_number(date_max) - self.__first_month + is_last_month_day(date_max)
+                self.__count = max(0, min(self.__count, count_by_max))
+
+    @staticmethod
+    def __get_month_number(date):
+        """Возвращает сквозной номер месяца даты"""
+        return date.year * 12 + date.month - 1
+
+    def __len__(self):
+        return self.__count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.__count
+        if not 0 <= index < self.__count:
+            raise IndexError('MonthEnds index out of range')
+        if index == self.__count_months - 1:
+            return self.date_end
+        year, month = divmod(self.__first_month + index, 12)
+        return datetime.date(year, month + 1, calendar.monthrange(year, month + 1)[1])
+
+    def __iter__(self):
+        return (self[index] for index in range(self.__count))
+
+
+def get_month_ends_by_ranges(ranges, date_max=None):
+    """
+    Раскладывает периоды по датам планового начисления (аналог LoansDates.getMonthEndsForPeriod для набора периодов)
+    :param ranges: периоды [(дата начала, дата окончания), ...]
+    :param date_max: максимальная дата (более поздние даты отбрасываются)
+    :return: даты по периодам (по возрастанию): [[date, ...], ...]
+    Примечание: даты - последние дни месяцев периода, в последнем месяце - дата окончания периода. Даты всех периодов
+    считаются за один проход по массивам NumPy (datetime64), без цикла по месяцам каждого периода.
+    """
+    if not ranges:
+        return []
+    begins = numpy.array([date_begin for date_begin, date_end in ranges], dtype='datetime64[D]')
+    ends = numpy.array([date_end for date_begin, date_end in ranges], dtype='datetime64[D]')
+
+    month_begins = begins.astype('datetime64[M]')
+    counts = (ends.astype('datetime64[M]') - month_begins).astype(numpy.int64) + 1
+    # периоды без дат (не заданы границы или начало позже окончания)
+    counts[numpy.isnat(begins) | numpy.isnat(ends) | (begins > ends)] = 0
+
+    index_ranges = numpy.repeat(numpy.arange(len(ranges)), counts)
+    offsets = numpy.cumsum(counts) - counts
+    months = month_begins[index_ranges] + (numpy.arange(counts.sum()) - offsets[index_ranges])
+    dates = numpy.minimum((months + 1).astype('datetime64[D]') - 1, ends[index_ranges])
+    if date_max is not None:
+        is_allowed = dates <= numpy.datetime64(date_max, 'D')
+        dates, index_ranges = dates[is_allowed], index_ranges[is_allowed]
+
+    bounds = numpy.cumsum(numpy.bincount(index_ranges, minlength=len(ranges))).tolist()
+    dates = dates.tolist()
+    return [dates[bound - count:bound] for bound, count in zip(bounds, numpy.diff([0] + bounds).tolist())]
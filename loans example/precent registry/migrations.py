@@ -0,0 +1,52 @@
+"""
+Модуль обновления структуры базы для реестра процентов.
+
+Точка входа migrate запускается при обновлении базы отдельно от списочных методов и обслуживания кешей, вне
+транзакции: индексы строятся CONCURRENTLY.
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import sbis
+
+
+# Индекс для keyset навигации по фактическим документам (см. PercentsDocListMaker.__get_cursor_filter): порядок
+# колонок совпадает с сортировкой реестра, условие по типу документа отсекает остальные документы
+FACT_DOCS_KEYSET_INDEX_NAME = 'Документ_проценты_keyset_idx'
+FACT_DOCS_KEYSET_INDEX = f'''
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS "{FACT_DOCS_KEYSET_INDEX_NAME}"
+        ON "Документ" ("ТипДокумента", "Дата" DESC, "@Документ" DESC)
+        WHERE "$Черновик" IS NULL
+'''
+
+# Признак корректности индекса (прерванное CREATE INDEX CONCURRENTLY оставляет некорректный индекс)
+IS_VALID_FACT_DOCS_KEYSET_INDEX = f'''
+    SELECT
+        "indisvalid"
+    FROM
+        pg_index
+    WHERE
+        "indexrelid" = to_regclass('"{FACT_DOCS_KEYSET_INDEX_NAME}"')
+'''
+
+DROP_FACT_DOCS_KEYSET_INDEX = f'''
+    DROP INDEX CONCURRENTLY IF EXISTS "{FACT_DOCS_KEYSET_INDEX_NAME}"
+'''
+
+
+def migrate():
+    """Обновляет структуру базы реестра процентов (повторный запуск ничего не меняет)"""
+    create_fact_docs_keyset_index()
+
+
+def create_fact_docs_keyset_index():
+    """
+    Создает индекс FACT_DOCS_KEYSET_INDEX, если его нет
+    Примечание: индекс строится CONCURRENTLY, чтобы не блокировать запись в "Документ". Прерванное построение оставляет
+    некорректный индекс, который IF NOT EXISTS не пересоздаст, поэтому такой индекс удаляется и строится заново.
+    """
+    if sbis.SqlQueryScalar(IS_VALID_FACT_DOCS_KEYSET_INDEX) is False:
+        sbis.LogMsg(f'Rebuild invalid index {FACT_DOCS_KEYSET_INDEX_NAME}')
+        sbis.SqlQuery(DROP_FACT_DOCS_KEYSET_INDEX)
+    sbis.SqlQuery(FACT_DOCS_KEYSET_INDEX)
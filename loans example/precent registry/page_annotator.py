@@ -0,0 +1,91 @@
+"""
+Модуль содержит разметку страницы реестра процентов.
+
+Решения постобработки страницы (PercentsListAggregator) зависят от одних и тех же характеристик страницы:
+- период страницы (даты первого и последнего документа) - нужна ли линия текущего дня
+- годы документов страницы - разделители годов и количество служебных строк
+- граничные фактические и плановые записи - курсор следующей страницы
+- плановые записи - кнопки создания начислений
+- фактические документы - загрузка наименований и сумм
+PageAnnotator собирает их за один проход по документам страницы, после чего служебные строки, курсор и итоговый набор
+формируются без повторного просмотра страницы.
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+from .const import LIST_PERCENT_FACT, LIST_PERCENT_PLAN
+
+
+class PageAnnotator:
+    """Разметка страницы реестра процентов"""
+    def __init__(self, rows):
+        """
+        :param rows: документы страницы (без служебных строк) в порядке реестра
+        """
+        self.date_min = None
+        self.date_max = None
+        self.years = set()
+        self.plan_rows = []
+        self.id_fact_docs = []
+        self.first_rows = {LIST_PERCENT_FACT: None, LIST_PERCENT_PLAN: None}
+        self.last_rows = {LIST_PERCENT_FACT: None, LIST_PERCENT_PLAN: None}
+        self.__annotate(rows)
+
+    def __annotate(self, rows):
+        """Размечает страницу за один проход"""
+        for row in rows:
+            date = row.Get('Дата')
+            if self.date_min is None or date < self.date_min:
+                self.date_min = date
+            if self.date_max is None or date > self.date_max:
+                self.date_max = date
+            self.years.add(date.year)
+
+            type_row = row.Get('ТипЗаписи')
+            if type_row not in (LIST_PERCENT_FACT, LIST_PERCENT_PLAN):
+                continue
+            if type_row == LIST_PERCENT_PLAN:
+                self.plan_rows.append(row)
+            else:
+                id_doc = row.Get('@Документ')
+                if id_doc is not None and id_doc > 0:
+                    self.id_fact_docs.append(id_doc)
+            if self.first_rows[type_row] is None:
+                self.first_rows[type_row] = row
+            self.last_rows[type_row] = row
+
+    def get_period(self, border_date, today):
+        """
+        Возвращает период страницы (т.е. даты первого и последнего документа на странице)
+        :param border_date: граничная дата курсора
+        :param today: текущая дата
+        :return: begin_period, end_period
+        Примечание: в случае если на странице один документ или документы с одинаковыми датами, то используем даты
+        курсора для формирования периода
+        """
+        if self.date_min is None:
+            return None, None
+        if self.date_min == self.date_max:
+            return border_date or today, self.date_max
+        return self.date_min, self.date_max
+
+    def get_boundary_rows(self):
+        """
+        Возвращает позиции первых и последних строк по типам записей (план и факт)
+        :return: first_row, last_row вида {тип записи: {'id_doc': str, 'date_doc': str}}
+        """
+        return self.__get_positions(self.first_rows), self.__get_positions(self.last_rows)
+
+    @staticmethod
+    def __get_positions(rows):
+        """Возвращает позиции строк по типам записей"""
+        positions = {}
+        for type_row, row in rows.items():
+            position = {'id_doc': None, 'date_doc': None}
+            if row is not None:
+                for field, position_field in (('@Документ', 'id_doc'), ('Дата', 'date_doc')):
+                    value = row.Get(field)
+                    position[position_field] = str(value) if value is not None else None
+            positions[type_row] = position
+        return positions
@@ -5,7 +5,11 @@
 
 __author__ = 'Glukhenko A.V.'
 
+import bisect
 import datetime
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import sbis
 from loans.loanConsts import LC
@@ -14,17 +18,29 @@ from loans.loansRightsHelpers import AllowedOrgsChecker
 from loans.percentsCommon import LoansDates
 from loans.percentsToAccrued import LinkedRangesMerger
 from loans.version_loans import get_date_build
-from .helpers import cut_by_navigation
 from .const import FORWARD, BACKWARD
+from .cursor import RegistryCursor
+from .helpers import MonthEnds
 from .const import LIST_PERCENT_PLAN
+from .const import PLAN_DOCS_BY_MONTHS_TABLE, PLAN_MONTHS_TABLE
+from .const import PLAN_DOCS_BY_CACHE, PLAN_CONTRACTS_TABLE
+from .const import PLAN_DOCS_WORKERS, PLAN_DOCS_MAX_WORKERS, PLAN_DOCS_ORGS_BY_PARTITION
+
+
+# Дополнительные поля списка договоров для заполнения кеша (см. PercentsToAccruedSqlMaker.__get_addition_fields)
+ADDITION_FIELDS = ('id_contract', 'debt', 'date_last_payment')
+
+# Множитель даты в порядковом номере плановой записи (порядковые номера организаций меньше множителя)
+ORG_POSITION_FACTOR = 10 ** 10
 
 
 class PlanPercentsList:
     """Класс отвечает за формирование списка плановых документов начисления процентов"""
-    def __init__(self, _filter, navigation, type_obj=None):
+    def __init__(self, _filter, navigation, type_obj=None, cursor=None):
         self._filter = _filter
         self._lcdb = LCDB()
         self.navigation = navigation
+        self.cursor = cursor or RegistryCursor.from_position(navigation.Position())
         self.today = datetime.date.today()
 
         self.date_begin = self.__get_date_begin()
@@ -36,6 +52,30 @@ class PlanPercentsList:
         self._orgs_checker = AllowedOrgsChecker.create(_filter)
         self.is_first_page = self._filter.Get('is_first_page')
         self.is_script_init_cache = self._filter.Get('ScriptInitCache')
+        self.id_loans = self._filter.Get('ФильтрИдДоговоров')
+        self.use_cache = self.__get_use_cache()
+        self.workers = self.__get_workers()
+        self.__names_by_contractors = {}
+
+    def __get_use_cache(self):
+        """
+        Возвращает признак построения списка договоров по кешу (см. converter.py)
+        Примечание: по умолчанию определяется константой PLAN_DOCS_BY_CACHE, фильтр PlanDocsByCache позволяет явно
+        выбрать источник (используется при сверке кеша с живым запросом)
+        """
+        use_cache = self._filter.Get('PlanDocsByCache')
+        if use_cache is None:
+            use_cache = PLAN_DOCS_BY_CACHE
+        # при заполнении кеша список договоров всегда строится живым запросом
+        return bool(use_cache) and not self.is_script_init_cache
+
+    def __get_workers(self):
+        """
+        Возвращает количество потоков построения плановых документов (см. __build_ranges)
+        Примечание: значение из фильтра PlanDocsWorkers ограничивается PLAN_DOCS_MAX_WORKERS
+        """
+        workers = self._filter.Get('PlanDocsWorkers') or PLAN_DOCS_WORKERS
+        return max(1, min(int(workers), PLAN_DOCS_MAX_WORKERS))
 
     def __get_date_begin(self):
         """Возвращает начало периода"""
@@ -74,19 +114,20 @@ class PlanPercentsList:
         }
         return types_dc.get(self.obj)
 
-    def __build_loans_list_by_orgs(self):
+    def __build_loans_list_by_orgs(self, id_orgs=None):
         """
         Построить список договоров, по которым могут быть начислены проценты
         На выходе получим упорядоченный по организациям набор договоров, по которым можно начислить проценты.
         Для каждого договора указан период начисления [ДатаС, ДатаПо]
         Периоды отсортированы по нижней границе
+        :param id_orgs: организации части списка (см. __build_ranges), если не заданы - все доступные организации
         """
-        # Раскоментить, когда нужно будет переходить на построение по кешу
-        # return self.___build_cache_loans_list_by_orgs
+        if self.use_cache:
+            return self.___build_cache_loans_list_by_orgs(id_orgs)
 
-        sql = PercentsToAccruedSqlMaker(self._orgs_checker, self.is_script_init_cache).create_sql()
+        sql_maker = PercentsToAccruedSqlMaker(self._orgs_checker, self.is_script_init_cache, self.id_loans, id_orgs)
         return sbis.SqlQuery(
-            sql,
+            sql_maker.create_sql(),
             self._lcdb.debt_analytic(),
             self.id_type_doc_loan,
             self.__get_type_dc(),
@@ -96,72 +137,262 @@ class PlanPercentsList:
             self.date_end,
             self._lcdb.accounts_ids(),
             [LC.LINK_TYPE, LC.NORMAL_LINK_TYPE],
+            *sql_maker.get_params(),
         )
 
-    def ___build_cache_loans_list_by_orgs(self):
+    def ___build_cache_loans_list_by_orgs(self, id_orgs=None):
         """
         Построить список договоров, по которым могут быть начислены проценты
         На выходе получим упорядоченный по организациям набор договоров, по которым можно начислить проценты.
         Для каждого договора указан период начисления [ДатаС, ДатаПо]
         Периоды отсортированы по нижней границе
+        :param id_orgs: организации части списка (см. __build_ranges)
         """
-        sql = PercentsToAccruedSqlMaker(self._orgs_checker).create_cache_sql()
+        sql_maker = PercentsToAccruedSqlMaker(self._orgs_checker, id_loans=self.id_loans, id_orgs=id_orgs)
         return sbis.SqlQuery(
-            sql,
+            sql_maker.create_cache_sql(),
             self.id_type_doc_loan,
             self.date_end,
+            *sql_maker.get_params(),
+        )
+
+    def __merge_ranges(self, loans):
+        """
+        Объединяет периоды начисления договоров по организациям
+        :param loans: список договоров
+        Примечание: дополнительные поля (ADDITION_FIELDS) ломают объединение периодов LinkedRangesMerger.mergeAll
+        (появляются дубли плановых документов), поэтому перед объединением они удаляются. Поля есть в списке договоров
+        при заполнении кеша и при построении по кешу.
+        """
+        if self.is_script_init_cache or self.use_cache:
+            for field in ADDITION_FIELDS:
+                loans.DelCol(field)
+        # порядок диапазонов задает порядок документов одной даты (по названию нашей организации)
+        return sorted(
+            LinkedRangesMerger(loans).mergeAll(self.date_begin),
+            key=lambda merged_range: merged_range.get('Название') or '',
+        )
+
+    def __get_orgs(self):
+        """
+        Возвращает организации, по которым есть договоры, с учетом фильтров по организациям и договорам
+        :return: список организаций по возрастанию идентификатора
+        """
+        sql_maker = PercentsToAccruedSqlMaker(self._orgs_checker, id_loans=self.id_loans)
+        orgs = sbis.SqlQuery(sql_maker.create_orgs_sql(), self.id_type_doc_loan, *sql_maker.get_params())
+        return [org.Get('@Лицо') for org in orgs]
+
+    def __build_partition_ranges(self, loans):
+        """
+        Строит объединенные диапазоны и даты документов части списка
+        :param loans: список договоров части списка (см. __build_loans_list_by_orgs)
+        :return: [(объединенный диапазон, даты документов по возрастанию), ...] в порядке названия организации
+        Примечание: даты документов - MonthEnds, список дат не строится: обход страницы (см. __iter_plan_docs) ищет
+        позицию курсора bisect и берет только даты страницы. Запросов к базе не выполняет, поэтому вызывается и в
+        потоках пула (см. __build_ranges)
+        """
+        return [
+            (merged_range, MonthEnds(merged_range.get('ДатаС'), merged_range.get('ДатаПо'), self.date_end))
+            for merged_range in self.__merge_ranges(loans)
+        ]
+
+    def __build_timed_partition_ranges(self, loans):
+        """Строит диапазоны части списка (см. __build_partition_ranges), возвращает их и время построения"""
+        started = time.monotonic()
+        ranges = self.__build_partition_ranges(loans)
+        return ranges, time.monotonic() - started
+
+    def __build_ranges(self):
+        """
+        Строит объединенные диапазоны и даты документов
+        :return: [(объединенный диапазон, даты документов по возрастанию), ...] в порядке названия организации
+        Примечание: организации независимы, поэтому при PLAN_DOCS_WORKERS > 1 список строится частями по
+        PLAN_DOCS_ORGS_BY_PARTITION организаций. Запросы частей выполняются в вызывающем потоке по очереди, в пул
+        потоков передается только объединение диапазонов и расчет дат (без обращений к базе), поэтому объединение части
+        идет одновременно с запросом следующей. Части содержат организации по возрастанию идентификатора, поэтому
+        слияние частей по названию дает тот же порядок, что и построение одним запросом (организации с одинаковым
+        названием - по идентификатору). В лог пишется время запросов и объединения частей и общее время: их сумма -
+        время построения без пула.
+        """
+        if self.workers <= 1:
+            return self.__build_partition_ranges(self.__build_loans_list_by_orgs())
+
+        orgs = self.__get_orgs()
+        partitions = [
+            orgs[index:index + PLAN_DOCS_ORGS_BY_PARTITION]
+            for index in range(0, len(orgs), PLAN_DOCS_ORGS_BY_PARTITION)
+        ]
+        if len(partitions) <= 1:
+            return self.__build_partition_ranges(self.__build_loans_list_by_orgs(orgs))
+
+        started = time.monotonic()
+        sql_time = 0
+        futures = []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(partitions))) as executor:
+            for id_orgs in partitions:
+                started_sql = time.monotonic()
+                loans = self.__build_loans_list_by_orgs(id_orgs)
+                sql_time += time.monotonic() - started_sql
+                futures.append(executor.submit(self.__build_timed_partition_ranges, loans))
+            ranges_by_partitions, merge_times = zip(*(future.result() for future in futures))
+        sbis.LogMsg(
+            f'Plan percents built by {len(partitions)} partitions ({len(orgs)} orgs, {self.workers} workers) '
+            f'in {time.monotonic() - started:.3f}s: sql {sql_time:.3f}s, merge {sum(merge_times):.3f}s'
         )
+        return list(heapq.merge(
+            *ranges_by_partitions,
+            key=lambda range_dates: range_dates[0].get('Название') or '',
+        ))
 
-    def __build_docs_list(self, loans):
+    def __build_docs_list(self):
         """
         Формирует список документов к начислению по диапазонам
-        :param loans: список займов
-        """
-        merged_ranges = LinkedRangesMerger(loans).mergeAll(self.date_begin)
-        for merged_range in merged_ranges:
-            last_days_of_month = LoansDates.getMonthEndsForPeriod(merged_range.get('ДатаС'), merged_range.get('ДатаПо'))
-            for date in last_days_of_month:
-                if date <= self.date_end:
-                    percent = sbis.Record({
-                        '@Документ': None,
-                        'Дата': date,
-                        'ТипДокумента': self._lcdb.percents_id(),
-                        'ДокументНашаОрганизация': merged_range.get('@Лицо'),
-                        'ДокументНашаОрганизация.Контрагент.Название': merged_range.get('Название'),
-                        'РП.Лицо1.СписокНазваний': self.__get_name_contractors(merged_range, date),
-                        'ТипЗаписи': LIST_PERCENT_PLAN,
-                    })
-                    self.result.AddRow(percent)
-
-        self.__sort_result()
-        self.__calc_id_doc()
-        self.__filter_by_navigation()
-        self.__filter_by_period()
-        self.__calc_navigation()
-
-    def __calc_id_doc(self):
-        """Рассчитывает идентификаторы записей"""
-        for i, rec in enumerate(self.result, start=1):
-            id_row = sbis.ObjectId('ПроцентыКНачислению', -i)
-            rec['@Документ'].From(id_row)
+        Примечание: записи формируются только для запрошенной страницы (см. __iter_plan_docs), а не для всей истории
+        начислений с последующей сортировкой и удалением лишних записей.
+        """
+        ranges = self.__build_ranges()
+        merged_ranges = [merged_range for merged_range, dates in ranges]
+        dates_by_range = [dates for merged_range, dates in ranges]
+
+        limit = self.navigation.Limit()
+        page = []
+        for position, index_range, date in self.__iter_plan_docs(dates_by_range):
+            page.append((position, index_range, date))
+            if len(page) > limit:
+                break
+
+        more_exist = len(page) > limit
+        page = page[:limit]
+        if self.navigation.Direction() == BACKWARD:
+            page.reverse()
+
+        for position, index_range, date in page:
+            merged_range = merged_ranges[index_range]
+            percent = sbis.Record({
+                '@Документ': None,
+                'Дата': date,
+                'ТипДокумента': self._lcdb.percents_id(),
+                'ДокументНашаОрганизация': merged_range.get('@Лицо'),
+                'ДокументНашаОрганизация.Контрагент.Название': merged_range.get('Название'),
+                'РП.Лицо1.СписокНазваний': self.__get_name_contractors(merged_range, date),
+                'ТипЗаписи': LIST_PERCENT_PLAN,
+            })
+            self.result.AddRow(percent)
+        self.__calc_id_doc([position for position, index_range, date in page])
+        self.result.nav_result = sbis.NavigationResult(more_exist)
 
-    def __filter_by_navigation(self):
-        """Фильтрует результат согласно навигации"""
-        for i in reversed(range(self.result.Size())):
-            id_doc = self.result.Get(i, '@Документ')
-            date = self.result.Get(i, 'Дата')
-            if not self.__is_correct_by_navigation(id_doc, date):
-                self.result.DelRow(i)
+    def __iter_plan_docs(self, dates_by_range):
+        """
+        Генерирует плановые документы страницы в порядке обхода от курсора
+        :param dates_by_range: даты документов по объединенным диапазонам (по возрастанию)
+        :return: генератор (position, index_range, date), где position - порядковый номер документа в полном списке,
+        упорядоченном по (дата desc, порядок диапазона)
+        Примечание: FORWARD обходит документы вниз от курсора (по убыванию даты), BACKWARD - вверх от курсора (по
+        возрастанию даты). Диапазоны сливаются через heap, поэтому обход начинается сразу с позиции курсора и
+        заканчивается, когда вызывающий код набрал страницу. Порядковые номера (а значит и идентификаторы записей)
+        совпадают с нумерацией всего списка, курсоры прошлых страниц остаются корректными.
+        """
+        direction = self.navigation.Direction()
+        id_doc_position, date_doc_position = self.cursor.id_plan_doc, self.cursor.date_plan_doc
+        has_cursor = all((id_doc_position is not None, date_doc_position))
+        period_begin = self._filter.Get('ФильтрДатаС') or datetime.date.min
+        period_end = self._filter.Get('ФильтрДатаП') or datetime.date.max
+
+        if has_cursor:
+            border_date = date_doc_position
+            # на первой странице документ курсора относится к BACKWARD области
+            include_border = not self.is_first_page or direction == BACKWARD
+        else:
+            border_date = self.today
+            include_border = direction == FORWARD
 
-    def __is_correct_by_navigation(self, id_doc, date):
+        if direction == FORWARD:
+            docs = self.__iter_desc(dates_by_range, border_date, include_border)
+        elif direction == BACKWARD:
+            docs = self.__iter_asc(dates_by_range, border_date, include_border)
+        else:
+            docs = iter(())
+
+        for position, index_range, date in docs:
+            if direction == FORWARD and date < period_begin or direction == BACKWARD and date > period_end:
+                break
+            if not period_begin <= date <= period_end:
+                continue
+            if self.__is_correct_by_navigation(-position, date, id_doc_position, date_doc_position):
+                yield position, index_range, date
+
+    @staticmethod
+    def __iter_desc(dates_by_range, border_date, include_border):
+        """
+        Обходит документы по убыванию даты, начиная с border_date
+        :param dates_by_range: даты документов по объединенным диапазонам (по возрастанию)
+        :param border_date: граничная дата
+        :param include_border: включать документы граничной даты
+        """
+        bisect_border = bisect.bisect_right if include_border else bisect.bisect_left
+        heap = []
+        position = 1
+        for index_range, dates in enumerate(dates_by_range):
+            index = bisect_border(dates, border_date)
+            position += len(dates) - index
+            if index:
+                heap.append((-dates[index - 1].toordinal(), index_range, index - 1))
+        heapq.heapify(heap)
+
+        while heap:
+            _, index_range, index = heapq.heappop(heap)
+            dates = dates_by_range[index_range]
+            yield position, index_range, dates[index]
+            position += 1
+            if index:
+                heapq.heappush(heap, (-dates[index - 1].toordinal(), index_range, index - 1))
+
+    @staticmethod
+    def __iter_asc(dates_by_range, border_date, include_border):
+        """
+        Обходит документы по возрастанию даты, начиная с border_date
+        :param dates_by_range: даты документов по объединенным диапазонам (по возрастанию)
+        :param border_date: граничная дата
+        :param include_border: включать документы граничной даты
+        """
+        bisect_border = bisect.bisect_left if include_border else bisect.bisect_right
+        heap = []
+        position = 0
+        for index_range, dates in enumerate(dates_by_range):
+            index = bisect_border(dates, border_date)
+            position += len(dates) - index
+            if index < len(dates):
+                heap.append((dates[index].toordinal(), -index_range, index))
+        heapq.heapify(heap)
+
+        while heap:
+            _, index_range, index = heapq.heappop(heap)
+            index_range = -index_range
+            dates = dates_by_range[index_range]
+            yield position, index_range, dates[index]
+            position -= 1
+            if index + 1 < len(dates):
+                heapq.heappush(heap, (dates[index + 1].toordinal(), -index_range, index + 1))
+
+    def __calc_id_doc(self, positions):
+        """
+        Рассчитывает идентификаторы записей
+        :param positions: порядковые номера записей в полном списке плановых документов
+        """
+        for position, rec in zip(positions, self.result):
+            id_row = sbis.ObjectId('ПроцентыКНачислению', -position)
+            rec['@Документ'].From(id_row)
+
+    def __is_correct_by_navigation(self, id_doc, date, id_doc_position, date_doc_position):
         """
         Проверяет корректность документа по дате согласно навигации
         :param id_doc: идентификатор планового документа
         :param date: дата документа
+        :param id_doc_position: идентификатор документа курсора
+        :param date_doc_position: дата документа курсора
         """
         is_correct = False
         direction = self.navigation.Direction()
-        id_doc_position, date_doc_position = self.__get_data_cursor()
         if all((id_doc_position is not None, date_doc_position)):
             if self.is_first_page:
                 if direction == FORWARD:
@@ -180,85 +411,189 @@ class PlanPercentsList:
                 is_correct = date > self.today
         return is_correct
 
-    def __get_data_cursor(self):
-        """Возвращает данные курсора"""
-        position = self.navigation.Position()
-        if position:
-            id_doc = position.Get('id_plan_doc')
-            if id_doc is not None:
-                id_doc = int(id_doc)
-            date_doc = position.Get('date_plan_doc')
-            if date_doc is not None:
-                date_doc = datetime.datetime.strptime(date_doc, '%Y-%m-%d').date()
-        else:
-            id_doc = None
-            date_doc = None
-
-        return id_doc, date_doc
-
-    def __filter_by_period(self):
-        """Фильтрует результат согласно заданному периоду"""
-        date_begin = self._filter.Get('ФильтрДатаС') or datetime.date.min
-        date_end = self._filter.Get('ФильтрДатаП') or datetime.date.max
-        for i in reversed(range(self.result.Size())):
-            if not (date_begin <= self.result.Get(i, 'Дата') <= date_end):
-                self.result.DelRow(i)
-
-    def __calc_navigation(self):
-        """Рассчитывает навигацию"""
-        more_exist = self.result.Size() > self.navigation.Limit()
-        self.result.nav_result = sbis.NavigationResult(more_exist)
-        if more_exist:
-            cut_by_navigation(self.result, self.navigation)
-
     def __get_name_contractors(self, merged_range, date):
-        """Возвращает список названий контрагентов"""
+        """
+        Возвращает список названий контрагентов
+        Примечание: набор контрагентов диапазона обычно одинаков для многих дат, поэтому строка названий формируется один
+        раз на набор. Ключ - упорядоченный кортеж названий с повторами (одноименные контрагенты разных договоров
+        выводятся каждый)
+        """
         contractors_by_date = merged_range.get('Лицо1.СписокНазваний')
         contractors = contractors_by_date.get(date)
         if contractors:
-            contractors = '; '.join(sorted(contractors))
+            key = tuple(sorted(contractors))
+            names = self.__names_by_contractors.get(key)
+            if names is None:
+                names = self.__names_by_contractors[key] = '; '.join(key)
+            contractors = names
         return contractors
 
-    def __sort_result(self):
-        """Сортировка результата"""
-        self.result.sort(key=lambda rec: (
-            -1 * int(rec.Get('Дата').strftime("%Y%m%d")),
-            rec.Get('ДокументНашаОрганизация.Название')
-        ))
+    def __build_docs_list_by_months_table(self):
+        """
+        Формирует список документов к начислению по таблице плановых месяцев (см. plan_months.py)
+        Примечание: страница выбирается одним запросом по индексу (keyset по дате и порядковому номеру организации).
+        Идентификатор записи кодирует дату и порядковый номер организации (см. get_position_plan_doc), поэтому курсор
+        однозначно определяет позицию в списке.
+        """
+        direction = self.navigation.Direction()
+        id_doc_position, date_doc_position = self.cursor.id_plan_doc, self.cursor.date_plan_doc
+        has_cursor = all((id_doc_position is not None, date_doc_position))
+        border_date = date_doc_position if has_cursor else self.today
+        date_begin = self.date_begin or datetime.date.min
+        date_end = min(self.date_end, self._filter.Get('ФильтрДатаП') or datetime.date.max)
+
+        sql_maker = PercentsToAccruedSqlMaker(self._orgs_checker)
+        sql = sql_maker.create_months_table_sql(direction, has_cursor=has_cursor, is_first_page=self.is_first_page)
+        params = [
+            self.id_type_doc_loan,
+            date_begin,
+            date_end,
+            border_date,
+            self.navigation.Limit() + 1,
+        ]
+        if has_cursor and not self.is_first_page:
+            params.append(parse_id_plan_doc(id_doc_position)[1])
+        params.extend(sql_maker.get_org_params())
+        docs = sbis.SqlQuery(sql, *params)
+
+        more_exist = docs.Size() > self.navigation.Limit()
+        docs = list(docs)[:self.navigation.Limit()]
+        if direction == BACKWARD:
+            docs.reverse()
+
+        for doc in docs:
+            date = doc.Get('Дата')
+            id_org = doc.Get('ДокументНашаОрганизация')
+            percent = sbis.Record({
+                '@Документ': None,
+                'Дата': date,
+                'ТипДокумента': self._lcdb.percents_id(),
+                'ДокументНашаОрганизация': id_org,
+                'ДокументНашаОрганизация.Контрагент.Название': doc.Get('Название'),
+                'РП.Лицо1.СписокНазваний': doc.Get('СписокНазваний'),
+                'ТипЗаписи': LIST_PERCENT_PLAN,
+            })
+            self.result.AddRow(percent)
+        self.__calc_id_doc([get_position_plan_doc(doc.Get('Дата'), doc.Get('org_order')) for doc in docs])
+        self.result.nav_result = sbis.NavigationResult(more_exist)
+
+    def get_plan_months(self):
+        """
+        Возвращает все плановые месяцы начисления процентов без учета навигации
+        :return: {(организация, дата): список названий контрагентов}
+        Примечание: используется для сверки построения по кешу с построением живым запросом
+        """
+        plan_months = {}
+        if not self._orgs_checker.is_target_org_blocked():
+            for merged_range, dates in self.__build_ranges():
+                for date in dates:
+                    key = (merged_range.get('@Лицо'), date)
+                    plan_months[key] = self.__get_name_contractors(merged_range, date)
+        return plan_months
 
     def get_documents(self, only_contractors=False):
         """Возвращает список документов"""
         self.result = sbis.CreateRecordSet(self._format)
         if not self._orgs_checker.is_target_org_blocked():
-            loans = self.__build_loans_list_by_orgs()
+            if PLAN_DOCS_BY_MONTHS_TABLE and not only_contractors:
+                self.__build_docs_list_by_months_table()
+                return self.result
             if only_contractors:
-                return loans
-            self.__build_docs_list(loans)
-            self.__sort_result()
+                return self.__build_loans_list_by_orgs()
+            self.__build_docs_list()
         return self.result
 
 
+def get_position_plan_doc(date, org_order):
+    """
+    Возвращает порядковый номер плановой записи, построенной по таблице плановых месяцев
+    :param date: дата записи
+    :param org_order: порядковый номер организации (см. plan_months.REFRESH_PLAN_MONTHS_ORGS)
+    Примечание: в пределах даты номер растет вместе с порядковым номером организации (по названию), поэтому
+    идентификатор записи (-номер) убывает по порядку реестра (дата desc, название организации asc), как и при
+    построении по диапазонам
+    """
+    return date.toordinal() * ORG_POSITION_FACTOR + org_order
+
+
+def parse_id_plan_doc(id_doc):
+    """
+    Разбирает идентификатор плановой записи, построенной по таблице плановых месяцев
+    :param id_doc: идентификатор записи (см. get_position_plan_doc)
+    :return: (дата, порядковый номер организации)
+    """
+    ordinal, org_order = divmod(-int(id_doc), ORG_POSITION_FACTOR)
+    return datetime.date.fromordinal(ordinal), org_order
+
+
 class PercentsToAccruedSqlMaker:
     """Класс отвечает за построение SQL запроса"""
-    def __init__(self, orgs_checker, is_script_init_cache=False):
+    def __init__(self, orgs_checker, is_script_init_cache=False, id_loans=None, id_orgs=None):
         self._orgs_checker = orgs_checker
         self.is_script_init_cache = is_script_init_cache
+        self.id_loans = id_loans
+        self.id_orgs = id_orgs
+        # параметры фильтра по организациям: (разрешенные организации, запрещенные организации)
+        self.org_params = self.__get_org_params()
 
-    def __get_filter_by_orgs(self, cte_prefix=None, org_field='НашаОрганизация'):
-        """Возвращает фильтр по организациям"""
-        _filter = ''
+    def __get_org_params(self):
+        """
+        Возвращает параметры фильтра по организациям: (разрешенные организации, запрещенные организации)
+        Незаданный фильтр - None.
+        Примечание: организации передаются параметрами запроса, а не подставляются в текст, поэтому текст запроса не
+        зависит от набора организаций и план подготовленного запроса переиспользуется. Условие добавляется в текст
+        только для заданного фильтра (с условием вида "$N IS NULL OR ..." общий план не использует индекс), т.е. текст
+        зависит только от того, какие фильтры заданы. Организации части списка (id_orgs) уже отобраны с учетом прав
+        (см. PlanPercentsList.__get_orgs).
+        """
+        if self.id_orgs is not None:
+            return list(self.id_orgs), None
         allowed_orgs = self._orgs_checker.get_allowed_orgs()
-        blocked_orgs = self._orgs_checker.get_blocked_orgs()
+        blocked_orgs = None
+        if allowed_orgs is None:
+            blocked_orgs = self._orgs_checker.get_blocked_orgs() or None
+        return allowed_orgs, blocked_orgs
+
+    def get_org_params(self):
+        """Возвращает заданные параметры фильтра по организациям (см. org_params, __get_filter_by_orgs)"""
+        return [param for param in self.org_params if param is not None]
+
+    def get_params(self):
+        """
+        Возвращает заданные параметры фильтров по организациям и договорам, которые передаются после основных
+        параметров запроса (см. create_sql, create_cache_sql)
+        """
+        return [*self.get_org_params(), *([list(self.id_loans)] if self.id_loans else [])]
 
+    def __get_filter_by_orgs(self, num_param, cte_prefix=None, org_field='НашаОрганизация'):
+        """
+        Возвращает фильтр по организациям (только по заданным параметрам, см. get_org_params)
+        :param num_param: номер первого параметра фильтра
+        :param cte_prefix: префикс таблицы
+        :param org_field: поле организации
+        """
         org_field = '"{}"'.format(org_field)
         if cte_prefix:
             org_field = '{}.{}'.format(cte_prefix, org_field)
 
+        allowed_orgs, blocked_orgs = self.org_params
+        filter_by_org = ''
         if allowed_orgs is not None:
-            _filter = '''AND {} = any(array{}::integer[])'''.format(org_field, allowed_orgs)
-        elif blocked_orgs:
-            _filter = '''AND {} != all(array{}::integer[])'''.format(org_field, blocked_orgs)
-        return _filter
+            filter_by_org += f'AND {org_field} = ANY(${num_param}::integer[])\n'
+            num_param += 1
+        if blocked_orgs is not None:
+            filter_by_org += f'AND {org_field} != ALL(${num_param}::integer[])\n'
+        return filter_by_org
+
+    def __get_filter_by_loans(self, num_param, cte_prefix='doc'):
+        """
+        Возвращает фильтр по договорам (используется при обновлении кеша и таблицы плановых месяцев)
+        :param num_param: номер первого параметра фильтров (договоры передаются после организаций, см. get_params)
+        :param cte_prefix: префикс таблицы
+        """
+        if not self.id_loans:
+            return ''
+        return f'AND {cte_prefix}."@Документ" = ANY(${num_param + len(self.get_org_params())}::integer[])'
 
     def __get_addition_fields(self):
         """
@@ -272,6 +607,9 @@ class PercentsToAccruedSqlMaker:
         Быстро ошибку не нашел как починить, ибо логика LinkedRangesMerger().mergeAll не тривиальна.
         Примечание2: для работоспособности скрипта впринципе не надо чинить метод mergeAll, поскольку до объединения
         периодов дело не доходит.
+        Примечание3: причина дублей - сортировка результата по номерам колонок (ORDER BY 1, 3), которая с
+        дополнительными полями сортировала по договору, а не по организации. Сортировка теперь по именам колонок, а
+        перед объединением периодов дополнительные поля удаляются (см. PlanPercentsList.__merge_ranges).
         """
         if self.is_script_init_cache:
             addition_fields = '''
@@ -284,11 +622,15 @@ class PercentsToAccruedSqlMaker:
         return addition_fields
 
     def create_sql(self):
-        """Формирует запрос в базу данных"""
-        base_filter_by_org = self.__get_filter_by_orgs(cte_prefix='dc')
-        dc_filter_by_org = self.__get_filter_by_orgs(cte_prefix='dc')
-        filter_by_org = self.__get_filter_by_orgs(org_field='ДокументНашаОрганизация')
-        result_filter_by_org = self.__get_filter_by_orgs(cte_prefix='doc', org_field='ДокументНашаОрганизация')
+        """
+        Формирует запрос в базу данных
+        Примечание: с $10 - заданные параметры фильтров по организациям и договорам (см. get_params)
+        """
+        base_filter_by_org = self.__get_filter_by_orgs(10, cte_prefix='dc')
+        dc_filter_by_org = self.__get_filter_by_orgs(10, cte_prefix='dc')
+        filter_by_org = self.__get_filter_by_orgs(10, org_field='ДокументНашаОрганизация')
+        result_filter_by_org = self.__get_filter_by_orgs(10, cte_prefix='doc', org_field='ДокументНашаОрганизация')
+        filter_by_loans = self.__get_filter_by_loans(10)
 
         return f'''
             WITH raw_data AS (
@@ -318,6 +660,7 @@ class PercentsToAccruedSqlMaker:
                     doc."$Черновик" IS NULL AND
                     (diff_doc."Коэффициент" IS NOT NULL AND diff_doc."Коэффициент" IS DISTINCT FROM 0)
                     {base_filter_by_org}
+                    {filter_by_loans}
             )
             , percent_dates AS (
                 SELECT
@@ -472,59 +815,163 @@ class PercentsToAccruedSqlMaker:
             WHERE
                 plan_percents."ДатаВыдачи" IS NOT NULL
                 {result_filter_by_org}
+                {filter_by_loans}
+            ORDER BY
+                "@Лицо", "ДатаС" -- обязательно отсорт (по номерам колонок нельзя - см. __get_addition_fields)
+        '''
+
+    def create_orgs_sql(self):
+        """
+        Формирует запрос организаций, по договорам которых могут быть начислены проценты
+        Примечание: с $2 - заданные параметры фильтров по организациям и договорам (см. get_params)
+        """
+        filter_by_org = self.__get_filter_by_orgs(2, cte_prefix='doc', org_field='ДокументНашаОрганизация')
+        filter_by_loans = self.__get_filter_by_loans(2)
+
+        return f'''
+            SELECT DISTINCT
+                doc."ДокументНашаОрганизация" AS "@Лицо"
+            FROM
+                "Документ" doc
+            WHERE
+                doc."ТипДокумента" = $1::integer AND
+                doc."$Черновик" IS NULL AND
+                doc."ДокументНашаОрганизация" IS NOT NULL
+                {filter_by_org}
+                {filter_by_loans}
             ORDER BY
-                1, 3 -- обязательно отсорт
+                "@Лицо"
         '''
 
     def create_cache_sql(self):
-        """Формирует запрос в базу данных"""
-        filter_by_org = self.__get_filter_by_orgs(cte_prefix='doc', org_field='ДокументНашаОрганизация')
+        """
+        Формирует запрос списка договоров по кешу (см. converter.py)
+        Примечание: формат результата совпадает с create_sql в режиме заполнения кеша (с дополнительными полями),
+        записи упорядочены по организации и началу периода, как требует LinkedRangesMerger.mergeAll
+        с $3 - заданные параметры фильтров по организациям и договорам (см. get_params)
+        """
+        filter_by_org = self.__get_filter_by_orgs(3, cte_prefix='doc', org_field='ДокументНашаОрганизация')
+        filter_by_loans = self.__get_filter_by_loans(3)
 
         return f'''
-            WITH raw_data AS (
-                SELECT
-                    doc."@Документ" id_contract,
-                    doc."Лицо" face,
-                    doc."Лицо1" id_contractor,
-                    doc."ДокументНашаОрганизация" id_org,
-                    (string_to_array(doc_ext."Параметры"::hstore->'plan_docs', ';', ''))[1]::date "date_begin",
-                    (string_to_array(doc_ext."Параметры"::hstore->'plan_docs', ';', ''))[2]::date "date_last_payment",
-                    (string_to_array(doc_ext."Параметры"::hstore->'plan_docs', ';', ''))[3]::numeric debt
-                FROM
-                    "Документ" doc
-                LEFT JOIN
-                    "ДокументРасширение" doc_ext
-                ON doc."@Документ" = doc_ext."@Документ"
-                WHERE
-                    doc."ТипДокумента" = $1::int
-                    AND doc_ext."Параметры"::hstore->'plan_docs' IS NOT NULL
-                    {filter_by_org}
-            )
             SELECT
-                raw_data."id_contract",
-                raw_data."face",
-                raw_data."date_begin" "ДатаС",
+                cache."id_contract",
+                cache."debt",
+                cache."date_last_payment",
+                doc."ДокументНашаОрганизация" AS "@Лицо",
+                org."Название",
+                cache."date_begin" AS "ДатаС",
                 LEAST(
                     CASE
                         WHEN
-                            raw_data."date_last_payment" IS NOT NULL AND
-                            raw_data."debt" IS NOT NULL AND
-                            raw_data."debt" <= 0.0
+                            cache."date_last_payment" IS NOT NULL AND
+                            cache."debt" IS NOT NULL AND
+                            cache."debt" <= 0.0
                         THEN
-                            raw_data."date_last_payment"
+                            cache."date_last_payment"
                         ELSE
                             NULL::date
                     END,
                     $2::date
                 ) AS "ДатаПо",
-                org."Название",
                 contractor."Название" AS "Лицо1.Название"
             FROM
-                raw_data
+                "{PLAN_CONTRACTS_TABLE}" cache
+            JOIN
+                "Документ" doc
+                ON cache."id_contract" = doc."@Документ"
             LEFT JOIN
                 "Лицо" org
-            ON raw_data."id_org" = org."@Лицо"
+                ON doc."ДокументНашаОрганизация" = org."@Лицо"
             LEFT JOIN
                 "Лицо" contractor
-            ON raw_data."face" = contractor."@Лицо"
+                ON doc."Лицо1" = contractor."@Лицо"
+            WHERE
+                cache."id_type_doc" = $1::integer
+                {filter_by_org}
+                {filter_by_loans}
+            ORDER BY
+                "@Лицо", "ДатаС" -- обязательно отсорт
+        '''
+
+    def create_months_table_sql(self, direction, has_cursor, is_first_page):
+        """
+        Формирует запрос страницы плановых документов по таблице плановых месяцев (см. plan_months.py)
+        Параметры запроса: $1 - тип договора, $2, $3 - период, $4 - граничная дата, $5 - количество записей,
+        $6 - порядковый номер организации курсора (только для 2..N страницы), далее - заданные параметры фильтра по
+        организациям (см. get_org_params)
+        :param direction: направление навигации
+        :param has_cursor: признак наличия курсора
+        :param is_first_page: признак первой страницы
+        Примечание: условия на курсор повторяют PlanPercentsList.__is_correct_by_navigation, порядок записей -
+        (дата desc, порядковый номер организации asc), как при построении по диапазонам. Индекс таблицы выбирает строки
+        по дате, организации одной даты упорядочиваются по номеру из таблицы PLAN_MONTHS_TABLE_orgs
+        """
+        has_org_cursor = has_cursor and not is_first_page
+        filter_by_org = self.__get_filter_by_orgs(7 if has_org_cursor else 6, cte_prefix='months', org_field='id_org')
+        if has_cursor and is_first_page:
+            keyset_by_direction = {
+                FORWARD: 'months."date_month" < $4::date',
+                BACKWARD: 'months."date_month" >= $4::date',
+            }
+        elif has_cursor:
+            keyset_by_direction = {
+                FORWARD: '''(
+                    months."date_month" < $4::date OR
+                    (months."date_month" = $4::date AND orgs."org_order" > $6::integer)
+                )''',
+                BACKWARD: '''(
+                    months."date_month" > $4::date OR
+                    (months."date_month" = $4::date AND orgs."org_order" < $6::integer)
+                )''',
+            }
+        else:
+            keyset_by_direction = {
+                FORWARD: 'months."date_month" <= $4::date',
+                BACKWARD: 'months."date_month" > $4::date',
+            }
+        keyset = keyset_by_direction.get(direction, 'FALSE')
+        order = 'DESC' if direction == FORWARD else 'ASC'
+        order_org = 'ASC' if direction == FORWARD else 'DESC'
+
+        return f'''
+            WITH page AS (
+                SELECT
+                    months."date_month",
+                    months."id_org",
+                    orgs."org_order",
+                    string_agg(
+                        DISTINCT months."contractor" COLLATE "C", '; ' ORDER BY months."contractor" COLLATE "C"
+                    ) "СписокНазваний",
+                    array_agg(months."id_loan" ORDER BY months."id_loan") "id_loans"
+                FROM
+                    "{PLAN_MONTHS_TABLE}" months
+                JOIN
+                    "{PLAN_MONTHS_TABLE}_orgs" orgs
+                    ON orgs."id_org" = months."id_org"
+                WHERE
+                    months."id_type_doc" = $1::integer AND
+                    months."date_month" BETWEEN $2::date AND $3::date AND
+                    {keyset}
+                    {filter_by_org}
+                GROUP BY
+                    months."date_month", months."id_org", orgs."org_order"
+                ORDER BY
+                    months."date_month" {order}, orgs."org_order" {order_org}
+                LIMIT $5::integer
+            )
+            SELECT
+                page."date_month" "Дата",
+                page."id_org" "ДокументНашаОрганизация",
+                org."Название",
+                page."СписокНазваний",
+                page."id_loans",
+                page."org_order"
+            FROM
+                page
+            LEFT JOIN
+                "Лицо" org
+                ON page."id_org" = org."@Лицо"
+            ORDER BY
+                page."date_month" {order}, page."org_order" {order_org}
         '''
@@ -0,0 +1,217 @@
+"""
+Модуль отвечает за таблицу плановых месяцев начисления процентов.
+
+Ранее при каждом открытии планового реестра выполнялся тяжеловесный запрос PercentsToAccruedSqlMaker.create_sql (по
+таблицам ДебетКредит, Документ, СвязьДокументов) и объединение периодов LinkedRangesMerger.mergeAll. Теперь периоды
+начисления раскладываются по месяцам заранее и хранятся в таблице PLAN_MONTHS_TABLE:
+- id_type_doc - тип договора (выданные/полученные займы)
+- id_org - наша организация
+- date_month - дата планового начисления (последний день месяца или дата погашения)
+- id_loan - договор
+- contractor - название контрагента
+Запись реестра - группа строк таблицы по (date_month, id_org), страница выбирается одним запросом по индексу
+(см. PercentsToAccruedSqlMaker.create_months_table_sql), построение включается константой PLAN_DOCS_BY_MONTHS_TABLE.
+Записи одной даты упорядочены, как и при построении по диапазонам, по названию организации (затем по идентификатору):
+порядковые номера организаций хранятся в таблице PLAN_MONTHS_TABLE_orgs и пересчитываются при каждом обновлении.
+
+Обновление таблицы (refresh_plan_months, вызывается из converter.refresh_plan_percents_cache по договорам журнала
+изменений кеша):
+- refresh() - полный пересчет (первичное заполнение, смена месяца - сдвигается горизонт открытых договоров)
+- refresh(id_loans) - пересчет договоров, по которым изменились проводки или документы начисления процентов
+Месяцы хранятся на HORIZON_MONTHS месяцев вперед от текущей даты, горизонт последнего полного пересчета хранится в
+таблице PLAN_MONTHS_TABLE_state.
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import datetime
+import time
+
+import sbis
+from loans.loanConsts import LC
+from loans.loanDBConsts import LCDB
+from loans.percentsCommon import LoansDates
+from .const import PLAN_MONTHS_TABLE
+from .helpers import get_month_ends_by_ranges
+from .plan_docs import PlanPercentsList
+
+# На сколько месяцев вперед хранятся плановые месяцы открытых договоров
+HORIZON_MONTHS = 12
+
+CREATE_PLAN_MONTHS_TABLE = f'''
+    CREATE TABLE IF NOT EXISTS "{PLAN_MONTHS_TABLE}" (
+        "id_type_doc" integer NOT NULL,
+        "id_org" integer NOT NULL,
+        "date_month" date NOT NULL,
+        "id_loan" integer NOT NULL,
+        "contractor" text,
+        PRIMARY KEY ("id_loan", "date_month")
+    );
+    CREATE INDEX IF NOT EXISTS "{PLAN_MONTHS_TABLE}_keyset_idx"
+        ON "{PLAN_MONTHS_TABLE}" ("id_type_doc", "date_month", "id_org");
+    CREATE TABLE IF NOT EXISTS "{PLAN_MONTHS_TABLE}_orgs" (
+        "id_org" integer PRIMARY KEY,
+        "org_order" integer NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS "{PLAN_MONTHS_TABLE}_state" (
+        "id" integer PRIMARY KEY,
+        "horizon" date NOT NULL
+    );
+'''
+
+IS_PLAN_MONTHS_TABLE_EXISTS = f'''
+    SELECT to_regclass('"{PLAN_MONTHS_TABLE}_state"') IS NOT NULL
+'''
+
+GET_PLAN_MONTHS_HORIZON = f'''
+    SELECT "horizon" FROM "{PLAN_MONTHS_TABLE}_state" WHERE "id" = 1
+'''
+
+SET_PLAN_MONTHS_HORIZON = f'''
+    INSERT INTO "{PLAN_MONTHS_TABLE}_state"
+        ("id", "horizon")
+    VALUES
+        (1, $1::date)
+    ON CONFLICT ("id") DO UPDATE SET
+        "horizon" = EXCLUDED."horizon"
+'''
+
+# Порядковые номера организаций таблицы: по названию (побайтно, как строки Python при построении по диапазонам), затем
+# по идентификатору
+REFRESH_PLAN_MONTHS_ORGS = f'''
+    DELETE FROM "{PLAN_MONTHS_TABLE}_orgs";
+    INSERT INTO "{PLAN_MONTHS_TABLE}_orgs"
+        ("id_org", "org_order")
+    SELECT
+        orgs."id_org",
+        ROW_NUMBER() OVER (ORDER BY COALESCE(org."Название", '') COLLATE "C", orgs."id_org")
+    FROM
+        (SELECT DISTINCT "id_org" FROM "{PLAN_MONTHS_TABLE}") orgs
+    LEFT JOIN
+        "Лицо" org
+        ON org."@Лицо" = orgs."id_org"
+'''
+
+DELETE_PLAN_MONTHS = f'''
+    DELETE FROM
+        "{PLAN_MONTHS_TABLE}"
+    WHERE
+        "id_type_doc" = $1::integer AND
+        ($2::integer[] IS NULL OR "id_loan" = ANY($2::integer[]))
+'''
+
+INSERT_PLAN_MONTHS = f'''
+    INSERT INTO "{PLAN_MONTHS_TABLE}"
+        ("id_type_doc", "id_org", "date_month", "id_loan", "contractor")
+    SELECT
+        $1::integer, data."id_org", data."date_month", data."id_loan", data."contractor"
+    FROM
+        unnest($2::integer[], $3::date[], $4::integer[], $5::text[])
+        AS data("id_org", "date_month", "id_loan", "contractor")
+    ON CONFLICT DO NOTHING
+'''
+
+
+class PlanMonthsTable:
+    """Класс отвечает за заполнение таблицы плановых месяцев начисления процентов"""
+    def __init__(self):
+        self.lcdb = LCDB()
+        self.today = datetime.date.today()
+
+    @staticmethod
+    def create():
+        """
+        Создает таблицы и индекс, если их нет
+        :return: признак, что таблицы уже существовали
+        """
+        exists = sbis.SqlQueryScalar(IS_PLAN_MONTHS_TABLE_EXISTS)
+        sbis.SqlQuery(CREATE_PLAN_MONTHS_TABLE)
+        return exists
+
+    def get_horizon(self):
+        """Возвращает горизонт хранения месяцев: последний день месяца через HORIZON_MONTHS месяцев"""
+        return LoansDates.add_months(self.today, count_months=HORIZON_MONTHS, return_last_day_of_month=True)
+
+    def is_horizon_changed(self):
+        """Проверяет, сдвинулся ли горизонт с последнего полного пересчета (или пересчета еще не было)"""
+        return sbis.SqlQueryScalar(GET_PLAN_MONTHS_HORIZON) != self.get_horizon()
+
+    def refresh(self, id_loans=None):
+        """
+        Пересчитывает плановые месяцы
+        :param id_loans: список договоров, если не задан - пересчитываются все договоры
+        """
+        started = time.monotonic()
+        count_months = 0
+        for type_obj, id_type_doc in (
+                (LC.PERCENTS_ON_ISSUED_LOANS, self.lcdb.issued_id()),
+                (LC.PERCENTS_ON_RECEIVED_LOANS, self.lcdb.received_id()),
+        ):
+            contracts = self.__get_contracts(type_obj, id_loans)
+            rows = self.__get_rows(contracts)
+            with sbis.CreateTransaction(sbis.TransactionLevel.READ_COMMITTED, sbis.TransactionMode.WRITE):
+                sbis.SqlQuery(DELETE_PLAN_MONTHS, id_type_doc, list(id_loans) if id_loans is not None else None)
+                if rows:
+                    sbis.SqlQuery(INSERT_PLAN_MONTHS, id_type_doc, *(list(column) for column in zip(*rows)))
+            count_months += len(rows)
+        with sbis.CreateTransaction(sbis.TransactionLevel.READ_COMMITTED, sbis.TransactionMode.WRITE):
+            sbis.SqlQuery(REFRESH_PLAN_MONTHS_ORGS)
+            if id_loans is None:
+                sbis.SqlQuery(SET_PLAN_MONTHS_HORIZON, self.get_horizon())
+
+        sbis.LogMsg(
+            f'Refresh plan months for {len(id_loans) if id_loans is not None else "all"} loans: '
+            f'{count_months} months in {time.monotonic() - started:.1f}s'
+        )
+
+    def __get_contracts(self, type_obj, id_loans):
+        """
+        Возвращает периоды начисления процентов по договорам
+        :param type_obj: объект реестра (проценты по выданным/полученным займам)
+        :param id_loans: список договоров
+        """
+        _filter = sbis.Record({
+            'ФильтрДокументНашаОрганизация': -2,
+            'ФильтрДатаП': LoansDates.add_months(self.today, count_months=HORIZON_MONTHS),
+            'ScriptInitCache': True,
+        })
+        if id_loans is not None:
+            _filter.AddArrayInt32('ФильтрИдДоговоров', list(id_loans))
+        navigation = sbis.Navigation(999999, 0, True)
+
+        return PlanPercentsList(_filter, navigation, type_obj=type_obj).get_documents(only_contractors=True)
+
+    @staticmethod
+    def __get_rows(contracts):
+        """
+        Раскладывает периоды начисления договоров по месяцам
+        :param contracts: периоды начисления процентов по договорам, RecordSet
+        :return: строки таблицы [(id_org, date_month, id_loan, contractor), ...]
+        """
+        contracts = list(contracts)
+        dates_by_contract = get_month_ends_by_ranges(
+            [(contract.Get('ДатаС'), contract.Get('ДатаПо')) for contract in contracts]
+        )
+        rows = []
+        for contract, dates in zip(contracts, dates_by_contract):
+            rows.extend(
+                (contract.Get('@Лицо'), date, contract.Get('id_contract'), contract.Get('Лицо1.Название'))
+                for date in dates
+            )
+        return rows
+
+
+def refresh_plan_months(id_loans=None):
+    """
+    Обновляет таблицу плановых месяцев (см. converter.refresh_plan_percents_cache)
+    :param id_loans: список изменившихся договоров, если не задан - пересчитываются все договоры
+    Примечание: если таблицы еще нет или с последнего полного пересчета сдвинулся горизонт (сменился месяц),
+    выполняется полный пересчет
+    """
+    table = PlanMonthsTable()
+    if not table.create() or table.is_horizon_changed():
+        id_loans = None
+    if id_loans is not None and not id_loans:
+        return
+    table.refresh(id_loans)
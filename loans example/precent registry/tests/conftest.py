@@ -0,0 +1,63 @@
+"""
+Фикстуры тестов реестра процентов на локальной базе.
+
+Тесты используют замену платформы и генератор данных замера (каталог bench) и выполняются на базе из переменной
+окружения LOANS_REGISTRY_TEST_DSN (строка подключения psycopg2). Таблицы базы пересоздаются, поэтому база должна быть
+отдельной. Без переменной окружения тесты на базе пропускаются, тесты без базы (фикстура registry_modules)
+выполняются.
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import importlib
+import importlib.util
+import os
+import types
+
+import pytest
+
+BENCH_RUNNER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bench', 'runner.py')
+TEST_DSN_VARIABLE = 'LOANS_REGISTRY_TEST_DSN'
+
+
+@pytest.fixture(scope='session')
+def registry_modules():
+    """Модули реестра без подключения к базе"""
+    spec = importlib.util.spec_from_file_location('percent_registry_bench_runner', BENCH_RUNNER)
+    runner = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(runner)
+    sbis, fixtures, base = runner.load_registry()
+
+    from loans.loanConsts import LC
+    sbis.Session.object_name = LC.PERCENTS_ON_ISSUED_LOANS
+    return types.SimpleNamespace(
+        sbis=sbis,
+        fixtures=fixtures,
+        module=lambda name: importlib.import_module(f'{runner.REGISTRY_PACKAGE}.{name}'),
+    )
+
+
+@pytest.fixture(scope='session')
+def registry(registry_modules):
+    """Модули реестра, подключенные к тестовой базе"""
+    dsn = os.environ.get(TEST_DSN_VARIABLE)
+    if not dsn:
+        pytest.skip(f'Не задана тестовая база ({TEST_DSN_VARIABLE})')
+    pytest.importorskip('psycopg2')
+
+    connection = registry_modules.sbis.connect(dsn)
+    return types.SimpleNamespace(dsn=dsn, connection=connection, **vars(registry_modules))
+
+
+@pytest.fixture
+def filled(registry):
+    """Заполненная небольшим объемом данных база, таблицы кешей реестра удалены"""
+    fixtures = registry.fixtures
+    fixtures.RegistryFixtures(registry.connection, fixtures.FixtureScale(orgs=3, loans_by_org=6, months=24)).fill()
+    const = registry.module('const')
+    registry.sbis.SqlQuery(
+        f'DROP TABLE IF EXISTS "{const.PLAN_CONTRACTS_TABLE}", "{const.PLAN_CACHE_CHANGES_TABLE}", '
+        f'"{const.PLAN_MONTHS_TABLE}", "{const.PLAN_MONTHS_TABLE}_orgs", "{const.PLAN_MONTHS_TABLE}_state"'
+    )
+    return registry
@@ -0,0 +1,151 @@
+"""Тесты обновления кеша договоров плановых процентов (converter.CachePlanPercent.refresh_cache)"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import psycopg2
+import pytest
+
+GET_CACHE = '''
+    SELECT
+        "id_contract", "id_type_doc", "date_begin", "date_last_payment", "debt"
+    FROM
+        "{table}"
+    ORDER BY
+        "id_contract"
+'''
+
+# Проводка погашения долга договора с остатком долга (сумму можно уменьшить)
+GET_REPAY_POSTING = '''
+    SELECT
+        dc."@ДебетКредит", doc."@Документ"
+    FROM
+        "ДебетКредит" dc
+    JOIN
+        "Документ" doc
+        ON doc."@Документ" = dc."Документ"
+    JOIN
+        "ДебетКредит" issue
+        ON issue."Документ" = doc."@Документ" AND issue."Дата" = doc."Дата"
+    WHERE
+        dc."Дата" > doc."Дата" AND
+        dc."Лицо3" = $1::integer AND
+        dc."Сумма" > 1000
+    ORDER BY
+        dc."@ДебетКредит"
+    LIMIT 1
+'''
+
+# Непроведенное начисление процентов договора на дату (ставится после начала планового периода договора)
+ADD_PERCENT_DOC = '''
+    WITH percent_doc AS (
+        INSERT INTO "Документ"
+            ("@Документ", "ТипДокумента", "Дата", "ДокументНашаОрганизация")
+        SELECT
+            MAX("@Документ") + 1, $2::integer, $3::date,
+            (SELECT "ДокументНашаОрганизация" FROM "Документ" WHERE "@Документ" = $1::integer)
+        FROM
+            "Документ"
+        RETURNING
+            "@Документ", "Дата"
+    )
+    INSERT INTO "СвязьДокументов"
+        ("ДокументОснование", "ДокументСледствие", "ВидСвязи", "Дата")
+    SELECT
+        $1::integer, "@Документ", $4::integer, "Дата"
+    FROM
+        percent_doc
+    RETURNING
+        "ДокументСледствие"
+'''
+
+
+@pytest.fixture
+def cache(filled):
+    """Заполненный кеш договоров"""
+    converter = filled.module('converter')
+    cache_plan = converter.CachePlanPercent()
+    cache_plan.refresh_cache()
+    return cache_plan
+
+
+def get_cache(registry):
+    """Записи кеша по договорам"""
+    table = registry.module('const').PLAN_CONTRACTS_TABLE
+    return {
+        rec.Get('id_contract'): tuple(rec.Get(name) for name in rec.Names())
+        for rec in registry.sbis.SqlQuery(GET_CACHE.format(table=table))
+    }
+
+
+def assert_cache_recalculated(registry, cache_plan):
+    """Проверяет, что кеш совпадает с полным пересчетом и журнал изменений обработан"""
+    refreshed = get_cache(registry)
+    cache_plan.recalc_cache()
+    assert refreshed == get_cache(registry)
+    assert cache_plan.check_cache_equivalence() == {}
+    table = registry.module('const').PLAN_CACHE_CHANGES_TABLE
+    assert registry.sbis.SqlQueryScalar(f'SELECT count(*) FROM "{table}"') == 0
+
+
+def test_refresh_after_posting_update(filled, cache):
+    """Изменение суммы существующей проводки пересчитывает долг договора"""
+    sbis = filled.sbis
+    posting = sbis.SqlQueryRecord(GET_REPAY_POSTING, filled.fixtures.FixtureIds().debt_analytic)
+    before = get_cache(filled)
+    sbis.SqlQuery(
+        'UPDATE "ДебетКредит" SET "Сумма" = "Сумма" - 1000 WHERE "@ДебетКредит" = $1::integer',
+        posting.Get('@ДебетКредит'),
+    )
+
+    cache.refresh_cache()
+
+    after = get_cache(filled)
+    id_loan = posting.Get('@Документ')
+    assert after[id_loan] != before[id_loan]
+    assert {key: value for key, value in after.items() if key != id_loan} == \
+        {key: value for key, value in before.items() if key != id_loan}
+    assert_cache_recalculated(filled, cache)
+
+
+def test_refresh_after_percent_doc_deleted(filled, cache):
+    """Новое начисление процентов и его пометка удаления пересчитывают плановый период договора"""
+    sbis = filled.sbis
+    ids = filled.fixtures.FixtureIds()
+    before = get_cache(filled)
+    id_loan, record = next(iter(before.items()))
+    date_begin = record[2]
+    id_percent = sbis.SqlQueryScalar(ADD_PERCENT_DOC, id_loan, ids.percents_type, date_begin, ids.link_type)
+
+    cache.refresh_cache()
+
+    assert get_cache(filled)[id_loan][2] > date_begin
+    assert_cache_recalculated(filled, cache)
+
+    sbis.SqlQuery('UPDATE "Документ" SET "Удален" = TRUE WHERE "@Документ" = $1::integer', id_percent)
+
+    cache.refresh_cache()
+
+    assert get_cache(filled) == before
+    assert_cache_recalculated(filled, cache)
+
+
+def test_refresh_after_late_commit(filled, cache):
+    """Изменение транзакции, зафиксированной после начала обновления, обрабатывается следующим обновлением"""
+    sbis = filled.sbis
+    posting = sbis.SqlQueryRecord(GET_REPAY_POSTING, filled.fixtures.FixtureIds().debt_analytic)
+    before = get_cache(filled)
+    with psycopg2.connect(filled.dsn) as late_connection:
+        with late_connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE "ДебетКредит" SET "Сумма" = "Сумма" - 1000 WHERE "@ДебетКредит" = %s',
+                (posting.Get('@ДебетКредит'),),
+            )
+            cache.refresh_cache()
+            assert get_cache(filled) == before
+    late_connection.close()
+
+    cache.refresh_cache()
+
+    assert get_cache(filled)[posting.Get('@Документ')] != before[posting.Get('@Документ')]
+    assert_cache_recalculated(filled, cache)
@@ -0,0 +1,58 @@
+"""Тесты курсора навигации реестра процентов (cursor.py)"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import datetime
+
+import pytest
+
+D = datetime.date
+
+
+@pytest.fixture
+def cursor_module(registry_modules):
+    return registry_modules.module('cursor')
+
+
+@pytest.mark.parametrize('fields', [
+    {},
+    {'id_doc': 15, 'date_doc': D(2024, 2, 29)},
+    {'id_plan_doc': -3, 'date_plan_doc': D(2023, 12, 31), 'count_create_buttons': 0, 'need_today': False},
+    {'id_doc': 0, 'date_doc': D(2024, 1, 1), 'id_plan_doc': 7, 'date_plan_doc': D(2024, 1, 31),
+     'count_create_buttons': 1, 'need_today': True},
+])
+def test_round_trip(cursor_module, fields):
+    """Разбор закодированного курсора возвращает исходный курсор, в том числе через позицию навигации"""
+    registry_cursor = cursor_module.RegistryCursor(**fields)
+    values = registry_cursor.encode()
+    assert all(value is None or isinstance(value, str) for value in values)
+    assert cursor_module.RegistryCursor.decode(values) == registry_cursor
+    position = dict(zip(cursor_module.CURSOR_FIELDS, values))
+    assert cursor_module.RegistryCursor.from_position(position) == registry_cursor
+
+
+def test_decode_defaults(cursor_module, registry_modules):
+    """Пустые значения и отсутствующая позиция дают курсор по умолчанию, даты принимаются и объектами дат"""
+    RegistryCursor = cursor_module.RegistryCursor
+    assert RegistryCursor.from_position(None) == RegistryCursor()
+    assert RegistryCursor.decode(['', None, '', None, None, '']) == RegistryCursor()
+    assert RegistryCursor.from_position(registry_modules.sbis.Record({
+        'id_doc': '5', 'date_doc': datetime.datetime(2024, 3, 31, 12), 'need_today': 'FALSE',
+    })) == RegistryCursor(id_doc=5, date_doc=D(2024, 3, 31), need_today=False)
+
+
+@pytest.mark.parametrize('values', [
+    ['abc', None, None, None, None, None],
+    [None, None, '1.5', None, None, None],
+    [None, '2024-02-30', None, None, None, None],
+    [None, None, None, '31.01.2024', None, None],
+    [None, None, None, None, 'two', None],
+    [None, None, None, None, None, 'yes'],
+    [None, None, None, None, None],
+    ['1', '2024-01-31', None, None, '2', 'True', None],
+])
+def test_decode_malformed(cursor_module, registry_modules, values):
+    """Некорректный идентификатор, дата, признак или количество значений - ошибка метода"""
+    with pytest.raises(registry_modules.sbis.Error):
+        cursor_module.RegistryCursor.decode(values)
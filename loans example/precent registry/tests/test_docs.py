@@ -0,0 +1,38 @@
+"""Тесты полей списка фактических документов начисления процентов (docs.PercentsListNew)"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import datetime
+import types
+
+import pytest
+
+# Поля доклиста по одной записи "ДокументРасширение" с заданными параметрами
+GET_ADDITIONAL_FIELDS = '''
+    SELECT
+        {fields}
+    FROM
+        (
+            SELECT
+                '2024-03-15 10:20:00'::timestamp AS "ДатаВремяСоздания",
+                $1::text AS "Параметры"
+        ) "ДР"
+'''
+
+
+@pytest.mark.parametrize('params, expected', [
+    ('"date_update"=>"2024-05-06 07:08:09"', datetime.date(2024, 5, 6)),
+    ('"date_update"=>"2024-05-06"', datetime.date(2024, 5, 6)),
+    ('"date_update"=>"2024-13-45 00:00:00"', datetime.date(2024, 3, 15)),
+    ('"date_update"=>"2023-02-29"', datetime.date(2024, 3, 15)),
+    ('"date_update"=>"06.05.2024"', datetime.date(2024, 3, 15)),
+    ('"other"=>"1"', datetime.date(2024, 3, 15)),
+    (None, datetime.date(2024, 3, 15)),
+])
+def test_change_date(filled, params, expected):
+    """Некорректная дата изменения в параметрах документа заменяется датой создания, а не ломает список"""
+    doc_list = types.SimpleNamespace(additionalFields='')
+    filled.module('docs').PercentsListNew._prepare_sql(None, doc_list)
+    row = filled.sbis.SqlQueryRecord(GET_ADDITIONAL_FIELDS.format(fields=doc_list.additionalFields), params)
+    assert row.Get('ДатаИзменения') == expected
@@ -0,0 +1,100 @@
+"""Тесты вспомогательных функций реестра (helpers.py)"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import datetime
+
+import pytest
+
+D = datetime.date
+
+# Периоды на границах месяцев: окончание 1 числа, один день, февраль (високосный и нет), переход года
+EDGE_PERIODS = [
+    (D(2023, 1, 31), D(2023, 2, 1)),
+    (D(2023, 3, 1), D(2023, 3, 1)),
+    (D(2023, 3, 31), D(2023, 3, 31)),
+    (D(2023, 2, 1), D(2023, 2, 28)),
+    (D(2024, 2, 1), D(2024, 2, 29)),
+    (D(2024, 1, 15), D(2024, 3, 1)),
+    (D(2023, 12, 31), D(2024, 1, 1)),
+    (D(2022, 11, 30), D(2024, 2, 29)),
+    (D(2023, 5, 10), D(2023, 5, 9)),
+]
+DATES_MAX = [None, D(2023, 2, 28), D(2024, 2, 28), D(2024, 2, 29), D(2023, 1, 30)]
+
+
+def get_expected(registry_modules, date_begin, date_end, date_max):
+    """Даты планового начисления периода по LoansDates.getMonthEndsForPeriod"""
+    from loans.percentsCommon import LoansDates
+    dates = LoansDates.getMonthEndsForPeriod(date_begin, date_end)
+    return [date for date in dates if date_max is None or date <= date_max]
+
+
+@pytest.mark.parametrize('date_max', DATES_MAX)
+def test_month_ends_by_ranges(registry_modules, date_max):
+    """Даты всех периодов совпадают с LoansDates.getMonthEndsForPeriod по каждому периоду"""
+    helpers = registry_modules.module('helpers')
+    assert helpers.get_month_ends_by_ranges(EDGE_PERIODS, date_max) == [
+        get_expected(registry_modules, date_begin, date_end, date_max) for date_begin, date_end in EDGE_PERIODS
+    ]
+    assert helpers.get_month_ends_by_ranges([], date_max) == []
+
+
+@pytest.mark.parametrize('date_max', DATES_MAX)
+@pytest.mark.parametrize('date_begin, date_end', EDGE_PERIODS)
+def test_month_ends(registry_modules, date_begin, date_end, date_max):
+    """Последовательность MonthEnds совпадает с LoansDates.getMonthEndsForPeriod, включая обращение по индексу"""
+    month_ends = registry_modules.module('helpers').MonthEnds(date_begin, date_end, date_max)
+    expected = get_expected(registry_modules, date_begin, date_end, date_max)
+    assert list(month_ends) == expected
+    assert len(month_ends) == len(expected)
+    assert [month_ends[index] for index in range(-len(expected), 0)] == expected
+    with pytest.raises(IndexError):
+        month_ends[len(expected)]
+
+
+def test_name_contractors(registry_modules):
+    """Названия одноименных контрагентов выводятся каждое, строка названий запоминается по набору с повторами"""
+    plan_docs = registry_modules.module('plan_docs')
+    plan_list = plan_docs.PlanPercentsList.__new__(plan_docs.PlanPercentsList)
+    plan_list._PlanPercentsList__names_by_contractors = {}
+    get_name_contractors = plan_list._PlanPercentsList__get_name_contractors
+    date = D(2024, 1, 31)
+
+    assert get_name_contractors({'Лицо1.СписокНазваний': {date: ['Б', 'А', 'Б']}}, date) == 'А; Б; Б'
+    assert get_name_contractors({'Лицо1.СписокНазваний': {date: ['Б', 'А']}}, date) == 'А; Б'
+    assert get_name_contractors({'Лицо1.СписокНазваний': {}}, date) is None
+
+
+def get_navigation(registry_modules, direction, limit=3):
+    """Навигация по курсору"""
+    sbis = registry_modules.sbis
+    return sbis.Navigation(sbis.NavigationPositionTag(), None, limit, direction, True)
+
+
+@pytest.mark.parametrize('direction, expected', [
+    ('ndFORWARD', [1, 2, 3]),
+    ('ndBOTHWAYS', [1, 2, 3]),
+    ('ndBACKWARD', [3, 4, 5]),
+])
+def test_cut_by_navigation(registry_modules, direction, expected):
+    """FORWARD и BOTHWAYS оставляют первые limit записей, BACKWARD - последние"""
+    helpers = registry_modules.module('helpers')
+    navigation = get_navigation(registry_modules, getattr(registry_modules.sbis.NavigationDirection, direction))
+    assert helpers.cut_by_navigation(iter([1, 2, 3, 4, 5]), navigation) == expected
+    assert helpers.cut_by_navigation([1, 2, 3], navigation) == [1, 2, 3]
+    assert helpers.cut_by_navigation([], navigation) == []
+    assert helpers.cut_by_navigation([1, 2, 3, 4, 5], navigation, limit=0) == []
+
+
+@pytest.mark.parametrize('direction, expected', [
+    ('ndFORWARD', ['год', 1, 'линия', 2, 'год']),
+    ('ndBACKWARD', ['год', 'линия', 3, 'год', 4]),
+])
+def test_cut_by_navigation_counted(registry_modules, direction, expected):
+    """Неучитываемые в лимите записи (служебные строки) не удаляются и не занимают место в лимите"""
+    helpers = registry_modules.module('helpers')
+    navigation = get_navigation(registry_modules, getattr(registry_modules.sbis.NavigationDirection, direction))
+    rows = ['год', 1, 'линия', 2, 3, 'год', 4]
+    assert helpers.cut_by_navigation(rows, navigation, limit=2, is_counted=lambda row: isinstance(row, int)) == expected
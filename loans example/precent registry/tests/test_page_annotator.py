@@ -0,0 +1,66 @@
+"""Тесты разметки страницы реестра процентов (page_annotator.py)"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import datetime
+
+D = datetime.date
+
+
+def get_rows(registry_modules, *rows):
+    """Документы страницы: [(идентификатор, дата, тип записи)]"""
+    return [
+        registry_modules.sbis.Record({'@Документ': id_doc, 'Дата': date, 'ТипЗаписи': type_row})
+        for id_doc, date, type_row in rows
+    ]
+
+
+def test_empty_page(registry_modules):
+    """Пустая страница: периода нет, граничные позиции пустые"""
+    annotator = registry_modules.module('page_annotator').PageAnnotator([])
+    assert annotator.get_period(D(2024, 1, 31), D(2024, 2, 15)) == (None, None)
+    assert annotator.years == set()
+    assert annotator.plan_rows == [] and annotator.id_fact_docs == []
+    empty = {'id_doc': None, 'date_doc': None}
+    assert annotator.get_boundary_rows() == ({0: empty, 1: empty}, {0: empty, 1: empty})
+
+
+def test_annotate(registry_modules):
+    """Период, годы, плановые записи, фактические документы и граничные записи по типам собираются за один проход"""
+    const = registry_modules.module('const')
+    fact, plan = const.LIST_PERCENT_FACT, const.LIST_PERCENT_PLAN
+    rows = get_rows(
+        registry_modules,
+        (-1, D(2024, 3, 31), plan),
+        (11, D(2024, 1, 31), fact),
+        (None, D(2024, 1, 15), 'Линия'),
+        (-2, D(2023, 12, 31), plan),
+        (-5, D(2023, 12, 20), fact),
+        (12, D(2023, 11, 30), fact),
+    )
+    annotator = registry_modules.module('page_annotator').PageAnnotator(rows)
+
+    assert annotator.get_period(None, D(2024, 2, 15)) == (D(2023, 11, 30), D(2024, 3, 31))
+    assert annotator.years == {2023, 2024}
+    assert annotator.plan_rows == [rows[0], rows[3]]
+    assert annotator.id_fact_docs == [11, 12]
+    first_rows, last_rows = annotator.get_boundary_rows()
+    assert first_rows == {
+        fact: {'id_doc': '11', 'date_doc': '2024-01-31'},
+        plan: {'id_doc': '-1', 'date_doc': '2024-03-31'},
+    }
+    assert last_rows == {
+        fact: {'id_doc': '12', 'date_doc': '2023-11-30'},
+        plan: {'id_doc': '-2', 'date_doc': '2023-12-31'},
+    }
+
+
+def test_period_by_one_date(registry_modules):
+    """Документы одной даты: начало периода - граничная дата курсора, без курсора - текущая дата"""
+    const = registry_modules.module('const')
+    rows = get_rows(registry_modules, (1, D(2024, 1, 31), const.LIST_PERCENT_FACT),
+                    (-1, D(2024, 1, 31), const.LIST_PERCENT_PLAN))
+    annotator = registry_modules.module('page_annotator').PageAnnotator(rows)
+    assert annotator.get_period(D(2023, 12, 31), D(2024, 2, 15)) == (D(2023, 12, 31), D(2024, 1, 31))
+    assert annotator.get_period(None, D(2024, 2, 15)) == (D(2024, 2, 15), D(2024, 1, 31))
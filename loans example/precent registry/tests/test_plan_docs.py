@@ -0,0 +1,78 @@
+"""Тесты построения плановых документов начисления процентов (plan_docs.PlanPercentsList)"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import logging
+import threading
+
+import pytest
+
+DOC_FIELDS = ('Дата', 'ДокументНашаОрганизация', 'РП.Лицо1.СписокНазваний')
+
+
+def get_plan_docs(registry, workers):
+    """Возвращает плановые документы первой страницы вниз от сегодняшней даты: [(дата, организация, контрагенты)]"""
+    sbis = registry.sbis
+    _filter = sbis.Record({'ФильтрДокументНашаОрганизация': -2, 'PlanDocsWorkers': workers})
+    navigation = sbis.Navigation(sbis.NavigationPositionTag(), None, 1000, sbis.NavigationDirection.ndFORWARD, True)
+    docs = registry.module('plan_docs').PlanPercentsList(_filter, navigation).get_documents()
+    return [tuple(doc.Get(field) for field in DOC_FIELDS) for doc in docs]
+
+
+def test_partitions_match_single_query(filled, monkeypatch, caplog):
+    """Построение частями в пуле потоков дает те же документы в том же порядке, запросы - только в вызывающем потоке"""
+    plan_docs = filled.module('plan_docs')
+    expected = get_plan_docs(filled, 1)
+    assert expected
+
+    sql_threads = set()
+    sql_query = filled.sbis.SqlQuery
+
+    def sql_query_by_thread(*args):
+        sql_threads.add(threading.current_thread())
+        return sql_query(*args)
+
+    monkeypatch.setattr(plan_docs, 'PLAN_DOCS_ORGS_BY_PARTITION', 1)
+    monkeypatch.setattr(filled.sbis, 'SqlQuery', sql_query_by_thread)
+    caplog.set_level(logging.INFO)
+    assert get_plan_docs(filled, 3) == expected
+    assert 'Plan percents built by 3 partitions' in caplog.text
+    assert sql_threads == {threading.current_thread()}
+
+
+def test_workers_limit(filled):
+    """Количество потоков из фильтра ограничивается PLAN_DOCS_MAX_WORKERS"""
+    sbis = filled.sbis
+    plan_docs = filled.module('plan_docs')
+    navigation = sbis.Navigation(sbis.NavigationPositionTag(), None, 10, sbis.NavigationDirection.ndFORWARD, True)
+    for workers, expected in ((1000, plan_docs.PLAN_DOCS_MAX_WORKERS), (0, plan_docs.PLAN_DOCS_WORKERS), (-5, 1)):
+        _filter = sbis.Record({'ФильтрДокументНашаОрганизация': -2, 'PlanDocsWorkers': workers})
+        assert plan_docs.PlanPercentsList(_filter, navigation).workers == expected
+
+
+@pytest.mark.parametrize('rights', ['allowed', 'blocked'])
+def test_orgs_filter(filled, monkeypatch, rights):
+    """Фильтр по правам на организации: в тексте запроса только заданный фильтр, организации - параметрами"""
+    expected = get_plan_docs(filled, 1)
+    orgs = sorted({id_org for _, id_org, _ in expected})
+    assert len(orgs) > 1
+    checker = filled.module('plan_docs').AllowedOrgsChecker
+    if rights == 'allowed':
+        monkeypatch.setattr(checker, 'get_allowed_orgs', lambda self: orgs[:1])
+        expected = [doc for doc in expected if doc[1] == orgs[0]]
+    else:
+        monkeypatch.setattr(checker, 'get_blocked_orgs', lambda self: orgs[:1])
+        expected = [doc for doc in expected if doc[1] != orgs[0]]
+
+    sql_texts = []
+    sql_query = filled.sbis.SqlQuery
+
+    def sql_query_by_text(sql, *params):
+        sql_texts.append(sql)
+        return sql_query(sql, *params)
+
+    monkeypatch.setattr(filled.sbis, 'SqlQuery', sql_query_by_text)
+    assert get_plan_docs(filled, 1) == expected
+    assert not any('IS NULL OR' in sql for sql in sql_texts)
+    assert not any(f'ARRAY[{orgs[0]}' in sql for sql in sql_texts)
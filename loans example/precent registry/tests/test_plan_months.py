@@ -0,0 +1,118 @@
+"""Тесты построения плановых документов по таблице плановых месяцев (plan_months.py)"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import pytest
+
+PLAN_FIELDS = ('Дата', 'ДокументНашаОрганизация', 'ДокументНашаОрганизация.Контрагент.Название',
+               'РП.Лицо1.СписокНазваний')
+
+GET_PLAN_MONTHS = '''
+    SELECT
+        "id_type_doc", "id_org", "date_month", "id_loan", "contractor"
+    FROM
+        "{table}"
+    ORDER BY
+        "id_loan", "date_month"
+'''
+
+# Названия наших организаций в обратном порядке идентификаторов
+RENAME_ORGS = '''
+    UPDATE
+        "Лицо"
+    SET
+        "Название" = 'Организация ' || (1000000 - "@Лицо")
+    WHERE
+        "@Лицо" IN (SELECT "ДокументНашаОрганизация" FROM "Документ")
+'''
+
+
+def scroll_plan_docs(registry, limit=7):
+    """
+    Пролистывает реестр от первой страницы вниз и вверх до конца
+    :return: плановые записи реестра по порядку: [(дата, организация, название организации, контрагенты)]
+    """
+    sbis = registry.sbis
+    base = registry.module('base')
+    cursor_fields = registry.module('cursor').CURSOR_FIELDS
+
+    def get_page(direction, position=None):
+        if position is not None:
+            position = sbis.Record(dict(zip(cursor_fields, position)))
+        navigation = sbis.Navigation(sbis.NavigationPositionTag(), position, limit, direction, True)
+        return base.PercentsListAggregator(sbis.Record({'ФильтрДокументНашаОрганизация': -2}), navigation).get_documents()
+
+    first = get_page(sbis.NavigationDirection.ndBOTHWAYS)
+    rows = list(first)
+    for direction, key in ((sbis.NavigationDirection.ndFORWARD, 'forward'),
+                           (sbis.NavigationDirection.ndBACKWARD, 'backward')):
+        position = first.Metadata().Get('nextPosition')[key]
+        page = first
+        while page.nav_result.GetIsNext():
+            page = get_page(direction, position)
+            rows = rows + list(page) if key == 'forward' else list(page) + rows
+            position = page.Metadata().Get('nextPosition')
+    return [
+        tuple(row.Get(field) for field in PLAN_FIELDS)
+        for row in rows if row.Get('ТипЗаписи') == registry.module('const').LIST_PERCENT_PLAN
+    ]
+
+
+def get_plan_months(registry):
+    """Строки таблицы плановых месяцев"""
+    table = registry.module('const').PLAN_MONTHS_TABLE
+    return [tuple(rec.Get(name) for name in rec.Names()) for rec in registry.sbis.SqlQuery(GET_PLAN_MONTHS.format(
+        table=table,
+    ))]
+
+
+@pytest.fixture
+def months_table(filled, monkeypatch):
+    """
+    Таблица плановых месяцев, заполненная через обновление кеша
+    Примечание: названия организаций переименовываются в обратном порядке идентификаторов, чтобы порядок записей
+    одной даты по названию отличался от порядка по идентификатору
+    """
+    filled.sbis.SqlQuery(RENAME_ORGS)
+    monkeypatch.setattr(filled.module('converter'), 'PLAN_DOCS_BY_MONTHS_TABLE', True)
+    filled.module('converter').refresh_plan_percents_cache()
+    return filled
+
+
+@pytest.mark.parametrize('is_blocked_org', [False, True])
+def test_pages_match_ranges(months_table, monkeypatch, is_blocked_org):
+    """
+    Реестр по таблице плановых месяцев совпадает с построением по диапазонам, включая порядок записей одной даты и
+    фильтр по правам на организации
+    """
+    blocked_orgs = [get_plan_months(months_table)[0][1]] if is_blocked_org else []
+    monkeypatch.setattr(
+        months_table.module('plan_docs').AllowedOrgsChecker, 'get_blocked_orgs', lambda self: blocked_orgs,
+    )
+    expected = scroll_plan_docs(months_table)
+    assert not {id_org for _, id_org, *_ in expected} & set(blocked_orgs)
+    assert len({(date, id_org) for date, id_org, *_ in expected}) == len(expected)
+    orgs_by_date = {}
+    for date, id_org, *_ in expected:
+        orgs_by_date.setdefault(date, []).append(id_org)
+    assert any(orgs != sorted(orgs) for orgs in orgs_by_date.values())
+
+    monkeypatch.setattr(months_table.module('plan_docs'), 'PLAN_DOCS_BY_MONTHS_TABLE', True)
+    assert scroll_plan_docs(months_table) == expected
+
+
+def test_refresh_by_changes(months_table):
+    """Обновление кеша пересчитывает таблицу плановых месяцев по договорам из журнала изменений"""
+    sbis = months_table.sbis
+    plan_months = months_table.module('plan_months')
+    months = get_plan_months(months_table)
+    id_loan = months[0][3]
+
+    sbis.SqlQuery('UPDATE "Документ" SET "$Черновик" = 1 WHERE "@Документ" = $1::integer', id_loan)
+    months_table.module('converter').refresh_plan_percents_cache()
+
+    refreshed = get_plan_months(months_table)
+    assert refreshed == [month for month in months if month[3] != id_loan]
+    plan_months.refresh_plan_months()
+    assert get_plan_months(months_table) == refreshed
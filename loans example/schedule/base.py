@@ -22,17 +22,26 @@ from loans.loanRemains import LoanRemains
 from loans.percentsCommon import LoanPercentsCalculator
 from loans.version_loans import get_date_build
 from .mixins import FieldNamesMixin, PaymentsStorageMixin
-from .helpers import swap_id_type_row
+from .helpers import get_sort_key_row
+from .trace import create_trace
 
 
 class BasePaymentsSchedule(FieldNamesMixin, PaymentsStorageMixin):
     """Базовый класс по построению графика платежей займа"""
-    def __init__(self, _filter, navigation):
+    def __init__(self, _filter, navigation, payments_columns=None):
+        """
+        :param _filter: фильтр графика платежей
+        :param navigation: навигация
+        :param payments_columns: загруженные платежи по портфелю договоров, PaymentsColumns (см. модуль
+        payments_columns). Если не передан, платежи запрашиваются по договору из базы.
+        """
         FieldNamesMixin.__init__(self)
         PaymentsStorageMixin.__init__(self)
 
         self._filter = _filter
         self.navigation = navigation
+        self.payments_columns = payments_columns
+        self.trace = create_trace(self._filter)
         self.lcdb = LCDB()
         self.today = self._filter.Get('DateBuild') or get_date_build() or datetime.date.today()
         self.doc_type = sbis.Session.ObjectName()
@@ -135,6 +144,8 @@ class BasePaymentsSchedule(FieldNamesMixin, PaymentsStorageMixin):
 
     def __get_payments(self):
         """Возвращает информацию по платежам"""
+        if self.payments_columns is not None:
+            return self.payments_columns.get_list(self._filter.Get('IdLoan'))
         return Payments(self._filter, self.lcdb).get_list()
 
     @lru_cache(maxsize=1)
@@ -196,26 +207,12 @@ class BasePaymentsSchedule(FieldNamesMixin, PaymentsStorageMixin):
         - переплата по процентам и недоплата по основному долгу
         Примечание2: учитываем что
         """
-        case1 = all((
-                self._get_balance('percent') > 0,
-                self._get_balance('body_debt') <= 0,
-            ))
-        case2 = all((
-                self._get_balance('percent') < 0,
-                self._get_balance('body_debt') >= 0,
-            ))
-
-        print(f'correction case1: {case1}, case2: {case2}')
-        return any((
-            all((
-                self._get_balance('percent') > 0,
-                self._get_balance('body_debt') <= 0,
-            )),
-            all((
-                self._get_balance('percent') < 0,
-                self._get_balance('body_debt') >= 0,
-            )),
-        ))
+        balance_percent = self._get_balance('percent')
+        balance_body_debt = self._get_balance('body_debt')
+        case1 = balance_percent > 0 and balance_body_debt <= 0
+        case2 = balance_percent < 0 and balance_body_debt >= 0
+        self._trace_stores('not_typical_case', case1=case1, case2=case2)
+        return case1 or case2
 
     def _check_need_prolongation(self):
         """
@@ -638,6 +635,8 @@ class BasePaymentsSchedule(FieldNamesMixin, PaymentsStorageMixin):
         outcome.AddString('order_by')
         outcome.AddMoney('monthly_payment')
         outcome.AddBool('payments_exist')
+        if self.trace.enabled:
+            outcome.AddString('trace')
         return outcome
 
     @staticmethod
@@ -715,7 +714,7 @@ class BasePaymentsSchedule(FieldNamesMixin, PaymentsStorageMixin):
             for i in reversed(range(schedule.Size())):
                 if schedule.Get(i, 'ТипЗаписи') == LC.SCHEDULE_PLAN and self.__plan_is_incorrect(i, schedule):
                     near_payment_removed = near_payment_removed or bool(schedule.Get(i, 'БлижайшийПлатеж'))
-                    print(f'REMOVE PLAN: {schedule[i]}')
+                    self._trace_stores('remove_plan', date=schedule.Get(i, 'Дата'))
                     # schedule.DelRow(i)
 
         if near_payment_removed:
@@ -795,24 +794,9 @@ class BasePaymentsSchedule(FieldNamesMixin, PaymentsStorageMixin):
         2. Строка данных (просрочка план или платеж), должен зависеть от клиентской сортировки (вторая часть сортировки
         по типу записи)
         """
-        swap_id_type_row(schedule, to_new_const=True)
-
         order_by = self._filter.Get('OrderBy')
         direction = -1 if order_by == 'DESC' else 1
-        is_reverse = order_by == 'DESC'
-        # определим новый идентификатор записи года, учитывая манипулиции swap_id_type_row
-        new_id_type_schedule_year = 0
-
-        schedule.sort(key=lambda rec: (
-            rec.Get('Дата') or rec.Get('ДатаНачалаПросрочки'),
-            # первая часть сотровки по типу записи
-            -1 * direction * int(rec.Get('ТипЗаписи') == new_id_type_schedule_year),
-            # вторая часть сортировки по типу записи
-            rec.Get('ТипЗаписи'),
-            direction * rec.Get('@Документ'),
-        ), reverse=is_reverse)
-
-        swap_id_type_row(schedule, to_new_const=False)
+        schedule.sort(key=lambda rec: get_sort_key_row(rec, direction), reverse=order_by == 'DESC')
 
     def _calc_outcome(self, schedule):
         """Добавляет строку итогов"""
@@ -831,3 +815,5 @@ class BasePaymentsSchedule(FieldNamesMixin, PaymentsStorageMixin):
         schedule.outcome['order_by'] = self._filter.Get('OrderBy')
         schedule.outcome['payments_exist'] = bool(self._is_valid_filter() and self.payments)
         schedule.outcome['show_total'] = schedule.Size() > 1
+        if self.trace.enabled:
+            schedule.outcome['trace'] = self.trace.dump()
@@ -0,0 +1,126 @@
+"""
+Модуль отвечает за проверку согласованности закэшированных графиков платежей (см. cache.py).
+
+Кэш графика пишется методом SchedulePaymentCache.save и ранее никак не проверялся. Проверка выполняется фоновой
+задачей: договоры обрабатываются пачками по ключу "@Документ", инварианты проверяются одним запросом на пачку
+(CACHED_SCHEDULE_VIOLATIONS), в Python попадают только признаки нарушений.
+
+Проверяемые инварианты:
+- body_debt_mismatch - сумма основного долга по платежам графика не равна разнице выданной суммы и остатка долга
+по проводкам
+- outcome_body_debt_mismatch - основной долг строки итогов не равен сумме основного долга по платежам графика
+- outcome_size_payment_mismatch - платеж строки итогов не равен сумме основного долга и процентов строки итогов
+- not_monotonic_dates - даты строк графика не упорядочены
+- negative_debt - отрицательный остаток долга в строке графика
+
+Результат - компактный отчет по договорам с нарушениями: {id_loan: [нарушение1, нарушение2, ...]}, который можно
+записать в файл в формате "id_loan;нарушение1,нарушение2".
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import time
+
+import sbis
+from loans.loanConsts import LC
+from loans.loanDBConsts import LCDB
+from .sql import CACHED_SCHEDULE_VIOLATIONS
+
+# Количество договоров, проверяемых одним запросом
+BATCH_SIZE = 1000
+# Допустимая погрешность сумм (копейка)
+ACCURACY = '0.01'
+
+VIOLATIONS = (
+    'body_debt_mismatch',
+    'outcome_body_debt_mismatch',
+    'outcome_size_payment_mismatch',
+    'not_monotonic_dates',
+    'negative_debt',
+)
+
+
+class ScheduleCacheChecker:
+    """Класс проверяет инварианты закэшированных графиков платежей"""
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.lcdb = LCDB()
+
+    def check(self, report_path=None):
+        """
+        Проверяет кэш графиков по всем договорам займа
+        :param report_path: путь к файлу отчета, если не задан - отчет не пишется
+        :return: отчет вида {id_loan: [violation, ...]}, dict
+        """
+        started = time.monotonic()
+        report = {}
+        count_loans = 0
+        for batch in self.iter_batches():
+            count_loans += batch.Size()
+            report.update(self.__get_violations(batch))
+
+        sbis.LogMsg(
+            f'Checked schedule cache for {count_loans} loans in {time.monotonic() - started:.1f}s, '
+            f'violations found for {len(report)} loans'
+        )
+        if report_path:
+            self.write_report(report, report_path)
+        return report
+
+    def iter_batches(self):
+        """
+        Возвращает пачки результатов проверки договоров
+        Примечание: пачки выбираются по ключу "@Документ" (keyset), поэтому стоимость запроса не зависит от номера пачки
+        """
+        last_id_loan = 0
+        while True:
+            batch = sbis.SqlQuery(
+                CACHED_SCHEDULE_VIOLATIONS,
+                last_id_loan,
+                [self.lcdb.issued_id(), self.lcdb.received_id()],
+                self.lcdb.issued_id(),
+                self.batch_size,
+                [LC.SCHEDULE_PAYMENT, LC.SCHEDULE_PAYMENTS],
+                self.lcdb.accounts_ids(),
+                self.lcdb.debt_analytic(),
+                ACCURACY,
+            )
+            if not batch.Size():
+                break
+            yield batch
+            if batch.Size() < self.batch_size:
+                break
+            last_id_loan = batch.Get(batch.Size() - 1, 'id_loan')
+
+    @staticmethod
+    def __get_violations(batch):
+        """
+        Возвращает нарушения по договорам пачки
+        :param batch: результат проверки пачки договоров, RecordSet
+        """
+        violations = {}
+        for rec in batch:
+            loan_violations = [violation for violation in VIOLATIONS if rec.Get(violation)]
+            if loan_violations:
+                violations[rec.Get('id_loan')] = loan_violations
+        return violations
+
+    @staticmethod
+    def write_report(report, report_path):
+        """
+        Записывает отчет в файл
+        :param report: отчет вида {id_loan: [violation, ...]}
+        :param report_path: путь к файлу отчета
+        """
+        with open(report_path, 'w', encoding='utf-8') as report_file:
+            for id_loan, violations in sorted(report.items()):
+                report_file.write(f'{id_loan};{",".join(violations)}\n')
+
+
+def check_schedule_cache(report_path=None):
+    """
+    Проверяет кэш графиков платежей по всем договорам (точка входа фоновой задачи)
+    :param report_path: путь к файлу отчета
+    """
+    return ScheduleCacheChecker().check(report_path)
@@ -13,8 +13,8 @@ from .ideal import IdealPaymentSchedule
 
 class CorrectionRow(IdealPaymentSchedule):
     """Класс хранящий обработчики по формированию строк платежей"""
-    def __init__(self, _filter, navigation):
-        super().__init__(_filter, navigation)
+    def __init__(self, _filter, navigation, payments_columns=None):
+        super().__init__(_filter, navigation, payments_columns)
 
     def _create_correction_row(self, date_payment):
         """
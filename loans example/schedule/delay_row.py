@@ -22,13 +22,22 @@ from collections import defaultdict
 import sbis
 from loans.loanConsts import LC
 from .ideal import IdealPaymentSchedule
+from .mixins import DETAIL_SUMS, RowDetail
+
+DELAY_DETAIL = 'Для расчета использовался случай "{case}"\n' + DETAIL_SUMS
+# детализация с составляющими формулы процентов Xф - Xнп - Xупл
+DELAY_PERCENT_DETAIL = 'Для расчета использовался случай "{case}"\n' \
+                       'Xф={percent_by_fact_debt}, Xнп={percent_by_plan_debt}, Xупл={paid_percents}\n' + DETAIL_SUMS
+EARLY_FIRST_PAYMENT_DETAIL = 'Для расчета процентов использовался случай "{case}"\n' + DETAIL_SUMS
+DEFAULT_DELAY_DETAIL = 'Для расчета процентов использовался случай "{case}" ' \
+                       'Xф={percent_by_fact_debt}, Xнп={percent_by_plan_debt}, Xупл={paid_percents}\n' + DETAIL_SUMS
 
 
 class DelayRow(IdealPaymentSchedule):
     """Класс хранящий обработчики по формированию просрочки"""
 
-    def __init__(self, _filter, navigation):
-        super().__init__(_filter, navigation)
+    def __init__(self, _filter, navigation, payments_columns=None):
+        super().__init__(_filter, navigation, payments_columns)
         # период действия просрочки
         self.delay_period = {
             'begin': None,
@@ -74,13 +83,17 @@ class DelayRow(IdealPaymentSchedule):
         percent_paid_off = self._get_balance('percent') <= 0
         if percent_paid_off:
             percent = self.__get_fine_delay(date_begin_delay, date_end_delay, debt)
-            detail_percent = ''
+            detail_percent = {}
         else:
             percent_by_fact_debt = self.__get_percent_by_fact_debt(date_end_delay)
             percent_by_plan_debt = self.__get_percent_by_plan_debt(date_end_delay)
             paid_percents = self.__get_paid_percents(date_end_delay)
             percent = percent_by_fact_debt - percent_by_plan_debt - paid_percents
-            detail_percent = f'Xф={percent_by_fact_debt}, Xнп={percent_by_plan_debt}, Xупл={paid_percents}\n'
+            detail_percent = {
+                'percent_by_fact_debt': percent_by_fact_debt,
+                'percent_by_plan_debt': percent_by_plan_debt,
+                'paid_percents': paid_percents,
+            }
 
         body_debt = debt
         size_payment = body_debt + percent
@@ -88,9 +101,10 @@ class DelayRow(IdealPaymentSchedule):
             'percent': percent,
             'size_payment': size_payment,
             'body_debt': body_debt,
-            'detail': f'Для расчета использовался случай "{LC.CASE_LAST_ROW_DELAY_NAME}"\n'
-                      f'{detail_percent}'
-                      f'Порядок расчета: Проценты: {percent}, Основной долг: {body_debt}, Платеж: {size_payment}',
+            'detail': RowDetail(
+                DELAY_PERCENT_DETAIL if detail_percent else DELAY_DETAIL, case=LC.CASE_LAST_ROW_DELAY_NAME,
+                percent=percent, body_debt=body_debt, size_payment=size_payment, **detail_percent,
+            ),
         }
 
     def _calc_over_body_debt_delay(self):
@@ -104,8 +118,10 @@ class DelayRow(IdealPaymentSchedule):
             'percent': percent,
             'size_payment': size_payment,
             'body_debt': body_debt,
-            'detail': f'Для расчета использовался случай "{LC.CASE_OVER_BODY_DEBT_DELAY_NAME}"\n'
-                      f'Порядок расчета: Проценты: {percent}, Основной долг: {body_debt}, Платеж: {size_payment}',
+            'detail': RowDetail(
+                DELAY_DETAIL, case=LC.CASE_OVER_BODY_DEBT_DELAY_NAME, percent=percent, body_debt=body_debt,
+                size_payment=size_payment,
+            ),
         }
 
     def _calc_early_first_payment_delay(self, date_begin_delay, date_end_delay, debt):
@@ -124,8 +140,10 @@ class DelayRow(IdealPaymentSchedule):
             'percent': percent,
             'size_payment': size_payment,
             'body_debt': body_debt,
-            'detail': f'Для расчета процентов использовался случай "{LC.CASE_EARLY_FIRST_PAYMENT_NAME}"\n'
-                      f'Порядок расчета: Проценты: {percent}, Основной долг: {body_debt}, Платеж: {size_payment}',
+            'detail': RowDetail(
+                EARLY_FIRST_PAYMENT_DETAIL, case=LC.CASE_EARLY_FIRST_PAYMENT_NAME, percent=percent,
+                body_debt=body_debt, size_payment=size_payment,
+            ),
         }
 
     def _calc_default_delay(self, date_end_delay, debt):
@@ -151,9 +169,11 @@ class DelayRow(IdealPaymentSchedule):
             'percent': percent,
             'size_payment': size_payment,
             'body_debt': body_debt,
-            'detail': f'Для расчета процентов использовался случай "{LC.CASE_DEFAULT_DELAY_NAME}" '
-                      f'Xф={percent_by_fact_debt}, Xнп={percent_by_plan_debt}, Xупл={paid_percents}\n'
-                      f'Порядок расчета: Проценты: {percent}, Основной долг: {body_debt}, Платеж: {size_payment}',
+            'detail': RowDetail(
+                DEFAULT_DELAY_DETAIL, case=LC.CASE_DEFAULT_DELAY_NAME, percent_by_fact_debt=percent_by_fact_debt,
+                percent_by_plan_debt=percent_by_plan_debt, paid_percents=paid_percents, percent=percent,
+                body_debt=body_debt, size_payment=size_payment,
+            ),
         }
 
     def __get_case_delay(self, is_last_row, date_begin_delay):
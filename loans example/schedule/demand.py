@@ -15,8 +15,8 @@ from .real import RealPaymentSchedule
 
 class ShowPaymentsForSchedule(RealPaymentSchedule):
     """Класс строит график платежей с погашением по требованию"""
-    def __init__(self, _filter, navigation):
-        super().__init__(_filter, navigation)
+    def __init__(self, _filter, navigation, payments_columns=None):
+        super().__init__(_filter, navigation, payments_columns)
 
     def build(self):
         """Построение графика платежей"""
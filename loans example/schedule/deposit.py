@@ -13,8 +13,8 @@ from .real import RealPaymentSchedule
 
 class DepositPaymentSchedule(RealPaymentSchedule):
     """Класс строит график платежей по депозитам"""
-    def __init__(self, _filter, navigation):
-        super().__init__(_filter, navigation)
+    def __init__(self, _filter, navigation, payments_columns=None):
+        super().__init__(_filter, navigation, payments_columns)
         # рассчитанные планы графика
         self.plans = {}
 
@@ -5,6 +5,7 @@
 1. Получение фильтра по идентификатору договора, необходимого для построения графика платежей, get_filter_schedule
 2. Получение списка платежей за один день, get_payments
 3. Получение названий регламетов, для списка платежей за один день, get_name_regls
+4. Получение ключа сортировки записи графика платежей, get_sort_key_row
 """
 
 
@@ -184,40 +185,42 @@ def get_name_regls(id_regls):
     return name_regls
 
 
-def swap_id_type_row(schedule, to_new_const):
+# Порядок записей графика платежей в рамках одной даты (ранг сортировки по типу записи).
+# Примечание: благодаря рангу мы можем менять сортировку графика на БЛ, не меняя API типов записей перед клиентом.
+# Например строка года платежа SCHEDULE_DATE (идентификатор 3, на который ориентируется клиент) должна подниматься
+# на первую позицию согласно сортировке, поэтому ее ранг 0. Ранее для этого идентификаторы типов записей подменялись
+# в графике до сортировки и восстанавливались после нее (swap_id_type_row).
+SORT_RANK_TYPE_ROWS = {
+    LC.SCHEDULE_DATE: 0,
+    LC.SCHEDULE_DELAY: 1,
+    LC.SCHEDULE_OPEN_DELAY: 2,
+    LC.SCHEDULE_PAYMENT: 3,
+    LC.SCHEDULE_PAYMENTS: 4,
+    LC.SCHEDULE_INITIAL_BALANCE: 5,
+    LC.SCHEDULE_PLAN: 6,
+    LC.SCHEDULE_OUTCOME: 7,
+    LC.SCHEDULE_CORRECTION: 8,
+}
+SORT_RANK_YEAR = SORT_RANK_TYPE_ROWS[LC.SCHEDULE_DATE]
+
+
+def get_sort_key_row(rec, direction):
     """
-    Меняет значения идентификаторов записей в графике платежей
-    :param schedule: график платежей, RecordSet
-    :param to_new_const: заменяет значения полей ТипЗаписи на новые или старые константы
-    True - заменяет старые идентификаторы на новые
-    False - заменяет новые идентификаторы на старые
-    Примечание: Благодаря данному методу мы можем менять сортировку графика на БЛ на лету,
-    не меняя API типов записей перед клиентом. Например нам надо поднять строку год платежа
-    SCHEDULE_DATE на первую позицию согласно сортировке. Старое значение идентификатора = 3
-    (на которое ориентируется клиент), а новое 0. После сортировки графика мы возвращаем
-    старые идентификаторы, необходимые для клиента. Данные подмены необходимы т.к. часто
-    меняются условия построения графика, добавляются новые типы (например открытая просрочка)
-    и меняются приорететы по сортировке. При закрытии проекта, данную функцию можно будет
-    убрать.
+    Возвращает ключ сортировки записи графика платежей (дата, ранг типа записи, первичный ключ)
+    :param rec: запись графика платежей, Record
+    :param direction: направление сортировки: 1 - ASC, -1 - DESC
+    :return: tuple
+    Примечание: строка года должна быть всегда сверху в рамках даты, вне зависимости от направления сортировки (первая
+    часть сортировки по типу записи), остальные строки зависят от клиентской сортировки (вторая часть сортировки по
+    типу записи)
     """
-    new_id_rows = {
-        LC.SCHEDULE_DATE: 0,
-        LC.SCHEDULE_DELAY: 1,
-        LC.SCHEDULE_OPEN_DELAY: 2,
-        LC.SCHEDULE_PAYMENT: 3,
-        LC.SCHEDULE_PAYMENTS: 4,
-        LC.SCHEDULE_INITIAL_BALANCE: 5,
-        LC.SCHEDULE_PLAN: 6,
-        LC.SCHEDULE_OUTCOME: 7,
-        LC.SCHEDULE_CORRECTION: 8,
-    }
-    old_id_rows = {value: key for key, value in new_id_rows.items()}
-    map_type_rows = new_id_rows if to_new_const else old_id_rows
-
-    for i in range(schedule.Size()):
-        old_value = schedule.Get(i, 'ТипЗаписи')
-        new_value = map_type_rows.get(old_value)
-        schedule.Set(i, 'ТипЗаписи', new_value)
+    rank = SORT_RANK_TYPE_ROWS.get(rec.Get('ТипЗаписи'))
+    return (
+        rec.Get('Дата') or rec.Get('ДатаНачалаПросрочки'),
+        -1 * direction * int(rank == SORT_RANK_YEAR),
+        rank,
+        direction * rec.Get('@Документ'),
+    )
 
 
 def get_x_point(abscissa1, ordinate1, abscissa2, ordinate2):
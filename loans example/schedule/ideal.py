@@ -21,8 +21,8 @@ from .helpers import get_x_point
 
 class IdealPaymentSchedule(BasePaymentsSchedule):
     """Класс для построения идеального графика платежей"""
-    def __init__(self, _filter, navigation):
-        super().__init__(_filter, navigation)
+    def __init__(self, _filter, navigation, payments_columns=None):
+        super().__init__(_filter, navigation, payments_columns)
         self.monthly_payment = self._filter.Get('MonthlyPayment') or self._calc_best_monthly_payment()
         # суммы по идеальному плану
         self.ideal_plans = self.get_sum_schedule()
@@ -12,6 +12,28 @@ from collections import defaultdict
 
 import sbis
 from loans.loanConsts import LC
+from .trace import NullScheduleTrace
+
+# суммы расчета записи графика в детализации (см. RowDetail)
+DETAIL_SUMS = 'Порядок расчета: Проценты: {percent}, Основной долг: {body_debt}, Платеж: {size_payment}'
+
+
+class RowDetail:
+    """
+    Детализация расчета записи графика платежей
+    Примечание: текст детализации формируется по шаблону только при создании записи графика (см.
+    PaymentsStorageMixin._get_detail), промежуточные расчеты плановых сумм строки не форматируют.
+    """
+    def __init__(self, template, **values):
+        """
+        :param template: шаблон детализации (str.format)
+        :param values: значения шаблона
+        """
+        self.template = template
+        self.values = values
+
+    def __str__(self):
+        return self.template.format(**self.values)
 
 
 class FieldNamesMixin:
@@ -61,6 +83,8 @@ class PaymentsStorageMixin:
         self.underpayment = defaultdict(sbis.Money)
         # переплата по плановому графику платежа
         self.overpayment = defaultdict(sbis.Money)
+        # трассировка построения графика (по умолчанию выключена, см. модуль trace)
+        self.trace = NullScheduleTrace()
 
     def _get_balance(self, field):
         """
@@ -134,28 +158,35 @@ class PaymentsStorageMixin:
         """
         Возвращает детальную информацию по созданию записи графика платежей
         :param row_detail: детальная информацию по созданию конкретной записи (плановая, платеж, просрочка,
-        корректирующая)
+        корректирующая), str или RowDetail
+        Примечание: содержимое хранилищ добавляется только при включенной трассировке
         """
+        row_detail = str(row_detail) if row_detail else None
+        if not self.trace.enabled:
+            return row_detail
         detail = self._get_detail_store()
         if row_detail:
             detail = f'{row_detail}\n{detail}'
         return detail
 
-    def _get_detail_store(self):
-        """Возвращает информацию по хранили"""
-        stores = (
+    def _get_stores(self):
+        """Возвращает хранилища с их названиями"""
+        return (
             ('Недоплата', self.underpayment),
             ('Переплата', self.overpayment),
             ('Предоплата', self.prepayment),
             ('Своевременная плата', self.timely_payment),
             ('Оплата просрочки', self.delay_payment),
         )
+
+    def _get_detail_store(self):
+        """Возвращает информацию по хранилищам"""
         detail = '\n'.join(
             f"{name}: "\
             f"[Платеж: {str(store.get('size_payment') or 0)}, "\
             f"Основной долг: {str(store.get('body_debt') or 0)}, "\
             f"Проценты: {str(store.get('percent') or 0)}]"
-            for name, store in stores if any(store.values())
+            for name, store in self._get_stores() if any(store.values())
         )
         if detail:
             detail = f'Содержимое хранилищ:\n{detail}\n{self._get_detail_balance()}'
@@ -167,3 +198,27 @@ class PaymentsStorageMixin:
                f"[Платеж: {str(self._get_balance('size_payment') or 0)}, "\
                f"Основной долг: {str(self._get_balance('body_debt') or 0)}, "\
                f"Проценты: {str(self._get_balance('percent') or 0)}]"
+
+    def _trace_stores(self, name, **fields):
+        """
+        Фиксирует в трассировке событие вместе с состоянием хранилищ и баланса
+        :param name: название события
+        :param fields: значения события
+        Примечание: при выключенной трассировке состояние хранилищ не копируется
+        """
+        if not self.trace.enabled:
+            return
+        stores = {
+            store_name: {field: store.get(field) for field in self.storage_fields}
+            for store_name, store in (
+                ('underpayment', self.underpayment),
+                ('overpayment', self.overpayment),
+                ('prepayment', self.prepayment),
+                ('timely_payment', self.timely_payment),
+                ('delay_payment', self.delay_payment),
+            )
+        }
+        balance = {field: self._get_balance(field) for field in self.storage_fields}
+        # словари (например, плановые суммы) копируем, т.к. они могут измениться после фиксации события
+        fields = {key: dict(value) if isinstance(value, dict) else value for key, value in fields.items()}
+        self.trace.event(name, stores=stores, balance=balance, **fields)
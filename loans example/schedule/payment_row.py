@@ -15,8 +15,8 @@ from .ideal import IdealPaymentSchedule
 
 class PaymentRow(IdealPaymentSchedule):
     """Класс хранящий обработчики по формированию строк платежей"""
-    def __init__(self, _filter, navigation):
-        super().__init__(_filter, navigation)
+    def __init__(self, _filter, navigation, payments_columns=None):
+        super().__init__(_filter, navigation, payments_columns)
 
     def _create_fact_row(self, date_begin, date_end, payment, is_delay_payment):
         """
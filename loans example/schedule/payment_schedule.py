@@ -16,9 +16,11 @@ class PaymentSchedule:
     """
     Расчет нового графика платежей по договору займа.
     """
-    def __init__(self, _filter, navigation):
+    def __init__(self, _filter, navigation, payments_columns=None):
         self._filter = _filter
         self.navigation = navigation
+        # платежи по портфелю договоров, PaymentsColumns (см. модуль payments_columns)
+        self.payments_columns = payments_columns
 
     def get_schedule(self):
         """
@@ -35,10 +37,10 @@ class PaymentSchedule:
         return method()
 
     def __get_demand_schedule(self):
-        return ShowPaymentsForSchedule(self._filter, self.navigation).build()
+        return ShowPaymentsForSchedule(self._filter, self.navigation, self.payments_columns).build()
 
     def __get_deposit_schedule(self):
-        return DepositPaymentSchedule(self._filter, self.navigation).build()
+        return DepositPaymentSchedule(self._filter, self.navigation, self.payments_columns).build()
 
     def __get_real_schedule(self):
-        return RealPaymentSchedule(self._filter, self.navigation).build()
+        return RealPaymentSchedule(self._filter, self.navigation, self.payments_columns).build()
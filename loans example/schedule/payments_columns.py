@@ -0,0 +1,239 @@
+"""
+Модуль отвечает за колоночное хранение платежей по портфелю договоров займа.
+
+Payments.get_list возвращает по одному договору словари записей (выдачи, начисления процентов, погашения). При
+распараллеливании пересчета графиков по процессам такие словари дорого сериализовать, поэтому платежи портфеля
+загружаются один раз и упаковываются в колонки NumPy (int64):
+- date - порядковый номер даты (date.toordinal)
+- type - тип записи: TYPE_DISBURSEMENT, TYPE_PERCENT, TYPE_PAYMENT
+- id_doc, is_group - данные для восстановления поля "@Документ"
+- docs_begin, docs_end - границы идентификаторов документов записи (поле "id_docs") в массиве doc_ids
+- type_doc - номер значения поля "ТипДокумента" в словаре type_docs (-1 для NULL)
+- суммы в копейках: ДебетДолг, КредитДолг, ДебетПроценты, КредитПроценты, Платеж, ОстатокДолга
+Строки договора лежат подряд, границы договоров задаются смещениями offsets
+(строки договора i: offsets[i]..offsets[i+1])
+
+Колонки можно разместить в multiprocessing.shared_memory (метод share) и подключить в процессах-обработчиках без
+копирования (метод attach). Построители графиков принимают контейнер через параметр payments_columns, например:
+    columns = PaymentsColumns.load(filters, lcdb)
+    descriptor = columns.share()
+    # в процессе-обработчике
+    columns = PaymentsColumns.attach(descriptor)
+    schedule = PaymentSchedule(_filter, navigation, payments_columns=columns).get_schedule()
+    columns.close()
+    # в родительском процессе, после завершения обработчиков
+    columns.unlink()
+Пересчет графиков портфеля по процессам с такой передачей платежей реализован в recalc.recalc_schedules
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import datetime
+import decimal
+from multiprocessing import shared_memory
+
+import numpy
+
+import sbis
+from .payments import Payments
+
+TYPE_DISBURSEMENT = 0
+TYPE_PERCENT = 1
+TYPE_PAYMENT = 2
+
+# колонки с суммами: (поле записи, колонка)
+MONEY_COLUMNS = (
+    ('ДебетДолг', 'debit_debt'),
+    ('КредитДолг', 'credit_debt'),
+    ('ДебетПроценты', 'debit_percent'),
+    ('КредитПроценты', 'credit_percent'),
+    ('Платеж', 'payment'),
+    ('ОстатокДолга', 'debt'),
+)
+COLUMNS = ('date', 'type', 'id_doc', 'is_group', 'docs_begin', 'docs_end', 'type_doc') + \
+    tuple(column for field, column in MONEY_COLUMNS)
+
+
+class PaymentsColumns:
+    """Колоночный контейнер платежей по портфелю договоров"""
+    def __init__(self, id_loans, offsets, data, doc_ids, type_docs, shm=None):
+        """
+        :param id_loans: идентификаторы договоров, numpy.ndarray
+        :param offsets: смещения строк договоров (длина len(id_loans) + 1), numpy.ndarray
+        :param data: значения колонок, numpy.ndarray формы (len(COLUMNS), количество строк)
+        :param doc_ids: идентификаторы документов записей подряд (см. колонки docs_begin, docs_end), numpy.ndarray
+        :param type_docs: словарь значений поля "ТипДокумента" (см. колонку type_doc), tuple
+        :param shm: блок разделяемой памяти, в котором лежат массивы (если контейнер размещен в ней)
+        """
+        self.shm = shm
+        self.type_docs = tuple(type_docs)
+        self.__set_arrays(id_loans, offsets, data, doc_ids)
+        self.index_by_loan = {int(id_loan): i for i, id_loan in enumerate(id_loans)}
+
+    def __set_arrays(self, id_loans, offsets, data, doc_ids):
+        """Устанавливает массивы контейнера"""
+        self.id_loans = id_loans
+        self.offsets = offsets
+        self.data = data
+        self.doc_ids = doc_ids
+        self.columns = {column: data[i] for i, column in enumerate(COLUMNS)}
+
+    @classmethod
+    def load(cls, filters, lcdb):
+        """
+        Загружает платежи по договорам
+        :param filters: фильтры графиков платежей в виде {id_loan: _filter} (см. helpers.get_filter_schedule)
+        :param lcdb: LCDB
+        :return: PaymentsColumns
+        """
+        id_loans = []
+        offsets = [0]
+        rows = []
+        doc_ids = []
+        type_docs = {}
+        for id_loan, _filter in filters.items():
+            disbursements, percents, payments = Payments(_filter, lcdb).get_list()
+            for type_row, docs in (
+                    (TYPE_DISBURSEMENT, disbursements),
+                    (TYPE_PERCENT, percents),
+                    (TYPE_PAYMENT, payments),
+            ):
+                rows.extend(cls.__pack_row(type_row, doc, doc_ids, type_docs) for doc in docs.values())
+            id_loans.append(id_loan)
+            offsets.append(len(rows))
+
+        data = numpy.array(rows, dtype=numpy.int64).reshape(len(rows), len(COLUMNS)).T.copy()
+        return cls(
+            numpy.array(id_loans, dtype=numpy.int64),
+            numpy.array(offsets, dtype=numpy.int64),
+            data,
+            numpy.array(doc_ids, dtype=numpy.int64),
+            type_docs,
+        )
+
+    @staticmethod
+    def __pack_row(type_row, doc, doc_ids, type_docs):
+        """
+        Упаковывает запись платежа в строку значений колонок
+        :param doc_ids: общий список идентификаторов документов, дополняется документами записи
+        :param type_docs: словарь значений поля "ТипДокумента" в виде {значение: номер}, дополняется при необходимости
+        """
+        id_doc, name_obj = doc.Get('@Документ').split(',')
+        type_doc = doc.Get('ТипДокумента')
+        docs_begin = len(doc_ids)
+        doc_ids.extend(doc.Get('id_docs') or [])
+        row = [
+            doc.Get('Дата').toordinal(),
+            type_row,
+            int(id_doc),
+            int(name_obj == 'Документы'),
+            docs_begin,
+            len(doc_ids),
+            -1 if type_doc is None else type_docs.setdefault(type_doc, len(type_docs)),
+        ]
+        for field, column in MONEY_COLUMNS:
+            row.append(int((decimal.Decimal(doc.Get(field) or 0) * 100).to_integral_value()))
+        return row
+
+    def share(self):
+        """
+        Размещает контейнер в разделяемой памяти
+        :return: описание размещения, которое передается в процессы-обработчики (см. attach), dict
+        """
+        n_loans, n_rows, n_doc_ids = len(self.id_loans), self.data.shape[1], len(self.doc_ids)
+        size = self.__get_size(n_loans, n_rows, n_doc_ids) * numpy.dtype(numpy.int64).itemsize
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        id_loans, offsets, data, doc_ids = self.__views(shm, n_loans, n_rows, n_doc_ids)
+        id_loans[:] = self.id_loans
+        offsets[:] = self.offsets
+        data[:] = self.data
+        doc_ids[:] = self.doc_ids
+        self.shm = shm
+        self.__set_arrays(id_loans, offsets, data, doc_ids)
+        return {
+            'name': shm.name,
+            'n_loans': n_loans,
+            'n_rows': n_rows,
+            'n_doc_ids': n_doc_ids,
+            # словарь типов документов небольшой, передается вместе с описанием
+            'type_docs': self.type_docs,
+        }
+
+    @classmethod
+    def attach(cls, descriptor):
+        """
+        Подключается к контейнеру в разделяемой памяти без копирования данных
+        :param descriptor: описание размещения, см. share
+        :return: PaymentsColumns
+        """
+        shm = shared_memory.SharedMemory(name=descriptor['name'])
+        id_loans, offsets, data, doc_ids = cls.__views(
+            shm, descriptor['n_loans'], descriptor['n_rows'], descriptor['n_doc_ids'],
+        )
+        return cls(id_loans, offsets, data, doc_ids, descriptor['type_docs'], shm)
+
+    @staticmethod
+    def __get_size(n_loans, n_rows, n_doc_ids):
+        """Количество значений int64 в разделяемой памяти"""
+        return 2 * n_loans + 1 + len(COLUMNS) * n_rows + n_doc_ids
+
+    @classmethod
+    def __views(cls, shm, n_loans, n_rows, n_doc_ids):
+        """Возвращает массивы поверх буфера разделяемой памяти"""
+        buffer = numpy.ndarray((cls.__get_size(n_loans, n_rows, n_doc_ids),), dtype=numpy.int64, buffer=shm.buf)
+        begin_data = 2 * n_loans + 1
+        begin_doc_ids = begin_data + len(COLUMNS) * n_rows
+        id_loans = buffer[:n_loans]
+        offsets = buffer[n_loans:begin_data]
+        data = buffer[begin_data:begin_doc_ids].reshape(len(COLUMNS), n_rows)
+        doc_ids = buffer[begin_doc_ids:]
+        return id_loans, offsets, data, doc_ids
+
+    def close(self):
+        """Отключается от разделяемой памяти"""
+        if self.shm is not None:
+            # массивы ссылаются на буфер разделяемой памяти, их нужно отпустить до закрытия
+            self.__set_arrays(None, None, numpy.empty((len(COLUMNS), 0), dtype=numpy.int64), None)
+            self.shm.close()
+
+    def unlink(self):
+        """Освобождает разделяемую память (вызывается процессом, создавшим контейнер)"""
+        if self.shm is not None:
+            self.shm.unlink()
+
+    def get_list(self, id_loan):
+        """
+        Возвращает платежи по договору в формате Payments.get_list
+        :param id_loan: идентификатор договора
+        :return: (disbursements, percents, payments), словари вида {date: Record}
+        """
+        disbursements = {}
+        percents = {}
+        payments = {}
+        docs_by_type = {
+            TYPE_DISBURSEMENT: disbursements,
+            TYPE_PERCENT: percents,
+            TYPE_PAYMENT: payments,
+        }
+        index = self.index_by_loan.get(id_loan)
+        if index is not None:
+            for i in range(self.offsets[index], self.offsets[index + 1]):
+                doc = self.__unpack_row(i)
+                docs_by_type[int(self.columns['type'][i])][doc.Get('Дата')] = doc
+        return disbursements, percents, payments
+
+    def __unpack_row(self, i):
+        """Восстанавливает запись платежа по строке колонок"""
+        columns = self.columns
+        name_obj = 'Документы' if columns['is_group'][i] else 'Документ'
+        type_doc = int(columns['type_doc'][i])
+        values = {
+            'Дата': datetime.date.fromordinal(int(columns['date'][i])),
+            '@Документ': '{},{}'.format(int(columns['id_doc'][i]), name_obj),
+            'id_docs': self.doc_ids[columns['docs_begin'][i]:columns['docs_end'][i]].tolist(),
+            'ТипДокумента': self.type_docs[type_doc] if type_doc >= 0 else None,
+        }
+        for field, column in MONEY_COLUMNS:
+            values[field] = sbis.Money(decimal.Decimal(int(columns[column][i])).scaleb(-2))
+        return sbis.Record(values)
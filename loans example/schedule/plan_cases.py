@@ -0,0 +1,50 @@
+"""
+Модуль содержит таблицу правил выбора кейса расчета плановой строки графика.
+
+Для каждого планового периода один раз рассчитывается вектор признаков (см. PlanRow._get_plan_features), после чего
+кейс определяется первым подходящим правилом таблицы. Правило - пара (кейс, условия), где условия - словарь
+{признак: ожидаемое значение}. Правило с пустыми условиями подходит всегда (кейс по умолчанию).
+
+Признаки вектора:
+is_last_sub_period - расчет последнего планового периода
+is_future - плановый период в будущем (позже текущего дня)
+balance_is_normalized - остаток долга сравнялся с идеальным графиком
+prepayment_exist - есть предоплата
+overpayment_percent - есть переплата по процентам (рассчитывается после формирования плана)
+overpayment_body_debt - есть переплата по основному долгу (рассчитывается после формирования плана)
+
+Функция classify_plan_case не зависит от состояния графика (см. PlanRow._calc_real_plan).
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+from loans.loanConsts import LC
+
+# Правила выбора кейса расчета плановой строки, порядок правил определяет приоритет
+PLAN_CASE_RULES = (
+    (LC.CASE_LAST_ROW_PLAN, {'is_last_sub_period': True}),
+    (LC.CASE_IDEAL, {'is_future': True, 'balance_is_normalized': True}),
+    (LC.CASE_PREPAYMENT, {'prepayment_exist': True}),
+    (LC.CASE_DEFAULT_PLAN, {}),
+)
+
+# Правила выбора кейса переплаты (3.1, 4.1). В приоритете переплата по процентам.
+OVERPAYMENT_CASE_RULES = (
+    (LC.CASE_OVER_PERCENT, {'overpayment_percent': True}),
+    (LC.CASE_OVER_BODY_DEBT, {'overpayment_body_debt': True}),
+)
+
+
+def classify_plan_case(features, rules=PLAN_CASE_RULES):
+    """
+    Возвращает кейс по первому подходящему правилу
+    :param features: вектор признаков планового периода, dict
+    :param rules: таблица правил
+    :return: кейс или None, если ни одно правило не подошло
+    """
+    for case, conditions in rules:
+        if all(features.get(feature) == value for feature, value in conditions.items()):
+            return case
+    return None
+
@@ -7,21 +7,27 @@
 __author__ = 'Glukhenko A.V.'
 
 
-from collections import defaultdict
+from collections import Counter, defaultdict
 
 import sbis
 from loans.loanConsts import LC
 from .ideal import IdealPaymentSchedule
+from .mixins import DETAIL_SUMS, RowDetail
+from .plan_cases import PLAN_CASE_RULES, OVERPAYMENT_CASE_RULES, classify_plan_case
+
+PLAN_DETAIL = 'Для расчета плановой строки использовался случай "{case}"\n' + DETAIL_SUMS
 
 
 class PlanRow(IdealPaymentSchedule):
     """Класс хранящий обработчики по формированию плановых строк графика"""
 
-    def __init__(self, _filter, navigation):
-        super().__init__(_filter, navigation)
+    def __init__(self, _filter, navigation, payments_columns=None):
+        super().__init__(_filter, navigation, payments_columns)
         self.field_monthly_payment = self.__get_field_monthly_payment()
         # сумма плановых начислений по предыдущему плановому периоду (см. метод _correct_underpayment_by_delay)
         self.prev_plan = defaultdict(sbis.Money)
+        # количество решений по кейсам расчета плановых строк (метрики, см. get_plan_case_counts)
+        self.plan_case_counts = Counter()
 
     def __get_field_monthly_payment(self):
         """
@@ -57,70 +63,65 @@ class PlanRow(IdealPaymentSchedule):
             LC.CASE_PREPAYMENT: self.__case_prepayment,
             LC.CASE_IDEAL: self.__case_ideal_plan,
         }
-        case = self.__get_case_plan(is_last_sub_period, date_end, debt)
+        features = self._get_plan_features(is_last_sub_period, date_end, debt)
+        case = classify_plan_case(features, PLAN_CASE_RULES)
+        self.plan_case_counts[case] += 1
+        self._trace_stores('plan_case', date_end=date_end, case=case, features=features)
         method = cases.get(case)
         if case == LC.CASE_IDEAL:
             plan = method(date_end)
         else:
             plan = method(date_begin, date_end, debt, limit_date_payment)
 
-        case_overpayment = self.__get_case_overpayment_plan()
+        case_overpayment = classify_plan_case(self._get_overpayment_features(), OVERPAYMENT_CASE_RULES)
         if case_overpayment:
-            print(f'case_overpayment: {case_overpayment}')
-            print('>' + '#' * 100)
-            print(f'Найден случай 3.1 4.1. \n plan: {plan} \n Сведем проценты в ноль balance\n{self._get_detail_store()}!!!')
+            self.plan_case_counts[case_overpayment] += 1
+            self._trace_stores('overpayment_before', case=case_overpayment, date_end=date_end, plan=plan)
             method = cases.get(case_overpayment)
             plan = method(date_begin, date_end, debt, limit_date_payment)
-            print(f'Свели проценты в ноль plan: {plan} balance\n{self._get_detail_store()}')
-            print('<' + '#' * 100)
+            self._trace_stores('overpayment_after', case=case_overpayment, date_end=date_end, plan=plan)
 
         plan['size_payment'] = plan.get('size_payment') or sbis.Money(0)
         plan['body_debt'] = plan.get('body_debt') or sbis.Money(0)
         plan['percent'] = plan.get('percent') or sbis.Money(0)
         return plan
 
-    def __get_case_plan(self, is_last_sub_period, date_end, debt):
+    def _get_plan_features(self, is_last_sub_period, date_end, debt):
         """
-        Возвращает кейс расчета сумм для плановой строки
+        Возвращает вектор признаков планового периода для выбора кейса расчета (см. модуль plan_cases)
         :param is_last_sub_period: признак построения последней строки графика
         :param date_end: окончание планового периода
         :param debt: остаток долга
+        Примечание: сверка с идеальным графиком нужна только для будущих периодов (кроме последнего), для остальных
+        периодов ее не выполняем.
         """
-        if is_last_sub_period:
-            case = LC.CASE_LAST_ROW_PLAN
-        else:
-            if date_end > self.today and self.__balance_is_normalized(date_end, debt):
-                case = LC.CASE_IDEAL
-            # elif self.overpayment.get('percent') > 0:
-
-            # TODO: на самом деле при классическом погашении, у нас будет возвращать этот кейс CASE_OVER_PERCENT, хотя
-            # переплаты по процентам как таковой нету еще. Важно: а как понять что у нас кейс переплаты процентов, пока
-            # мы не сформировали план??? Нооо, после формирования плановой записи, значит мы обработали все факты и план
-            # видимо можно навесить постобработку - корректирующий суммы плана, исходя из необходимости выровнять в ноль
-            # проценты.
-            # elif self._is_overpayment_exist('percent'):
-            #     case = LC.CASE_OVER_PERCENT
-            # # elif self.overpayment.get('body_debt') > 0:
-            # elif self._is_overpayment_exist('body_debt'):
-            #     case = LC.CASE_OVER_BODY_DEBT
-            elif any(self.prepayment.values()):
-                case = LC.CASE_PREPAYMENT
-            else:
-                case = LC.CASE_DEFAULT_PLAN
-        return case
-
-    def __get_case_overpayment_plan(self):
+        is_future = date_end > self.today
+        return {
+            'is_last_sub_period': bool(is_last_sub_period),
+            'is_future': is_future,
+            'balance_is_normalized': bool(
+                is_future and not is_last_sub_period and self.__balance_is_normalized(date_end, debt)
+            ),
+            'prepayment_exist': any(self.prepayment.values()),
+        }
+
+    def _get_overpayment_features(self):
         """
-        Возвращает кейс переплаты основного долга (3.1) или процентов (4.1), при наступлении такого случая.
-        Важно: в случае переплаты и по основному долгу и по процентам, в приоритете случай 4.1, т.е. переплата по
-        процентам
+        Возвращает вектор признаков переплаты основного долга (3.1) или процентов (4.1)
+        Примечание: переплату можно зафиксировать только после формирования плана, т.е. после обработки всех фактов
+        планового периода.
         """
-        case = None
-        if self._is_overpayment_exist('percent'):
-            case = LC.CASE_OVER_PERCENT
-        elif self._is_overpayment_exist('body_debt'):
-            case = LC.CASE_OVER_BODY_DEBT
-        return case
+        return {
+            'overpayment_percent': self._is_overpayment_exist('percent'),
+            'overpayment_body_debt': self._is_overpayment_exist('body_debt'),
+        }
+
+    def get_plan_case_counts(self):
+        """
+        Возвращает количество решений по каждому кейсу расчета плановых строк
+        :return: {case: count}, dict
+        """
+        return dict(self.plan_case_counts)
 
     def __calc_last_row_plan(self, date_begin, date_end, debt, limit_date_payment):
         """
@@ -148,8 +149,10 @@ class PlanRow(IdealPaymentSchedule):
             'percent': percent,
             'size_payment': size_payment,
             'body_debt': body_debt,
-            'detail': f'Для расчета плановой строки использовался случай "{LC.CASE_LAST_ROW_PLAN_NAME}"\n'
-                      f'Порядок расчета: Проценты: {percent}, Основной долг: {body_debt}, Платеж: {size_payment}',
+            'detail': RowDetail(
+                PLAN_DETAIL, case=LC.CASE_LAST_ROW_PLAN_NAME, percent=percent, body_debt=body_debt,
+                size_payment=size_payment,
+            ),
         }
         self._calc_balance(date_end, plan, {})
         return plan
@@ -184,23 +187,20 @@ class PlanRow(IdealPaymentSchedule):
             'percent': percent,
             'size_payment': size_payment,
             'body_debt': body_debt,
-            'detail': f'Для расчета плановой строкСведем проценты в ноль!!!и использовался случай "{LC.CASE_OVER_PERCENT_NAME}"\n'
-                      f'Порядок расчета: Проценты: {percent}, Основной долг: {body_debt}, Платеж: {size_payment}',
+            'detail': RowDetail(
+                PLAN_DETAIL, case=LC.CASE_OVER_PERCENT_NAME, percent=percent, body_debt=body_debt,
+                size_payment=size_payment,
+            ),
         }
 
-        print('>>>>')
         self._calc_balance(date_end, plan, {})
-
-        print(f'[{date_begin}, {date_end}] plan_before percent: {percent} body_debt: {body_debt}, size_payment: {size_payment} \nbalance\n{self._get_detail_store()} ')
+        self._trace_stores('plan_before_rebalance', date_begin=date_begin, date_end=date_end, plan=plan)
 
         self._rebalance_by_overpayment()
-
-        print(f'[{date_begin}, {date_end}] plan_after percent: {percent} body_debt: {body_debt}, size_payment: {size_payment} \nbalance\n{self._get_detail_store()} ')
-
+        self._trace_stores('plan_after_rebalance', date_begin=date_begin, date_end=date_end, plan=plan)
 
         # if date_end > self.today and self._is_overpayment_exist('percent'):
         if self._is_overpayment_exist('percent'):
-            print('REBALANCING')
             percent = self._get_balance('percent')
             self.overpayment['percent'] = sbis.Money(0)
             self.prepayment['percent'] = sbis.Money(0)
@@ -209,18 +209,17 @@ class PlanRow(IdealPaymentSchedule):
 
             size_payment = self.monthly_payment
             body_debt = size_payment + abs(percent)
-
-        print(
-            f'[{date_begin}, {date_end}] plan_after2 percent: {percent} body_debt: {body_debt}, size_payment: {size_payment} \nbalance\n{self._get_detail_store()} ')
-
-        print('<<<<')
+            self._trace_stores('plan_rebalanced', date_begin=date_begin, date_end=date_end, percent=percent,
+                               body_debt=body_debt, size_payment=size_payment)
 
         plan = {
             'percent': percent,
             'size_payment': size_payment,
             'body_debt': body_debt,
-            'detail': f'Для расчета плановой строки использовался случай "{LC.CASE_OVER_PERCENT_NAME}"\n'
-                      f'Порядок расчета: Проценты: {percent}, Основной долг: {body_debt}, Платеж: {size_payment}',
+            'detail': RowDetail(
+                PLAN_DETAIL, case=LC.CASE_OVER_PERCENT_NAME, percent=percent, body_debt=body_debt,
+                size_payment=size_payment,
+            ),
         }
 
         return plan
@@ -264,9 +263,10 @@ class PlanRow(IdealPaymentSchedule):
             'percent': percent,
             'size_payment': size_payment,
             'body_debt': body_debt,
-            'detail': f'Для расчета плановой строки использовался случай "{LC.CASE_PREPAYMENT_NAME}"\n'
-                      f'Порядок расчета: Проценты: {percent}, Основной долг: {body_debt}, Платеж: {size_payment}\n'
-                      f'{self._get_detail_store()}',
+            'detail': RowDetail(
+                PLAN_DETAIL, case=LC.CASE_PREPAYMENT_NAME, percent=percent, body_debt=body_debt,
+                size_payment=size_payment,
+            ),
         }
         self._calc_balance(date_end, plan, {})
         return plan
@@ -286,8 +286,10 @@ class PlanRow(IdealPaymentSchedule):
             'percent': percent,
             'size_payment': size_payment,
             'body_debt': body_debt,
-            'detail': f'Для расчета плановой строки использовался случай "{LC.CASE_IDEAL_NAME}"\n'
-                      f'Порядок расчета: Проценты: {percent}, Основной долг: {body_debt}, Платеж: {size_payment}',
+            'detail': RowDetail(
+                PLAN_DETAIL, case=LC.CASE_IDEAL_NAME, percent=percent, body_debt=body_debt,
+                size_payment=size_payment,
+            ),
         }
         self._calc_balance(date_end, plan, {})
         return plan
@@ -336,8 +338,10 @@ class PlanRow(IdealPaymentSchedule):
             'percent': percent,
             'size_payment': size_payment,
             'body_debt': body_debt,
-            'detail': f'Для расчета плановой строки использовался случай "{LC.CASE_DEFAULT_PLAN_NAME}"\n'
-                      f'Порядок расчета: Проценты: {percent}, Основной долг: {body_debt}, Платеж: {size_payment}',
+            'detail': RowDetail(
+                PLAN_DETAIL, case=LC.CASE_DEFAULT_PLAN_NAME, percent=percent, body_debt=body_debt,
+                size_payment=size_payment,
+            ),
         }
         self._calc_balance(date_end, plan, {})
         return plan
@@ -23,8 +23,8 @@ from .correction_row import CorrectionRow
 
 class RealPaymentSchedule(PlanRow, PaymentRow, DelayRow, CorrectionRow):
     """Класс для построения реального графика платежей"""
-    def __init__(self, _filter, navigation):
-        super().__init__(_filter, navigation)
+    def __init__(self, _filter, navigation, payments_columns=None):
+        super().__init__(_filter, navigation, payments_columns)
 
     def build(self):
         """Построение графика платежей"""
@@ -40,6 +40,8 @@ class RealPaymentSchedule(PlanRow, PaymentRow, DelayRow, CorrectionRow):
     def build_schedule(self):
         """Строит график по займу"""
         self._build_schedule()
+        if self.trace.enabled:
+            self.trace.event('plan_case_counts', counts=self.get_plan_case_counts())
         self._post_processing(self.result)
         return self.result
 
@@ -80,6 +82,7 @@ class RealPaymentSchedule(PlanRow, PaymentRow, DelayRow, CorrectionRow):
             row_debt = self.__get_row_debt(period_rows)
             if row_debt:
                 debt = row_debt.Get('ОстатокДолга')
+            self._trace_stores('period', date_begin=date_begin, date_end=date_end, debt=debt)
 
             if self.__is_need_interrupt_build(period_rows, debt, date_end):
                 break
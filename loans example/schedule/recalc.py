@@ -0,0 +1,72 @@
+"""
+Модуль отвечает за пересчет кэша графиков платежей по портфелю договоров в нескольких процессах.
+
+Платежи портфеля загружаются родительским процессом один раз и размещаются в разделяемой памяти (см.
+payments_columns). Процессы-обработчики подключаются к ним при старте, получают пачки идентификаторов договоров,
+строят графики и сохраняют их в кэш (SchedulePaymentCache). Между процессами передаются только идентификаторы
+договоров и количество пересчитанных графиков.
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+from concurrent.futures import ProcessPoolExecutor
+
+import sbis
+from loans.loanDBConsts import LCDB
+from .cache import SchedulePaymentCache
+from .helpers import get_filter_schedule
+from .payment_schedule import PaymentSchedule
+from .payments_columns import PaymentsColumns
+
+# Количество процессов-обработчиков
+RECALC_WORKERS = 4
+# Количество договоров в пачке процесса-обработчика
+RECALC_CHUNK_SIZE = 500
+
+# платежи портфеля, подключенные в процессе-обработчике
+_payments_columns = None
+
+
+def recalc_schedules(id_loans, workers=RECALC_WORKERS, chunk_size=RECALC_CHUNK_SIZE):
+    """
+    Пересчитывает и сохраняет в кэш графики платежей по договорам
+    :param id_loans: идентификаторы договоров, list
+    :param workers: количество процессов-обработчиков
+    :param chunk_size: количество договоров в пачке
+    :return: количество пересчитанных графиков, int
+    """
+    filters = get_filter_schedule(id_loans)
+    columns = PaymentsColumns.load(filters, LCDB())
+    descriptor = columns.share()
+    try:
+        id_loans = list(filters)
+        chunks = [id_loans[i:i + chunk_size] for i in range(0, len(id_loans), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(descriptor,)) as executor:
+            count = sum(executor.map(_recalc_chunk, chunks))
+    finally:
+        columns.close()
+        columns.unlink()
+    sbis.LogMsg('[RECALC SCHEDULES] loans: {}, workers: {}'.format(count, workers))
+    return count
+
+
+def _attach(descriptor):
+    """Подключает платежи портфеля при старте процесса-обработчика"""
+    global _payments_columns
+    _payments_columns = PaymentsColumns.attach(descriptor)
+
+
+def _recalc_chunk(id_loans):
+    """
+    Пересчитывает графики пачки договоров в процессе-обработчике
+    :param id_loans: идентификаторы договоров пачки, list
+    :return: количество пересчитанных графиков, int
+    """
+    cache = SchedulePaymentCache()
+    data = {
+        id_loan: cache.encode(PaymentSchedule(_filter, None, payments_columns=_payments_columns).get_schedule())
+        for id_loan, _filter in get_filter_schedule(id_loans).items()
+    }
+    cache.mass_update_schedule_params(data)
+    return len(data)
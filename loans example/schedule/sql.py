@@ -152,3 +152,160 @@ FILTER_FOR_SCHEDULE = '''
         {filter_by_type_schedules}
         {filter_without_rate}
 '''
+
+# Проверка инвариантов закэшированных графиков платежей (см. cache_checker.py).
+# Договоры обрабатываются пачками по ключу "@Документ" (keyset), для каждого договора пачки возвращаются признаки
+# нарушений. Позиции значений строки кэша соответствуют формату SchedulePaymentCache: [2] Дата, [3] ТипЗаписи,
+# [4] ОсновнойДолг, [6] НачисленныеПроценты, [8] РазмерПлатежа, [10] ОстатокДолга
+CACHED_SCHEDULE_VIOLATIONS = '''
+    WITH loans AS (
+        SELECT
+            doc."@Документ" "id_loan",
+            doc."Лицо" "face",
+            doc."ДокументНашаОрганизация" "id_org",
+            doc."ТипДокумента" = $3::integer "is_issued",
+            doc_ext."params"
+        FROM
+            "Документ" doc
+        -- расширение читается по ключу для каждого договора: селективность "?" оценивается неверно, и при обычном
+        -- JOIN на каждую пачку сканируется вся таблица ДокументРасширение
+        JOIN LATERAL (
+            SELECT
+                "Параметры"::hstore "params"
+            FROM
+                "ДокументРасширение"
+            WHERE
+                "@Документ" = doc."@Документ"
+            OFFSET 0
+        ) doc_ext
+            ON doc_ext."params" ? 'outcome_schedule'
+        WHERE
+            doc."ТипДокумента" = ANY($2::integer[]) AND
+            doc."@Документ" > $1::integer
+        ORDER BY
+            doc."@Документ"
+        LIMIT $4::integer
+    )
+    , cache_rows AS (
+        SELECT
+            loans."id_loan",
+            split_part(cache."key", '_', 1) "row_key",
+            cache."value"::text[] "value"
+        FROM
+            loans,
+            EACH(loans."params") cache
+        WHERE
+            cache."key" LIKE '%_schedule'
+    )
+    , schedule AS (
+        SELECT
+            "id_loan",
+            "row_key"::integer "idx",
+            "value"[2]::date "Дата",
+            "value"[3]::integer "ТипЗаписи",
+            "value"[4]::numeric "ОсновнойДолг",
+            "value"[10]::numeric "ОстатокДолга"
+        FROM
+            cache_rows
+        WHERE
+            "row_key" <> 'outcome'
+    )
+    , outcome AS (
+        SELECT
+            "id_loan",
+            "value"[4]::numeric "ОсновнойДолг",
+            "value"[6]::numeric "НачисленныеПроценты",
+            "value"[8]::numeric "РазмерПлатежа"
+        FROM
+            cache_rows
+        WHERE
+            "row_key" = 'outcome'
+    )
+    , schedule_total AS (
+        SELECT
+            "id_loan",
+            COUNT(*) FILTER (WHERE "ТипЗаписи" = ANY($5::integer[])) "count_payments",
+            COALESCE(SUM("ОсновнойДолг") FILTER (WHERE "ТипЗаписи" = ANY($5::integer[])), 0) "body_debt",
+            BOOL_OR("ОстатокДолга" < 0) "negative_debt"
+        FROM
+            schedule
+        GROUP BY
+            "id_loan"
+    )
+    , schedule_dates AS (
+        SELECT
+            "id_loan",
+            -- график может быть отсортирован как по возрастанию, так и по убыванию дат
+            BOOL_OR("Дата" > "ПредыдущаяДата") AND BOOL_OR("Дата" < "ПредыдущаяДата") "not_monotonic_dates"
+        FROM (
+            SELECT
+                "id_loan",
+                "Дата",
+                LAG("Дата") OVER (PARTITION BY "id_loan" ORDER BY "idx") "ПредыдущаяДата"
+            FROM
+                schedule
+            WHERE
+                "Дата" IS NOT NULL
+        ) _dates
+        GROUP BY
+            "id_loan"
+    )
+    , ledger_docs AS (
+        SELECT
+            loans."id_loan",
+            SUM(CASE WHEN (loans."is_issued" AND dc."Тип" = 1) OR (NOT loans."is_issued" AND dc."Тип" = 2)
+                THEN dc."Сумма" ELSE 0 END) "issue",
+            SUM(CASE WHEN (loans."is_issued" AND dc."Тип" = 2) OR (NOT loans."is_issued" AND dc."Тип" = 1)
+                THEN dc."Сумма" ELSE 0 END) "repay"
+        FROM
+            loans
+        JOIN
+            "ДебетКредит" dc
+            ON dc."Лицо2" = loans."face" AND dc."НашаОрганизация" = loans."id_org"
+        WHERE
+            dc."Документ" IS NOT NULL AND
+            dc."Тип" IN (1, 2) AND
+            dc."Счет" = ANY($6::integer[]) AND
+            dc."Лицо3" = $7::integer AND
+            dc."Сумма" <> 0
+        GROUP BY
+            loans."id_loan", dc."Документ"
+    )
+    , ledger AS (
+        SELECT
+            "id_loan",
+            -- выдачи - документы без погашения (как в LIST_PAYMENTS)
+            COALESCE(SUM("issue") FILTER (WHERE "repay" = 0), 0) "disbursed",
+            SUM("issue") - SUM("repay") "outstanding"
+        FROM
+            ledger_docs
+        GROUP BY
+            "id_loan"
+    )
+    SELECT
+        loans."id_loan",
+        ABS(COALESCE(total."body_debt", 0) - (COALESCE(ledger."disbursed", 0) - COALESCE(ledger."outstanding", 0)))
+            > $8::numeric "body_debt_mismatch",
+        COALESCE(total."count_payments", 0) > 0 AND ABS(outcome."ОсновнойДолг" - total."body_debt") > $8::numeric
+            "outcome_body_debt_mismatch",
+        ABS(outcome."РазмерПлатежа" - outcome."ОсновнойДолг" - outcome."НачисленныеПроценты") > $8::numeric
+            "outcome_size_payment_mismatch",
+        COALESCE(dates."not_monotonic_dates", FALSE) "not_monotonic_dates",
+        COALESCE(total."negative_debt", FALSE) "negative_debt"
+    FROM
+        loans
+    LEFT JOIN
+        outcome
+        USING("id_loan")
+    LEFT JOIN
+        schedule_total total
+        USING("id_loan")
+    LEFT JOIN
+        schedule_dates dates
+        USING("id_loan")
+    LEFT JOIN
+        ledger
+        USING("id_loan")
+    ORDER BY
+        loans."id_loan"
+'''
@@ -0,0 +1,51 @@
+"""
+Фикстуры тестов графиков платежей.
+
+Каталог графиков регистрируется пакетом SCHEDULE_PACKAGE, пакеты платформы sbis и loans подключаются из замены
+(каталог shims). Замена действует на время модуля тестов: ранее загруженные sbis и loans (например, замена реестра
+процентов) убираются из sys.modules и восстанавливаются после тестов, поэтому тесты разных каталогов можно запускать
+одной командой.
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+SCHEDULE_PACKAGE = 'loans_schedule'
+SCHEDULE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHIMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shims')
+PLATFORM_PACKAGES = ('sbis', 'loans')
+
+
+def _pop_platform_modules():
+    """Убирает из sys.modules пакеты платформы и пакет графиков, возвращает убранные модули"""
+    return {
+        name: sys.modules.pop(name)
+        for name in list(sys.modules)
+        if name.split('.')[0] in PLATFORM_PACKAGES + (SCHEDULE_PACKAGE,)
+    }
+
+
+@pytest.fixture(scope='module')
+def schedule():
+    """Модули графиков платежей: schedule.module(name) возвращает модуль каталога графиков"""
+    saved_modules = _pop_platform_modules()
+    sys.path.insert(0, SHIMS_PATH)
+    package = types.ModuleType(SCHEDULE_PACKAGE)
+    package.__path__ = [SCHEDULE_PATH]
+    sys.modules[SCHEDULE_PACKAGE] = package
+    try:
+        yield types.SimpleNamespace(
+            sbis=importlib.import_module('sbis'),
+            module=lambda name: importlib.import_module(f'{SCHEDULE_PACKAGE}.{name}'),
+        )
+    finally:
+        sys.path.remove(SHIMS_PATH)
+        _pop_platform_modules()
+        sys.modules.update(saved_modules)
@@ -0,0 +1,9 @@
+"""
+Минимальная замена пакета платформы loans для тестов графиков платежей (см. tests/conftest.py).
+
+Реализовано только то, что импортируют модули графиков. Расчет процентов (percentsCommon, loanRemains) в замене не
+реализован: тесты, которым он нужен, подменяют построитель графика.
+"""
+
+
+__author__ = 'Glukhenko A.V.'
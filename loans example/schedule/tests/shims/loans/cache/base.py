@@ -0,0 +1,10 @@
+"""
+Базовый кеш договоров займа (замена loans.cache.base)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+
+class BaseCacheLoan:
+    """Кеш в ДокументРасширение.Параметры. Графики используют только имя класса"""
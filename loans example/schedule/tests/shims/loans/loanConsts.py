@@ -0,0 +1,64 @@
+"""
+Константы модуля займов (замена loans.loanConsts)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import datetime
+
+
+class LC:
+    """Константы займов, используемые графиками платежей"""
+    ISSUED_LOAN_DOC_TYPE = 'ДоговорЗаймаВыданный'
+    RECEIVED_LOAN_DOC_TYPE = 'ДоговорЗаймаПолученный'
+    DEPOSIT = 'Депозит'
+    MAX_DATE = datetime.date(2100, 1, 1)
+    FLD_PERCENTS_BOOK_ACC = 'РП.СчетПроцентов'
+
+    # типы графиков
+    REPAYMENT_ON_DEMAND = 0
+    DIFFERENTIATED_SCHEDULE = 1
+    ANNUITY_SCHEDULE = 2
+    REPAYMENT_DEBT_AND_PERCENTS_AT_THE_END = 3
+
+    # типы строк графика
+    SCHEDULE_PLAN = 1
+    SCHEDULE_PAYMENT = 2
+    SCHEDULE_PAYMENTS = 3
+    SCHEDULE_DELAY = 4
+    SCHEDULE_OPEN_DELAY = 5
+    SCHEDULE_CORRECTION = 6
+    SCHEDULE_DATE = 7
+    SCHEDULE_OUTCOME = 8
+    SCHEDULE_INITIAL_BALANCE = 9
+    SCHEDULE_PLAN_NAME = 'План'
+    SCHEDULE_PAYMENT_NAME = 'Платеж'
+    SCHEDULE_PAYMENTS_NAME = 'Платежи'
+    SCHEDULE_DELAY_NAME = 'Просрочка'
+    SCHEDULE_OPEN_DELAY_NAME = 'ОткрытаяПросрочка'
+    SCHEDULE_CORRECTION_NAME = 'Корректировка'
+    SCHEDULE_DATE_NAME = 'Дата'
+    SCHEDULE_OUTCOME_NAME = 'Итог'
+
+    # случаи плановых строк
+    CASE_IDEAL = 1
+    CASE_DEFAULT_PLAN = 2
+    CASE_DEFAULT_DELAY = 3
+    CASE_EARLY_FIRST_PAYMENT = 4
+    CASE_LAST_ROW_PLAN = 5
+    CASE_LAST_ROW_DELAY = 6
+    CASE_OVER_BODY_DEBT = 7
+    CASE_OVER_BODY_DEBT_DELAY = 8
+    CASE_OVER_PERCENT = 9
+    CASE_PREPAYMENT = 10
+    CASE_IDEAL_NAME = 'Идеальный'
+    CASE_DEFAULT_PLAN_NAME = 'План'
+    CASE_DEFAULT_DELAY_NAME = 'Просрочка'
+    CASE_EARLY_FIRST_PAYMENT_NAME = 'РаннийПервыйПлатеж'
+    CASE_LAST_ROW_PLAN_NAME = 'ПоследнийПлан'
+    CASE_LAST_ROW_DELAY_NAME = 'ПоследняяПросрочка'
+    CASE_OVER_BODY_DEBT_NAME = 'ПереплатаДолга'
+    CASE_OVER_BODY_DEBT_DELAY_NAME = 'ПереплатаДолгаПросрочка'
+    CASE_OVER_PERCENT_NAME = 'ПереплатаПроцентов'
+    CASE_PREPAYMENT_NAME = 'Предоплата'
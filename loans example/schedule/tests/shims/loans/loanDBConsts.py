@@ -0,0 +1,24 @@
+"""
+Идентификаторы справочников займов (замена loans.loanDBConsts)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+ISSUED_TYPE_ID = 1001
+RECEIVED_TYPE_ID = 1002
+
+
+class LCDB:
+    """Идентификаторы справочников тестовых данных"""
+    def isIssuedLoanTypeByID(self, id_type_doc):
+        return id_type_doc == ISSUED_TYPE_ID
+
+    def accounts_ids(self):
+        return [3001]
+
+    def debt_analytic(self):
+        return 2001
+
+    def percent_analytic(self):
+        return 2002
@@ -0,0 +1,12 @@
+"""
+Остатки по договору займа (замена loans.loanRemains, расчет не реализован)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+
+class LoanRemains:
+    """Остатки по договору"""
+    def __init__(self, *args, **kwargs):
+        raise NotImplementedError('Расчет остатков в замене пакета loans не реализован')
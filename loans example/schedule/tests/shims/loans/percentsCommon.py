@@ -0,0 +1,24 @@
+"""
+Расчет процентов (замена loans.percentsCommon, расчет не реализован)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+
+class _NotImplemented:
+    """Класс платформы, расчет которого в замене не реализован"""
+    def __init__(self, *args, **kwargs):
+        raise NotImplementedError(f'{type(self).__name__} в замене пакета loans не реализован')
+
+
+class LoansDates(_NotImplemented):
+    """Даты займов"""
+
+
+class PercentsCalculator(_NotImplemented):
+    """Калькулятор процентов"""
+
+
+class LoanPercentsCalculator(_NotImplemented):
+    """Калькулятор процентов по договору"""
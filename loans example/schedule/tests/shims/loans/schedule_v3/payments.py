@@ -0,0 +1,8 @@
+"""
+Платежи по договору (замена loans.schedule_v3.payments): модуль платформы - это payments.py каталога графиков
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+from loans_schedule.payments import Payments  # noqa: F401
@@ -0,0 +1,10 @@
+"""
+Названия периодов (замена loans.utils.periods, расчет не реализован)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+
+class DatePeriod:
+    """Названия периодов просрочки"""
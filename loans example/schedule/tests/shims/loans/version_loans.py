@@ -0,0 +1,11 @@
+"""
+Версия модуля займов (замена loans.version_loans)
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+
+def get_date_build():
+    """Дата сборки стенда (в тестах не задана - используется текущая дата)"""
+    return None
@@ -0,0 +1,84 @@
+"""
+Минимальная замена модуля платформы sbis для тестов графиков платежей (см. tests/conftest.py).
+
+Реализованы записи (Record, RecordSet) и функции, которые вызываются при импорте и в тестах. Запросы к базе тесты
+подменяют (SqlQuery).
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import decimal
+
+
+class Error(Exception):
+    """Ошибка метода"""
+
+
+class Record:
+    """Запись"""
+    def __init__(self, data=None):
+        self._data = dict(data._data if isinstance(data, Record) else data or {})
+
+    def Get(self, name, default=None):
+        return self._data.get(name, default)
+
+    def Set(self, name, value):
+        self._data[name] = value
+
+    def Names(self):
+        return list(self._data)
+
+    def __getitem__(self, name):
+        return self._data[name]
+
+    def __setitem__(self, name, value):
+        self._data[name] = value
+
+    def __contains__(self, name):
+        return name in self._data
+
+    def __repr__(self):
+        return f'Record({self._data!r})'
+
+
+class RecordSet:
+    """Набор записей"""
+    def __init__(self, rows=None):
+        self._rows = list(rows or [])
+
+    def AddRow(self, rec=None):
+        self._rows.append(rec if rec is not None else Record())
+        return self._rows[-1]
+
+    def Get(self, index, name):
+        return self._rows[index].Get(name)
+
+    def Size(self):
+        return len(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __getitem__(self, index):
+        return self._rows[index]
+
+
+def Money(value):
+    """Денежное значение"""
+    return decimal.Decimal(value)
+
+
+def LogMsg(msg):
+    """Логирование (в тестах не выводится)"""
+
+
+WarningMsg = LogMsg
+
+
+def SqlQuery(sql, *params):
+    """Запрос к базе. В тестах графиков базы нет, запросы подменяются тестом"""
+    raise Error('Запрос к базе в тестах графиков должен быть подменен')
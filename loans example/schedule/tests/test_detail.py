@@ -0,0 +1,42 @@
+"""Тесты детализации записей графика платежей (mixins.PaymentsStorageMixin._get_detail)"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import decimal
+
+
+def get_storage(schedule, trace_enabled):
+    """Хранилища платежей с недоплатой по процентам"""
+    mixins = schedule.module('mixins')
+    storage = mixins.PaymentsStorageMixin()
+    for store in (storage.underpayment, storage.overpayment, storage.prepayment, storage.timely_payment,
+                  storage.delay_payment):
+        store.update({field: decimal.Decimal(0) for field in storage.storage_fields})
+    storage.underpayment['percent'] = decimal.Decimal('12.50')
+    if trace_enabled:
+        storage.trace = schedule.module('trace').ScheduleTrace(1)
+    return storage
+
+
+def test_row_detail_without_trace(schedule):
+    """Без трассировки детализация записи сохраняется, содержимое хранилищ не добавляется"""
+    mixins = schedule.module('mixins')
+    storage = get_storage(schedule, trace_enabled=False)
+    row_detail = mixins.RowDetail(
+        'Случай "{case}"\n' + mixins.DETAIL_SUMS, case='План', percent=decimal.Decimal('1.10'),
+        body_debt=decimal.Decimal('2.20'), size_payment=decimal.Decimal('3.30'),
+    )
+    assert storage._get_detail(row_detail) == \
+        'Случай "План"\nПорядок расчета: Проценты: 1.10, Основной долг: 2.20, Платеж: 3.30'
+    assert storage._get_detail('Платеж') == 'Платеж'
+    assert storage._get_detail() is None
+
+
+def test_row_detail_with_trace(schedule):
+    """При трассировке к детализации записи добавляется содержимое хранилищ"""
+    storage = get_storage(schedule, trace_enabled=True)
+    detail = storage._get_detail('Платеж')
+    assert detail.startswith('Платеж\nСодержимое хранилищ:\nНедоплата: ')
+    assert 'Проценты: 12.50' in detail
+    assert storage._get_detail() == storage._get_detail_store()
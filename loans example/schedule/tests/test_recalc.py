@@ -0,0 +1,126 @@
+"""Тесты пересчета графиков платежей в нескольких процессах (recalc.recalc_schedules)"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import datetime
+import decimal
+import json
+import multiprocessing
+import os
+
+import pytest
+
+COUNT_LOANS = 7
+KOPECK = decimal.Decimal('0.01')
+# типы договоров (значения замены loans.loanDBConsts)
+ISSUED_TYPE_ID = 1001
+RECEIVED_TYPE_ID = 1002
+MONEY_FIELDS = ('ДебетДолг', 'КредитДолг', 'ДебетПроценты', 'КредитПроценты', 'Платеж', 'ОстатокДолга')
+
+
+def get_filters(sbis):
+    """Фильтры графиков договоров (формат helpers.get_filter_schedule)"""
+    return {
+        id_loan: sbis.Record({
+            'IdLoan': id_loan,
+            'TypeDoc': ISSUED_TYPE_ID if id_loan % 2 else RECEIVED_TYPE_ID,
+            'DateBegin': datetime.date(2023, 1, 1),
+            'IdOrganization': 1,
+            'IdFaceLoan': 1000 + id_loan,
+        })
+        for id_loan in range(1, COUNT_LOANS + 1)
+    }
+
+
+def get_docs(sbis, id_loan):
+    """Выдача, начисления процентов и погашения договора (формат запроса LIST_PAYMENTS)"""
+    is_issued = id_loan % 2
+    debt_field = 'ДебетДолг' if is_issued else 'КредитДолг'
+    docs = [{'Дата': datetime.date(2023, 1, 10), debt_field: 1000000 * id_loan, 'ОстатокДолга': 1000000 * id_loan,
+             'ТипДокумента': 'ВыдачаЗайма'}]
+    for month in range(1, id_loan + 2):
+        month_end = datetime.date(2023, month + 1, 1) - datetime.timedelta(days=1)
+        docs.append({'Дата': month_end, 'ДебетПроценты': 1234 * month, 'ТипДокумента': 'НачислениеПроцентов',
+                     'id_docs': [id_loan * 100 + month]})
+        docs.append({'Дата': month_end + datetime.timedelta(days=5), 'Платеж': 10000.55 * month,
+                     'id_docs': [id_loan * 100 + month, id_loan * 100 + month + 50]})
+    rows = []
+    for index, doc in enumerate(docs):
+        rec = sbis.Record({field: sbis.Money(str(doc.get(field, 0))) for field in MONEY_FIELDS})
+        rec['Платеж'] = sbis.Money(str(doc['Платеж'])) if 'Платеж' in doc else None
+        rec['Дата'] = doc['Дата']
+        rec['@Документ'] = f'{id_loan * 1000 + index},{"Документы" if doc.get("id_docs") else "Документ"}'
+        rec['ТипДокумента'] = doc.get('ТипДокумента')
+        rec['id_docs'] = doc.get('id_docs')
+        rows.append(rec)
+    return sbis.RecordSet(rows)
+
+
+def dump_payments(payments):
+    """
+    Платежи договора (результат Payments.get_list) в сравнимом виде
+    Примечание: суммы сравниваются с точностью до копейки, пустая сумма хранится в колонках нулем
+    """
+    return [
+        [
+            [date.isoformat(), doc.Get('@Документ'), doc.Get('ТипДокумента'), doc.Get('id_docs') or [],
+             [str(decimal.Decimal(doc.Get(field) or 0).quantize(KOPECK)) for field in MONEY_FIELDS]]
+            for date, doc in sorted(docs.items())
+        ]
+        for docs in payments
+    ]
+
+
+class PaymentsDumpSchedule:
+    """Построитель графика для теста: «график» - платежи договора из контейнера процесса-обработчика"""
+    def __init__(self, _filter, navigation, payments_columns=None):
+        self._filter = _filter
+        self.payments_columns = payments_columns
+
+    def get_schedule(self):
+        return {
+            'pid': os.getpid(),
+            'payments': dump_payments(self.payments_columns.get_list(self._filter.Get('IdLoan'))),
+        }
+
+
+class FileScheduleCache:
+    """Кеш графиков для теста: сохраненные графики пишутся в файл процесса-обработчика"""
+    path = None
+
+    def encode(self, schedule):
+        return schedule
+
+    def mass_update_schedule_params(self, data):
+        with open(os.path.join(self.path, f'{os.getpid()}.jsonl'), 'a') as stream:
+            for id_loan, schedule in data.items():
+                stream.write(json.dumps([id_loan, schedule]) + '\n')
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                    reason='подмены модуля передаются процессам-обработчикам только при fork')
+def test_recalc_schedules_in_two_processes(schedule, monkeypatch, tmp_path):
+    """Графики всех договоров строятся в процессах-обработчиках по платежам из разделяемой памяти"""
+    sbis = schedule.sbis
+    recalc = schedule.module('recalc')
+    filters = get_filters(sbis)
+    monkeypatch.setattr(sbis, 'SqlQuery', lambda sql, *params: get_docs(sbis, params[2] - 1000))
+    monkeypatch.setattr(recalc, 'get_filter_schedule', lambda id_loans: {i: filters[i] for i in id_loans})
+    monkeypatch.setattr(recalc, 'PaymentSchedule', PaymentsDumpSchedule)
+    monkeypatch.setattr(FileScheduleCache, 'path', str(tmp_path))
+    monkeypatch.setattr(recalc, 'SchedulePaymentCache', FileScheduleCache)
+
+    count = recalc.recalc_schedules(list(filters), workers=2, chunk_size=2)
+
+    saved = {}
+    for path in tmp_path.iterdir():
+        for line in path.read_text().splitlines():
+            id_loan, saved_schedule = json.loads(line)
+            saved[id_loan] = saved_schedule
+    payments = schedule.module('payments')
+    assert count == COUNT_LOANS
+    assert sorted(saved) == sorted(filters)
+    assert os.getpid() not in {saved_schedule['pid'] for saved_schedule in saved.values()}
+    for id_loan, _filter in filters.items():
+        assert saved[id_loan]['payments'] == dump_payments(payments.Payments(_filter, recalc.LCDB()).get_list())
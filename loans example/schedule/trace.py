@@ -0,0 +1,87 @@
+"""
+Модуль отвечает за трассировку построения графика платежей.
+
+Трассировка включается для одного договора через фильтр графика (поле DebugTrace). По умолчанию используется
+NullScheduleTrace, который ничего не делает, поэтому в обычном режиме построения графика нет затрат на формирование
+диагностических строк и вывод в stdout.
+
+При включенной трассировке события копятся в виде словарей (машиночитаемый формат) и могут быть выгружены в JSON
+методом dump, например:
+{
+    "id_loan": 123,
+    "events": [
+        {"event": "period", "date_begin": "2021-01-31", "date_end": "2021-02-28", "stores": {...}, "balance": {...}},
+        ...
+    ]
+}
+"""
+
+
+__author__ = 'Glukhenko A.V.'
+
+import datetime
+import decimal
+import json
+
+FIELD_FILTER_TRACE = 'DebugTrace'
+
+
+class NullScheduleTrace:
+    """Пустая трассировка, используется по умолчанию"""
+    enabled = False
+
+    def event(self, name, **fields):
+        """Ничего не делает, см. ScheduleTrace.event"""
+        pass
+
+    def dump(self):
+        """Ничего не выгружает, см. ScheduleTrace.dump"""
+        return None
+
+
+class ScheduleTrace:
+    """Трассировка построения графика платежей по одному договору"""
+    enabled = True
+
+    def __init__(self, id_loan=None):
+        self.id_loan = id_loan
+        self.events = []
+
+    def event(self, name, **fields):
+        """
+        Фиксирует событие построения графика
+        :param name: название события
+        :param fields: значения события (даты, суммы, состояние хранилищ)
+        """
+        self.events.append({'event': name, **fields})
+
+    def dump(self):
+        """
+        Выгружает накопленные события в JSON
+        :return: str
+        """
+        return json.dumps(
+            {'id_loan': self.id_loan, 'events': self.events},
+            default=self.__json_default,
+            ensure_ascii=False,
+        )
+
+    @staticmethod
+    def __json_default(value):
+        """Приводит к json значения, которые не поддерживает стандартный сериализатор (Money, даты)"""
+        if isinstance(value, decimal.Decimal):
+            return '{0:.2f}'.format(value)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        return str(value)
+
+
+def create_trace(_filter):
+    """
+    Возвращает объект трассировки по фильтру графика
+    :param _filter: фильтр графика платежей, Record
+    :return: ScheduleTrace при включенной трассировке, иначе NullScheduleTrace
+    """
+    if _filter.Get(FIELD_FILTER_TRACE):
+        return ScheduleTrace(_filter.Get('IdLoan'))
+    return NullScheduleTrace()